@@ -0,0 +1,216 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Benchmarks on synthetic projects, compared against stored baselines.
+
+    python benchmarks/bench.py                      # run and compare
+    python benchmarks/bench.py --update-baselines   # record new baselines
+    python benchmarks/bench.py --sizes 1000 --repeat 5 --json results.json
+
+Each case is timed ``--repeat`` times and the fastest run is kept. A case
+regresses when it is more than ``--threshold`` (default 25%) slower than
+its baseline and at least ``--min-seconds`` slower in absolute terms, which
+keeps millisecond noise out; the script then exits with status 1.
+
+Baselines are scaled by a calibration loop timed alongside them, so a
+machine that is uniformly faster or slower (or a CI runner on a busy host)
+does not register as a change. Compare on similar hardware all the same.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from relion_pipeline_visualizer.cache import EnrichmentCache
+from relion_pipeline_visualizer.cli import main as cli_main
+from relion_pipeline_visualizer.graph import get_full_graph, get_subgraph
+from relion_pipeline_visualizer.mermaid import render_mermaid
+from relion_pipeline_visualizer.parser import enrich_jobs, parse_pipeline
+from relion_pipeline_visualizer.synthetic import generate_project
+
+BASELINES = Path(__file__).with_name("baselines.json")
+DEFAULT_SIZES = (1000, 5000, 20000, 50000)
+# Larger projects are generated without job directories, which would take
+# gigabytes; the enrichment cases are skipped for them
+JOB_FILES_UP_TO = 5000
+
+
+def best_of(repeat: int, fn: Callable[[], object], setup: Callable[[], object] | None = None) -> float:
+    """Fastest of ``repeat`` timed calls of ``fn``, each after an untimed ``setup``."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _calibration_workload() -> None:
+    """Fixed mix of the string, dict and sorting work the real cases do."""
+    names = [f"Refine3D/job{i:03d}/run_it{i % 50:03d}_data.star" for i in range(20000)]
+    index = {name: i for i, name in enumerate(sorted(names))}
+    sum(len(name.split("/")) + index[name] for name in names)
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Seconds this machine needs for the calibration workload right now."""
+    return best_of(repeat, _calibration_workload)
+
+
+def project(work_dir: Path, size: int, seed: int) -> tuple[Path, bool]:
+    """Generated project for ``size`` jobs, reused from an earlier run when complete."""
+    job_files = size <= JOB_FILES_UP_TO
+    project_dir = work_dir / f"synthetic_{size}_seed{seed}{'' if job_files else '_star_only'}"
+    marker = project_dir / ".complete"
+    if not marker.exists():
+        print(f"  generating {size} jobs in {project_dir}...", file=sys.stderr)
+        generate_project(project_dir, size, seed, job_files=job_files)
+        marker.touch()
+    return project_dir / "default_pipeline.star", job_files
+
+
+def run_cases(star_path: Path, job_files: bool, repeat: int, out_dir: Path) -> dict[str, float]:
+    """Time every case on one project; returns seconds by case name."""
+    project_dir = star_path.parent
+    pipeline = parse_pipeline(star_path)
+    # A Refine3D job half way through the project has long lineages both ways
+    refines = [name for name in pipeline.jobs if name.startswith("Refine3D/")]
+    target = refines[len(refines) // 2]
+    times: dict[str, float] = {}
+
+    times["parse_pipeline"] = best_of(repeat, lambda: parse_pipeline(star_path))
+
+    if job_files:
+        times["enrich_jobs"] = best_of(repeat, lambda: enrich_jobs(parse_pipeline(star_path), project_dir))
+        with EnrichmentCache(out_dir / "enrichment.sqlite") as cache:
+            enrich_jobs(parse_pipeline(star_path), project_dir, cache=cache)
+            times["enrich_jobs_cached"] = best_of(
+                repeat, lambda: enrich_jobs(parse_pipeline(star_path), project_dir, cache=cache),
+            )
+
+    def drop_adjacency():
+        pipeline._adjacency = None
+
+    times["get_subgraph"] = best_of(
+        repeat, lambda: get_subgraph(pipeline, target, upstream=True, downstream=True), drop_adjacency,
+    )
+    jobs, edges = get_full_graph(pipeline)
+    times["render_mermaid"] = best_of(repeat, lambda: render_mermaid(jobs, edges, pipeline))
+
+    def cli(*args: str) -> Callable[[], None]:
+        argv = [str(star_path), "-o", str(out_dir / "bench"), "-f", "--no-cache", *args]
+
+        def run() -> None:
+            with contextlib.redirect_stderr(io.StringIO()):
+                cli_main(argv)
+        return run
+
+    times["cli_lineage"] = best_of(repeat, cli("--job", target, "--downstream"))
+    times["cli_full"] = best_of(repeat, cli())
+    return times
+
+
+def compare(
+    results: dict[str, float],
+    baselines: dict[str, float],
+    threshold: float,
+    min_seconds: float,
+    speed: float = 1.0,
+) -> list[str]:
+    """Print a comparison table; return the keys that regressed.
+
+    Baselines are multiplied by ``speed``, the ratio of the current to the
+    stored calibration time.
+    """
+    regressed = []
+    print(f"{'case':<32} {'seconds':>10} {'baseline':>10} {'change':>8}")
+    for key, seconds in results.items():
+        base = baselines.get(key)
+        if base is not None:
+            base *= speed
+        if base is None:
+            print(f"{key:<32} {seconds:>10.4f} {'-':>10} {'new':>8}")
+            continue
+        change = seconds / base - 1 if base else 0.0
+        flag = ""
+        if change > threshold and seconds - base > min_seconds:
+            regressed.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<32} {seconds:>10.4f} {base:>10.4f} {change:>+7.0%}{flag}")
+    return regressed
+
+
+def machine() -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), metavar="N",
+                        help=f"Project sizes in jobs (default: {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N", help="Timed runs per case (default: 3)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown as a fraction of the baseline (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.005,
+                        help="Ignore slowdowns smaller than this many seconds (default: 0.005)")
+    parser.add_argument("--baselines", type=Path, default=BASELINES, help="Baseline file (default: %(default)s)")
+    parser.add_argument("--update-baselines", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--work-dir", type=Path,
+                        help="Keep generated projects here between runs (default: a temporary directory)")
+    parser.add_argument("--json", type=Path, metavar="FILE", help="Also write the results to FILE")
+    args = parser.parse_args(argv)
+
+    calibration = calibrate()
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="relion_bench_")))
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results: dict[str, float] = {}
+        for size in args.sizes:
+            star_path, job_files = project(work_dir, size, args.seed)
+            out_dir = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="relion_bench_out_")))
+            print(f"Benchmarking {size} jobs...", file=sys.stderr)
+            for case, seconds in run_cases(star_path, job_files, args.repeat, out_dir).items():
+                results[f"{case}@{size}"] = seconds
+    # Calibrate again after the run and keep the faster, as for the cases
+    calibration = min(calibration, calibrate())
+
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {}
+    speed = calibration / stored["calibration"] if stored.get("calibration") else 1.0
+    print(f"Calibration: {calibration:.4f}s ({speed:.2f}x the baseline machine's time)", file=sys.stderr)
+    regressed = compare(results, stored.get("results", {}), args.threshold, args.min_seconds, speed)
+    report = {"machine": machine(), "calibration": calibration, "results": results}
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n")
+    if args.update_baselines:
+        # Results of sizes not run this time are rescaled to this calibration
+        kept = {key: value * speed for key, value in stored.get("results", {}).items() if key not in results}
+        report["results"] = {**kept, **results}
+        args.baselines.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+        print(f"Updated baselines: {args.baselines}", file=sys.stderr)
+        return 0
+    if regressed:
+        print(f"{len(regressed)} case(s) regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Memory footprint of a parsed pipeline and the cost of rendering it.
+
+    python benchmarks/memory.py                     # 50k-job synthetic pipeline
+    python benchmarks/memory.py --jobs 20000 --json memory.json
+
+Memory is measured with tracemalloc: the bytes still allocated after
+``parse_pipeline`` (per job, for the whole Pipeline and for the jobs alone
+once the edges are dropped) and the peak while parsing. Rendering is timed
+on the full graph, best of ``--repeat`` runs, for ``render_mermaid`` and
+the tooltip data of the HTML viewer.
+
+Each figure is reported next to a baseline: the same pipeline held the
+way it was before jobs became slots dataclasses, i.e. a plain dataclass
+deriving ``job_type``, ``job_id`` and ``display_label`` on every access,
+and names, labels and edge endpoints each stored as their own string.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import json
+import re
+import sys
+import tempfile
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+
+from bench import best_of, machine, project
+from relion_pipeline_visualizer.graph import get_full_graph
+from relion_pipeline_visualizer.mermaid import render_mermaid
+from relion_pipeline_visualizer.parser import ModelClassInfo, ModelGeneralInfo, Pipeline, parse_pipeline
+from relion_pipeline_visualizer.writers import build_job_info
+
+
+@dataclass
+class BaselineJob:
+    """Job as it was stored before slots and precomputed labels."""
+    name: str
+    alias: str | None
+    type_label: str
+    status: str
+    last_command: str | None = None
+    model_classes: list[ModelClassInfo] | None = None
+    model_general: ModelGeneralInfo | None = None
+
+    @property
+    def job_type(self) -> str:
+        return self.name.split("/")[0]
+
+    @property
+    def job_id(self) -> str:
+        m = re.search(r"(job\d+)", self.name)
+        return m.group(1) if m else self.name
+
+    @property
+    def display_label(self) -> str:
+        if self.alias:
+            alias_short = self.alias.rstrip("/").split("/")[-1]
+            return f"{alias_short}<br/>{self.job_type}"
+        return self.name.rstrip("/")
+
+
+def _own(text: str) -> str:
+    """A fresh copy of ``text``, as the STAR reader returns for every row."""
+    return text.encode().decode()
+
+
+def baseline_pipeline(pipeline: Pipeline) -> Pipeline:
+    """``pipeline`` rebuilt with ``BaselineJob`` and nothing interned."""
+    baseline = Pipeline()
+    for job in pipeline.jobs.values():
+        name = _own(job.name)
+        baseline.jobs[name] = BaselineJob(
+            name, job.alias and _own(job.alias), _own(job.type_label), _own(job.status),
+        )
+    baseline.edges.update((_own(src), _own(tgt)) for src, tgt in pipeline.edges)
+    return baseline
+
+
+def _footprint(build) -> tuple[int, int, int]:
+    """Bytes the pipeline from ``build()`` keeps, without its edges, and at the peak."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    pipeline = build()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    pipeline.edges.clear()
+    gc.collect()
+    jobs_only = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return retained - before, jobs_only - before, peak - before
+
+
+def _results(footprint: tuple[int, int, int], pipeline: Pipeline, repeat: int, peak: bool = True) -> dict:
+    n_jobs = len(pipeline.jobs)
+    retained, jobs_only, parse_peak = footprint
+    jobs, edges = get_full_graph(pipeline)
+    return {
+        "pipeline_bytes_per_job": round(retained / n_jobs, 1),
+        "job_bytes_per_job": round(jobs_only / n_jobs, 1),
+        "parse_peak_bytes_per_job": round(parse_peak / n_jobs, 1) if peak else None,
+        "render_mermaid_s": best_of(repeat, lambda: render_mermaid(jobs, edges, pipeline)),
+        "build_job_info_s": best_of(repeat, lambda: build_job_info(jobs, pipeline)),
+    }
+
+
+def measure(star_path: Path, repeat: int) -> dict:
+    """Memory and render timings for one pipeline file, current and baseline."""
+    footprint = _footprint(lambda: parse_pipeline(star_path))
+    # Built again, untraced, for the timings and as the source of the baseline
+    pipeline = parse_pipeline(star_path)
+    # The baseline is rebuilt from the parsed pipeline rather than parsed,
+    # so it has no parse peak of its own
+    baseline_footprint = _footprint(lambda: baseline_pipeline(pipeline))
+    return {
+        "jobs": len(pipeline.jobs),
+        "edges": len(pipeline.edges),
+        "baseline": _results(baseline_footprint, baseline_pipeline(pipeline), repeat, peak=False),
+        "current": _results(footprint, pipeline, repeat),
+    }
+
+
+ROWS = (
+    ("pipeline_bytes_per_job", "Pipeline retained", "bytes/job", ">10.0f"),
+    ("job_bytes_per_job", "Jobs alone", "bytes/job", ">10.0f"),
+    ("parse_peak_bytes_per_job", "Peak while parsing", "bytes/job", ">10.0f"),
+    ("render_mermaid_s", "render_mermaid", "s", ">10.4f"),
+    ("build_job_info_s", "build_job_info", "s", ">10.4f"),
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--jobs", type=int, default=50000, metavar="N", help="Project size in jobs (default: 50000)")
+    parser.add_argument("--seed", type=int, default=0, help="Generator seed (default: 0)")
+    parser.add_argument("--repeat", type=int, default=3, metavar="N", help="Timed runs per render (default: 3)")
+    parser.add_argument("--work-dir", type=Path,
+                        help="Keep the generated project here between runs (default: a temporary directory)")
+    parser.add_argument("--json", type=Path, metavar="FILE", help="Also write the results to FILE")
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        work_dir = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="relion_bench_")))
+        work_dir.mkdir(parents=True, exist_ok=True)
+        star_path, _ = project(work_dir, args.jobs, args.seed)
+        results = measure(star_path, args.repeat)
+
+    current, baseline = results["current"], results["baseline"]
+    print(f"{results['jobs']} jobs, {results['edges']} edges")
+    print(f"  {'':<26}{'baseline':>10}{'current':>10}")
+    for key, label, unit, fmt in ROWS:
+        cells = "".join("n/a".rjust(10) if r[key] is None else format(r[key], fmt) for r in (baseline, current))
+        print(f"  {label:<26}{cells} {unit}")
+    if args.json:
+        args.json.write_text(json.dumps({"machine": machine(), "results": results}, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Local copies of the viewer's JavaScript assets for offline use.
+
+An asset directory holds ``mermaid.min.js`` and a ``manifest.json`` with its
+SHA-256, recorded when the file was fetched. Every use re-checks the hash,
+so a truncated or replaced bundle is reported instead of silently producing
+a viewer that never renders.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import html
+import json
+import re
+import shutil
+from pathlib import Path
+
+from relion_pipeline_visualizer.cache import default_cache_dir
+from relion_pipeline_visualizer.writers import atomic_write
+
+MERMAID_ASSET = "mermaid.min.js"
+MERMAID_URL = "https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.min.js"
+MANIFEST_FILENAME = "manifest.json"
+
+
+class AssetError(Exception):
+    """A local asset is missing, unregistered or does not match its hash."""
+
+
+def default_asset_dir() -> Path:
+    """Return the asset directory inside the user cache directory."""
+    return default_cache_dir() / "assets"
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(asset_dir: Path) -> dict:
+    try:
+        with open(asset_dir / MANIFEST_FILENAME) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        raise AssetError(f"Cannot read {asset_dir / MANIFEST_FILENAME}: {e}") from e
+
+
+def fetch_asset(asset_dir: Path, source: str = MERMAID_URL, name: str = MERMAID_ASSET) -> Path:
+    """Copy ``source`` (a URL or local file) into ``asset_dir`` and record its hash."""
+    asset_dir.mkdir(parents=True, exist_ok=True)
+    target = asset_dir / name
+    try:
+        if "://" in source:
+            # Only fetching needs urllib (and with it ssl and http.client)
+            import urllib.request
+
+            with urllib.request.urlopen(source, timeout=60) as response, atomic_write(target, "wb") as fp:
+                shutil.copyfileobj(response, fp)
+        else:
+            with open(source, "rb") as src, atomic_write(target, "wb") as fp:
+                shutil.copyfileobj(src, fp)
+    except OSError as e:
+        raise AssetError(f"Cannot fetch {name} from {source}: {e}") from e
+
+    manifest = _read_manifest(asset_dir)
+    manifest[name] = {"sha256": sha256_file(target), "source": source}
+    with atomic_write(asset_dir / MANIFEST_FILENAME) as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    return target
+
+
+def find_asset(asset_dir: Path, name: str = MERMAID_ASSET) -> Path:
+    """Path of a registered asset whose content matches the manifest.
+
+    Raises AssetError, with a hint on how to fix it, when the file is
+    missing, was never registered or has been modified.
+    """
+    path = asset_dir / name
+    hint = (
+        "Run once with --fetch-assets on a machine with internet access, "
+        "or pass an already seeded directory with --asset-dir."
+    )
+    if not path.is_file():
+        raise AssetError(f"{name} not found in {asset_dir}. {hint}")
+    entry = _read_manifest(asset_dir).get(name)
+    if not entry:
+        raise AssetError(
+            f"{path} is not listed in {MANIFEST_FILENAME}. Register it with --fetch-assets {path}"
+        )
+    actual = sha256_file(path)
+    if actual != entry["sha256"]:
+        raise AssetError(
+            f"{path} does not match its recorded SHA-256 "
+            f"(expected {entry['sha256']}, found {actual}). {hint}"
+        )
+    return path
+
+
+_SCRIPT_END = re.compile(r"</(script)", re.IGNORECASE)
+
+
+def inline_script(path: Path) -> str:
+    """A ``<script>`` element containing the file, safe to embed in HTML."""
+    # "</script" in any case would end the element early; "<\/" means the same in JS
+    code = _SCRIPT_END.sub(r"<\\/\1", path.read_text(encoding="utf-8"))
+    return f"  <script>{code}</script>"
+
+
+def script_tag(src: str) -> str:
+    """A ``<script src=...>`` element for a (relative) URL."""
+    return f'  <script src="{html.escape(src)}"></script>'
+
+
+def publish_asset(path: Path, out_dir: Path) -> str:
+    """Copy a verified asset to ``out_dir/assets/`` and return its relative URL.
+
+    The copy is skipped when an identical file is already there, so many
+    pages in one export share a single bundle.
+    """
+    target = out_dir / "assets" / path.name
+    if not (target.is_file() and sha256_file(target) == sha256_file(path)):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "rb") as src, atomic_write(target, "wb") as fp:
+            shutil.copyfileobj(src, fp)
+    return f"assets/{path.name}"
@@ -0,0 +1,282 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Process many RELION projects at once for ``relion_pipeline_visualizer batch``.
+
+Projects are handed to a pool of one worker process per core, which stay
+alive for the whole run. Each project runs under its own time limit and
+any error (or a worker dying) is recorded in that project's summary
+instead of stopping the batch. The summaries become an index page linking
+every project's diagram.
+"""
+
+from __future__ import annotations
+
+import glob
+import html
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TextIO
+
+from relion_pipeline_visualizer.writers import BATCH_INDEX_ROW_TEMPLATE, BATCH_INDEX_TEMPLATE
+
+PIPELINE_FILENAME = "default_pipeline.star"
+
+
+class ProjectTimeout(Exception):
+    """A project took longer than the batch's per-project time limit."""
+
+
+@dataclass
+class ProjectSummary:
+    """Outcome of one project: its job counts, or why it could not be processed."""
+    star_file: str
+    name: str  # output subdirectory
+    status: str = "ok"  # "ok", "failed" or "timeout"
+    seconds: float = 0.0
+    n_jobs: int | None = None
+    n_failed: int | None = None
+    n_running: int | None = None
+    best_resolution: float | None = None
+    best_job: str | None = None
+    error: str | None = None
+
+
+def pipeline_summary(pipeline) -> dict:
+    """Job counts and the best estimated resolution of an enriched pipeline."""
+    statuses = Counter(job.status for job in pipeline.jobs.values())
+    best_resolution, best_job = min(
+        (
+            (cls.estimated_resolution, name)
+            for name, job in pipeline.jobs.items()
+            for cls in job.model_classes or ()
+            if cls.estimated_resolution > 0
+        ),
+        default=(None, None),
+    )
+    return {
+        "n_jobs": len(pipeline.jobs),
+        "n_failed": statuses["Failed"],
+        "n_running": statuses["Running"],
+        "best_resolution": best_resolution,
+        "best_job": best_job,
+    }
+
+
+def _has_magic(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[")
+
+
+def find_projects(patterns: Iterable[str]) -> list[Path]:
+    """Pipeline STAR files for project directories, STAR files or glob patterns.
+
+    Directories matched by a glob are skipped unless they hold a
+    ``default_pipeline.star``; paths given literally are kept either way, so
+    a missing project shows up as failed rather than silently disappearing.
+    """
+    found: dict[Path, None] = {}
+    for pattern in patterns:
+        if _has_magic(pattern):
+            matches = [Path(p) for p in sorted(glob.glob(os.path.expanduser(pattern)))]
+            if not matches:
+                print(f"  Warning: no projects match {pattern}", file=sys.stderr)
+        else:
+            matches = [Path(os.path.expanduser(pattern))]
+        for path in matches:
+            star = path / PIPELINE_FILENAME if path.is_dir() or path.suffix != ".star" else path
+            if _has_magic(pattern) and not star.is_file():
+                continue
+            found.setdefault(star.absolute(), None)
+    return list(found)
+
+
+def output_names(star_paths: list[Path]) -> dict[Path, str]:
+    """Unique output subdirectory names from the project paths below their common parent."""
+    dirs = [p.parent for p in star_paths]
+    if len(dirs) > 1:
+        common = Path(os.path.commonpath(dirs))
+        names = ["_".join(d.relative_to(common).parts) or d.name for d in dirs]
+    else:
+        names = [d.name for d in dirs]
+    taken: Counter[str] = Counter()
+    unique = {}
+    for star, name in zip(star_paths, names):
+        name = name or "project"
+        taken[name] += 1
+        unique[star] = name if taken[name] == 1 else f"{name}_{taken[name]}"
+    return unique
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Raise ``ProjectTimeout`` in the current (main) thread after ``seconds``.
+
+    Uses SIGALRM, so it only interrupts Python code and system calls that
+    return to it; a read blocked in the kernel on an unresponsive
+    filesystem ends the project only once that read returns. Platforms
+    without SIGALRM run without a limit.
+    """
+    if not seconds or not hasattr(signal, "SIGALRM"):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise ProjectTimeout(f"exceeded the {seconds:g}s time limit")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# Set in pool workers: where they announce each project they start
+_started = None
+
+
+def _init_worker(started) -> None:
+    global _started
+    _started = started
+
+
+def run_project(
+    work: Callable[..., dict],
+    star_path: Path,
+    out_dir: Path,
+    name: str,
+    timeout: float | None,
+    work_args: tuple = (),
+) -> ProjectSummary:
+    """Run ``work(star_path, out_dir / name, *work_args)`` and summarise the outcome.
+
+    ``work`` returns the counts of ``pipeline_summary``. Runs in a pool
+    worker and never raises for a failing project.
+    """
+    if _started is not None:
+        _started.put(star_path)
+    summary = ProjectSummary(str(star_path), name)
+    start = time.perf_counter()
+    try:
+        with deadline(timeout):
+            counts = work(star_path, out_dir / name, *work_args)
+    except ProjectTimeout as exc:
+        summary.status, summary.error = "timeout", str(exc)
+    except Exception as exc:
+        summary.status, summary.error = "failed", f"{type(exc).__name__}: {exc}"
+    else:
+        for key, value in counts.items():
+            setattr(summary, key, value)
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def run_batch(
+    star_paths: list[Path],
+    out_dir: Path,
+    work: Callable[..., dict],
+    work_args: tuple = (),
+    workers: int | None = None,
+    timeout: float | None = None,
+    progress: Callable[[ProjectSummary, int, int], None] | None = None,
+) -> list[ProjectSummary]:
+    """Process every project with ``work`` in a pool of ``workers`` processes.
+
+    ``work`` must be a module-level function so the workers can import it.
+    When a worker dies (crash, out of memory) the pool breaks and takes
+    every unfinished project with it: those that had not started go back
+    in the queue for a new pool, and those that had are rerun one at a
+    time, so only the project that kills its worker is reported as failed.
+    ``progress`` is called with each summary and the counts done and total.
+    Summaries are returned in the order of ``star_paths``.
+    """
+    names = output_names(star_paths)
+    summaries: dict[Path, ProjectSummary] = {}
+
+    def finish(star: Path, summary: ProjectSummary) -> None:
+        summaries[star] = summary
+        if progress is not None:
+            progress(summary, len(summaries), len(star_paths))
+
+    def run_pool(stars: list[Path], n_workers: int | None) -> tuple[list[Path], set[Path]]:
+        """Run ``stars``; return those lost to a broken pool and every one started."""
+        started = multiprocessing.SimpleQueue()
+        unfinished = []
+        with ProcessPoolExecutor(n_workers, initializer=_init_worker, initargs=(started,)) as pool:
+            futures = {
+                pool.submit(run_project, work, star, out_dir, names[star], timeout, work_args): star
+                for star in stars
+            }
+            for future in as_completed(futures):
+                try:
+                    finish(futures[future], future.result())
+                except BrokenProcessPool:
+                    unfinished.append(futures[future])
+        ran = set()
+        while not started.empty():
+            ran.add(started.get())
+        return unfinished, ran
+
+    queue = list(star_paths)
+    while queue:
+        unfinished, started = run_pool(queue, workers)
+        suspects = [star for star in unfinished if star in started]
+        queue = [star for star in unfinished if star not in started]
+        if unfinished and not suspects:
+            # Workers died before starting anything; retrying would not help
+            for star in queue:
+                finish(star, ProjectSummary(str(star), names[star], "failed", error="worker process failed to start"))
+            break
+        for star in suspects:
+            lost, _ = run_pool([star], 1)
+            if lost:
+                finish(star, ProjectSummary(
+                    str(star), names[star], "failed", error="worker process died while processing the project",
+                ))
+    return [summaries[star] for star in star_paths]
+
+
+def _resolution(summary: ProjectSummary) -> str:
+    if summary.best_resolution is None:
+        return ""
+    return f"{summary.best_resolution:.2f} Å ({summary.best_job})"
+
+
+def write_index(fp: TextIO, title: str, summaries: list[ProjectSummary], html_name: str) -> None:
+    """Write the batch index page, linking each project's ``html_name`` viewer."""
+    rows = []
+    for s in sorted(summaries, key=lambda s: s.name):
+        project = html.escape(s.name)
+        if s.status == "ok":
+            project = f'<a href="{html.escape(f"{s.name}/{html_name}")}">{project}</a>'
+        rows.append(BATCH_INDEX_ROW_TEMPLATE.format(
+            project=project,
+            path=html.escape(str(Path(s.star_file).parent)),
+            status=html.escape(s.status),
+            error=html.escape(s.error or ""),
+            n_jobs="" if s.n_jobs is None else s.n_jobs,
+            n_failed="" if s.n_failed is None else s.n_failed,
+            n_running="" if s.n_running is None else s.n_running,
+            resolution=html.escape(_resolution(s)),
+            seconds=f"{s.seconds:.1f}",
+        ))
+    n_ok = sum(1 for s in summaries if s.status == "ok")
+    fp.write(BATCH_INDEX_TEMPLATE.format(
+        title=html.escape(title),
+        generated=html.escape(time.strftime("%Y-%m-%d %H:%M:%S")),
+        counts=html.escape(f"{n_ok} of {len(summaries)} projects processed"),
+        rows="\n".join(rows),
+    ))
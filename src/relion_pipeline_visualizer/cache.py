@@ -0,0 +1,140 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Persistent cache of parsed job files (note.txt, model STAR files).
+
+Entries are stored in a SQLite database and are only reused while the
+file's (path, mtime_ns, size) is unchanged, so a repeated run costs one
+``stat`` per file and no parsing.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_FILENAME = "enrichment.sqlite"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Seconds to wait for another process's flush before giving up
+LOCK_TIMEOUT = 60.0
+
+
+def default_cache_dir() -> Path:
+    """Return ``$XDG_CACHE_HOME/relion_pipeline_visualizer`` (or ``~/.cache/...``)."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "relion_pipeline_visualizer"
+
+
+class EnrichmentCache:
+    """SQLite-backed store of JSON values keyed by file identity.
+
+    Safe to share between the threads of a parallel ``enrich_jobs`` run.
+    New entries and access times are buffered in memory and written in one
+    short transaction on ``flush()``/``close()``, so several processes (as
+    in ``batch``) can share the database without holding its write lock for
+    a whole run. Least recently used entries are evicted on ``close()`` once
+    the stored values exceed ``max_bytes``.
+    """
+
+    def __init__(self, path: str | Path | None = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else default_cache_dir() / CACHE_FILENAME
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: dict[str, tuple[int, int, str, float]] = {}
+        self._accessed: dict[str, float] = {}
+        self._conn = sqlite3.connect(str(self.path), timeout=LOCK_TIMEOUT, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " value TEXT NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, path: Path, stat: os.stat_result) -> tuple[bool, object]:
+        """Return ``(True, value)`` if ``path`` is cached and unchanged, else ``(False, None)``."""
+        key = str(path.absolute())
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                row = pending[2:3] if pending[:2] == (stat.st_mtime_ns, stat.st_size) else None
+            else:
+                row = self._conn.execute(
+                    "SELECT value FROM entries WHERE path = ? AND mtime_ns = ? AND size = ?",
+                    (key, stat.st_mtime_ns, stat.st_size),
+                ).fetchone()
+            if row is None:
+                return False, None
+            self._accessed[key] = time.time()
+        return True, json.loads(row[0])
+
+    def put(self, path: Path, stat: os.stat_result, value: object) -> None:
+        """Store a JSON-serialisable ``value`` for the current version of ``path``."""
+        with self._lock:
+            self._pending[str(path.absolute())] = (stat.st_mtime_ns, stat.st_size, json.dumps(value), time.time())
+
+    def flush(self) -> None:
+        """Write buffered entries and access times in a single transaction."""
+        with self._lock:
+            if not self._pending and not self._accessed:
+                return
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (path, mtime_ns, size, value, accessed) VALUES (?, ?, ?, ?, ?)",
+                    [(key, *entry) for key, entry in self._pending.items()],
+                )
+                self._conn.executemany(
+                    "UPDATE entries SET accessed = ? WHERE path = ?",
+                    [(accessed, key) for key, accessed in self._accessed.items() if key not in self._pending],
+                )
+            self._pending.clear()
+            self._accessed.clear()
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        with self._lock:
+            self._pending.clear()
+            self._accessed.clear()
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """Evict least recently used entries beyond ``max_bytes``. Returns the number removed."""
+        self.flush()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE path IN ("
+                " SELECT path FROM ("
+                "  SELECT path, SUM(LENGTH(value)) OVER (ORDER BY accessed DESC, path) AS running"
+                "  FROM entries)"
+                " WHERE running > ?)",
+                (self.max_bytes,),
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self) -> None:
+        """Commit pending entries, apply the size bound and close the database."""
+        self.prune()
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> EnrichmentCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -6,128 +6,53 @@
 from __future__ import annotations
 
 import argparse
+import html
 import json
+import sqlite3
 import sys
+import time
+from contextlib import contextmanager
+from functools import partial
 from pathlib import Path
 
+from relion_pipeline_visualizer.assets import (
+    MERMAID_URL,
+    AssetError,
+    default_asset_dir,
+    fetch_asset,
+    find_asset,
+    inline_script,
+    publish_asset,
+    script_tag,
+)
+from relion_pipeline_visualizer.cache import EnrichmentCache
+from relion_pipeline_visualizer.formats import FORMATS
+from relion_pipeline_visualizer.instrument import Profiler, format_summary, profiling, stage
 from relion_pipeline_visualizer.parser import parse_pipeline, enrich_jobs
-from relion_pipeline_visualizer.graph import get_full_graph, get_subgraph
-from relion_pipeline_visualizer.mermaid import render_mermaid
-
-
-HTML_TEMPLATE = """\
-<!DOCTYPE html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <title>{title}</title>
-  <style>
-    body {{ margin: 0; padding: 20px; background: #fff; }}
-    #diagram {{ text-align: center; }}
-    .job-tooltip {{
-      position: absolute;
-      background: #222;
-      color: #fff;
-      padding: 8px 12px;
-      border-radius: 6px;
-      font: 24px/1.4 monospace;
-      white-space: pre-wrap;
-      max-width: 700px;
-      pointer-events: none;
-      z-index: 1000;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.3);
-    }}
-  </style>
-</head>
-<body>
-  <div id="diagram">
-    <pre class="mermaid">
-{mermaid}
-    </pre>
-  </div>
-  <script src="https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.min.js"></script>
-  <script>
-    var jobInfo = {job_info_json};
-
-    mermaid.initialize({{ startOnLoad: false, fontSize: 48 }});
-
-    mermaid.run().then(function() {{
-      var tip = document.createElement("div");
-      tip.className = "job-tooltip";
-      tip.style.display = "none";
-      document.body.appendChild(tip);
-
-      function findJobId(node) {{
-        var did = node.getAttribute("data-id");
-        if (did && jobInfo[did]) return did;
-        var m = node.id.match(/job\\d+/);
-        return m ? m[0] : null;
-      }}
-
-      document.querySelectorAll(".node").forEach(function(node) {{
-        var jobId = findJobId(node);
-        if (!jobId) return;
-        var info = jobInfo[jobId];
-        if (!info) return;
-
-        node.style.cursor = "pointer";
-        node.addEventListener("mouseenter", function(e) {{
-          var lines = [];
-          lines.push("Job:    " + info.name);
-          if (info.alias) lines.push("Alias:  " + info.alias);
-          lines.push("Type:   " + info.type_label);
-          lines.push("Status: " + info.status);
-
-          if (info.last_command) {{
-            lines.push("");
-            lines.push("Command:");
-            var cmd = info.last_command;
-            if (cmd.length > 300) cmd = cmd.substring(0, 300) + "...";
-            lines.push("  " + cmd);
-          }}
-
-          if (info.model_classes && info.model_classes.length > 0) {{
-            lines.push("");
-            if (info.pixel_size) lines.push("Pixel size:   " + info.pixel_size.toFixed(3) + " A/px");
-            if (info.iteration) lines.push("Iteration:    " + info.iteration);
-            if (info.model_classes.length === 1) {{
-              var mc = info.model_classes[0];
-              lines.push("Resolution:   " + mc.resolution.toFixed(2) + " A");
-              lines.push("Completeness: " + (mc.completeness * 100).toFixed(1) + "%");
-              lines.push("Distribution: " + (mc.distribution * 100).toFixed(1) + "%");
-              lines.push("Acc. rot:     " + mc.accuracy_rot.toFixed(2) + " deg");
-            }} else {{
-              lines.push("Classes:");
-              info.model_classes.forEach(function(mc) {{
-                lines.push("  Class " + mc.class_index
-                  + ": " + mc.resolution.toFixed(2) + " A"
-                  + " | " + (mc.completeness * 100).toFixed(1) + "%"
-                  + " | " + (mc.distribution * 100).toFixed(1) + "%"
-                  + " | " + mc.accuracy_rot.toFixed(2) + " deg");
-              }});
-            }}
-          }}
-
-          tip.textContent = lines.join("\\n");
-          tip.style.display = "block";
-        }});
-        node.addEventListener("mousemove", function(e) {{
-          var tipW = tip.offsetWidth, tipH = tip.offsetHeight;
-          var x = e.pageX + 12, y = e.pageY + 12;
-          if (e.clientY + 12 + tipH > window.innerHeight) y = e.pageY - tipH - 12;
-          if (e.clientX + 12 + tipW > window.innerWidth) x = e.pageX - tipW - 12;
-          tip.style.left = x + "px";
-          tip.style.top = y + "px";
-        }});
-        node.addEventListener("mouseleave", function() {{
-          tip.style.display = "none";
-        }});
-      }});
-    }});
-  </script>
-</body>
-</html>
-"""
+from relion_pipeline_visualizer.graph import (
+    COLLAPSE_MODES,
+    collapse_graph,
+    get_full_graph,
+    get_neighbourhood,
+    get_subgraphs,
+    transitive_reduction,
+)
+from relion_pipeline_visualizer.mermaid import render_mermaid, render_mermaid_to
+from relion_pipeline_visualizer.svg import render_svg_to
+from relion_pipeline_visualizer.writers import (
+    INDEX_ROW_TEMPLATE,
+    INDEX_TEMPLATE,
+    JOB_INFO_MODES,
+    HashingWriter,
+    atomic_write,
+    build_job_info,
+    job_info_sidecar,
+    version_poller,
+    write_html,
+    write_job_info_sidecar,
+    write_version_file,
+)
+from relion_pipeline_visualizer.watch import PipelineWatcher
 
 
 def _resolve_job_name(query: str, pipeline) -> str | None:
@@ -157,12 +82,677 @@ def _resolve_job_name(query: str, pipeline) -> str | None:
     return None
 
 
+def _open_cache(args) -> EnrichmentCache | None:
+    """Open the enrichment cache requested on the command line, if any."""
+    if args.no_cache:
+        return None
+    try:
+        cache = EnrichmentCache()
+        if args.clear_cache:
+            cache.clear()
+    except (OSError, sqlite3.Error) as exc:
+        print(f"  Warning: enrichment cache unavailable ({exc}), reading all files", file=sys.stderr)
+        return None
+    return cache
+
+
+def _enrich(pipeline, project_dir: Path, jobs: set[str], args) -> None:
+    """Enrich the given jobs, reporting progress and unreadable files on stderr."""
+    print(f"Enriching {len(jobs)} jobs with note.txt commands and model statistics...", file=sys.stderr)
+    cache = _open_cache(args)
+    try:
+        with stage("enrich_jobs"):
+            errors = enrich_jobs(pipeline, project_dir, job_names=jobs, workers=args.jobs, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    for name, exc in errors.items():
+        print(f"  Warning: could not read files for {name}: {exc}", file=sys.stderr)
+    selected = [pipeline.jobs[name] for name in jobs if name in pipeline.jobs]
+    n_commands = sum(1 for j in selected if j.last_command)
+    n_models = sum(1 for j in selected if j.model_classes)
+    print(f"  {n_commands} jobs with commands, {n_models} jobs with model data", file=sys.stderr)
+
+
+def _refuse_overwrite(paths: list[Path], force: bool) -> None:
+    """Exit cleanly if any output already exists and --force was not given."""
+    if force:
+        return
+    existing = [p for p in paths if p.exists()]
+    if existing:
+        names = ", ".join(str(p) for p in existing)
+        print(f"Output file(s) already exist: {names}", file=sys.stderr)
+        print("Use -f to overwrite.", file=sys.stderr)
+        sys.exit(0)
+
+
+def _write_outputs(
+    source_path: Path,
+    html_path: Path,
+    title: str,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline,
+    truncated: set[str],
+    groups: dict[str, list[str]],
+    args,
+    scripts: str | None = None,
+    head: str = "",
+) -> None:
+    """Stream the diagram source and the HTML viewer to disk, replacing each atomically.
+
+    ``--format`` selects the backend for the source file, ``--renderer`` how
+    the viewer draws the graph and ``--job-info`` where the tooltip data
+    goes. ``scripts`` replaces the CDN Mermaid tag when running offline and
+    ``head`` is added to the page head.
+    """
+    graph = dict(jobs=jobs, edges=edges, pipeline=pipeline, truncated=truncated, groups=groups)
+    with stage("write_source"), atomic_write(source_path) as fp:
+        FORMATS[args.format].write(fp, **graph)
+    with stage("write_html"):
+        draw = partial(render_svg_to if args.renderer == "svg" else render_mermaid_to, **graph)
+        job_info, loader = write_job_info_sidecar(
+            html_path, build_job_info(jobs, pipeline, truncated, groups), args.job_info,
+        )
+        with atomic_write(html_path) as fp:
+            write_html(fp, title, draw, job_info, args.renderer, loader, scripts, head)
+
+
+def _local_mermaid(args) -> Path | None:
+    """Verified local Mermaid bundle for --offline/--asset-dir, else None (use the CDN)."""
+    if not (args.offline or args.asset_dir) or args.renderer != "mermaid":
+        return None
+    return find_asset(Path(args.asset_dir) if args.asset_dir else default_asset_dir())
+
+
+def _output_paths(source_path: Path, job_info_mode: str) -> list[Path]:
+    """Every file one diagram writes: source, HTML viewer and any sidecar."""
+    html_path = source_path.with_suffix(".html")
+    sidecar = job_info_sidecar(html_path, job_info_mode)
+    return [source_path, html_path] + ([sidecar] if sidecar else [])
+
+
+def _view_graph(
+    args,
+    pipeline,
+    project_dir: Path,
+    job_name: str | None,
+    upstream: bool,
+    downstream: bool,
+    enriched: set[str],
+    log: bool = True,
+):
+    """Select, enrich and collapse the jobs of the single-diagram view.
+
+    Only jobs not yet in ``enriched`` are read; they are added to it.
+    Returns ``(jobs, edges, truncated, groups)``.
+    """
+    def note(message: str) -> None:
+        if log:
+            print(message, file=sys.stderr)
+
+    if job_name:
+        direction = []
+        if upstream:
+            direction.append("upstream")
+        if downstream:
+            direction.append("downstream")
+        note(f"Extracting subgraph for {job_name} ({' + '.join(direction)})...")
+        up_depth, down_depth = _depth_limits(args)
+        with stage("subgraph"):
+            jobs, edges, truncated = get_neighbourhood(
+                pipeline, job_name, upstream, downstream, up_depth, down_depth,
+            )
+        note(f"  Subgraph: {len(jobs)} jobs, {len(edges)} edges")
+        if truncated:
+            note(f"  {len(truncated)} jobs cut off by the depth limit")
+    else:
+        note("Rendering full pipeline...")
+        with stage("subgraph"):
+            jobs, edges = get_full_graph(pipeline)
+        truncated = set()
+
+    if jobs - enriched:
+        _enrich(pipeline, project_dir, jobs - enriched, args)
+        enriched.update(jobs)
+
+    n_edges = len(edges)
+    with stage("collapse"):
+        jobs, edges, groups = _collapse(args, pipeline, jobs, edges, {job_name} if job_name else set())
+    if args.reduce:
+        note(f"  Transitive reduction removed {n_edges - len(edges)} redundant edges")
+    if groups:
+        n_members = sum(len(members) for members in groups.values())
+        note(f"  Collapsed {n_members} jobs into {len(groups)} summary nodes ({len(jobs)} nodes drawn)")
+    return jobs, edges, truncated, groups
+
+
+def _view_digest(args, title: str, graph, pipeline) -> str:
+    """Hash of everything the outputs of one view would contain."""
+    jobs, edges, truncated, groups = graph
+    sink = HashingWriter()
+    with stage("digest"):
+        sink.write(f"{title}\0{args.renderer}\0{args.job_info}\0")
+        FORMATS[args.format].write(sink, jobs, edges, pipeline, truncated, groups)
+        json.dump(build_job_info(jobs, pipeline, truncated, groups), sink, sort_keys=True)
+    return sink.hexdigest()
+
+
+def _write_view(
+    source_path: Path,
+    html_path: Path,
+    title: str,
+    graph,
+    pipeline,
+    *,
+    args,
+    scripts: str | None = None,
+    previous: str | None = None,
+) -> str | None:
+    """Write the single-diagram view and return its digest.
+
+    With --watch the page polls for a new version, and nothing is rewritten
+    when the digest equals ``previous``.
+    """
+    jobs, edges, truncated, groups = graph
+    if not args.watch:
+        _write_outputs(source_path, html_path, title, jobs, edges, pipeline, truncated, groups, args, scripts)
+        return None
+    digest = _view_digest(args, title, graph, pipeline)
+    if digest != previous:
+        head = version_poller(html_path, digest, args.watch)
+        _write_outputs(
+            source_path, html_path, title, jobs, edges, pipeline, truncated, groups, args, scripts, head,
+        )
+        write_version_file(html_path, digest)
+    return digest
+
+
+def _watch(args, star_path: Path, pipeline, rebuild) -> None:
+    """Poll the pipeline until interrupted, calling ``rebuild(pipeline, changed_jobs)``."""
+    watcher = PipelineWatcher(star_path, pipeline)
+    print(f"Watching {star_path} every {args.watch:g}s (Ctrl-C to stop)...", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(args.watch)
+            try:
+                pipeline_changed, changed = watcher.poll()
+            except (OSError, ValueError) as e:
+                print(f"  Could not read the pipeline ({e}); retrying", file=sys.stderr)
+                continue
+            if pipeline_changed or changed:
+                rebuild(watcher.pipeline, changed)
+    except KeyboardInterrupt:
+        print("Stopped watching.", file=sys.stderr)
+
+
+def _lineage_basename(job_name: str) -> str:
+    """File stem for a job's lineage page, e.g. 'Refine3D/job058/' -> 'Refine3D_job058'."""
+    return job_name.strip("/").replace("/", "_")
+
+
+def _collapse(args, pipeline, jobs: set[str], edges: set[tuple[str, str]], keep: set[str]):
+    """Apply --reduce and --collapse to a job graph, returning (jobs, edges, groups)."""
+    if args.reduce:
+        edges = transitive_reduction(jobs, edges)
+    if not args.collapse:
+        return jobs, edges, {}
+    if args.collapse == "auto":
+        modes, max_nodes = COLLAPSE_MODES, args.max_nodes
+    else:
+        modes, max_nodes = (args.collapse,), None
+    return collapse_graph(pipeline, jobs, edges, modes, max_nodes, keep)
+
+
+def _depth_limits(args) -> tuple[int | None, int | None]:
+    """Upstream and downstream depth limits; --up-depth/--down-depth override --depth."""
+    up_depth = args.up_depth if args.up_depth is not None else args.depth
+    down_depth = args.down_depth if args.down_depth is not None else args.depth
+    return up_depth, down_depth
+
+
+def _export_lineages(
+    args, pipeline, star_path: Path, upstream: bool, downstream: bool, mermaid_asset: Path | None,
+) -> None:
+    """Write one lineage diagram per selected job plus an index page.
+
+    An offline Mermaid bundle is copied once to ``assets/`` in the output
+    directory and shared by all pages.
+    """
+    if args.all_jobs:
+        targets = sorted(pipeline.jobs)
+    else:
+        wanted = set(args.jobs_of_type)
+        targets = sorted(name for name, job in pipeline.jobs.items() if job.job_type in wanted)
+    if not targets:
+        if args.all_jobs:
+            print("Error: no jobs in pipeline.", file=sys.stderr)
+        else:
+            print(f"Error: no jobs of type {', '.join(args.jobs_of_type)} in pipeline.", file=sys.stderr)
+        sys.exit(1)
+
+    out_dir = Path(args.output) if args.output else star_path.parent / "pipeline_jobs"
+    index_path = out_dir / "index.html"
+    outputs = {
+        name: out_dir / f"{_lineage_basename(name)}{FORMATS[args.format].suffix}"
+        for name in targets
+    }
+    _refuse_overwrite(
+        [index_path] + [p for src in outputs.values() for p in _output_paths(src, args.job_info)],
+        args.force,
+    )
+
+    print(f"Extracting lineages for {len(targets)} jobs...", file=sys.stderr)
+    up_depth, down_depth = _depth_limits(args)
+    with stage("subgraph"):
+        if up_depth is None and down_depth is None:
+            subgraphs = {
+                name: (jobs, edges, set())
+                for name, (jobs, edges) in get_subgraphs(pipeline, targets, upstream, downstream).items()
+            }
+        else:
+            subgraphs = {
+                name: get_neighbourhood(pipeline, name, upstream, downstream, up_depth, down_depth)
+                for name in targets
+            }
+    _enrich(pipeline, star_path.parent, set().union(*(jobs for jobs, _, _ in subgraphs.values())), args)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    scripts = script_tag(publish_asset(mermaid_asset, out_dir)) if mermaid_asset else None
+    rows = []
+    for name in targets:
+        jobs, edges, truncated = subgraphs[name]
+        with stage("collapse"):
+            jobs, edges, groups = _collapse(args, pipeline, jobs, edges, {name})
+        source_path = outputs[name]
+        _write_outputs(
+            source_path, source_path.with_suffix(".html"), f"RELION Pipeline — {name}",
+            jobs, edges, pipeline, truncated, groups, args, scripts,
+        )
+        job = pipeline.jobs[name]
+        rows.append(INDEX_ROW_TEMPLATE.format(
+            href=html.escape(source_path.with_suffix(".html").name),
+            name=html.escape(name),
+            alias=html.escape(job.alias or ""),
+            status=html.escape(job.status),
+            n_jobs=len(subgraphs[name][0]),
+        ))
+    print(f"Wrote {len(targets)} lineage diagrams to: {out_dir}", file=sys.stderr)
+
+    with stage("write_html"), atomic_write(index_path) as fp:
+        fp.write(INDEX_TEMPLATE.format(
+            title=html.escape(f"RELION Pipeline — {star_path}"),
+            rows="\n".join(rows),
+        ))
+    print(f"Wrote index page:     {index_path}", file=sys.stderr)
+
+
+@contextmanager
+def _profiled(args, argv: list[str]):
+    """Collect --profile timings and a --cprofile dump around the run, if requested.
+
+    The report is also written when the run exits early or is interrupted.
+    """
+    if not (args.profile or args.cprofile):
+        yield
+        return
+    import cProfile
+
+    profiler = Profiler()
+    cprofile = cProfile.Profile() if args.cprofile else None
+    try:
+        with profiling(profiler):
+            if cprofile is not None:
+                cprofile.enable()
+            try:
+                yield
+            finally:
+                if cprofile is not None:
+                    cprofile.disable()
+    finally:
+        if cprofile is not None:
+            cprofile.dump_stats(args.cprofile)
+            print(f"Wrote cProfile dump:  {args.cprofile}", file=sys.stderr)
+        if args.profile:
+            report = profiler.report(args.profile_top, argv)
+            for line in format_summary(report):
+                print(line, file=sys.stderr)
+            with atomic_write(args.profile) as fp:
+                json.dump(report, fp, indent=2)
+                fp.write("\n")
+            print(f"Wrote profile report: {args.profile}", file=sys.stderr)
+
+
+def _serve_enricher(project_dir: Path, workers: int, cache: EnrichmentCache | None):
+    """Enrich callback for ``serve``: one shared cache, messages on the server's logger."""
+    from relion_pipeline_visualizer.server import logger
+
+    def enrich(pipeline, jobs: set[str]) -> None:
+        errors = enrich_jobs(pipeline, project_dir, job_names=jobs, workers=workers, cache=cache)
+        if cache is not None:
+            cache.flush()
+        for name, exc in errors.items():
+            logger.warning("Could not read files for %s: %s", name, exc)
+        logger.debug("Enriched %d jobs", len(jobs))
+
+    return enrich
+
+
+def serve_main(argv: list[str]) -> None:
+    """``relion_pipeline_visualizer serve``: answer lineage requests over HTTP."""
+    import logging
+
+    from relion_pipeline_visualizer.server import PipelineServer, PipelineService
+
+    parser = argparse.ArgumentParser(
+        prog="relion_pipeline_visualizer serve",
+        description="Serve job lineages of a RELION pipeline from memory, "
+                    "following changes to the STAR file.",
+    )
+    parser.add_argument("star_file", help="Path to default_pipeline.star")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on (default: 8000)")
+    parser.add_argument(
+        "--poll",
+        type=float,
+        default=5.0,
+        metavar="SECONDS",
+        help="How often to check the pipeline for changes (default: 5)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=128,
+        metavar="N",
+        help="Number of rendered pages kept in memory (default: 128)",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("mermaid", "svg"),
+        default="mermaid",
+        help="How pages draw the graph: Mermaid in the browser (default) or inline SVG",
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Read job files with N parallel workers (default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the on-disk cache of parsed note.txt and model files",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Embed a local, hash-checked Mermaid bundle instead of loading it from the CDN",
+    )
+    parser.add_argument(
+        "--asset-dir",
+        metavar="DIR",
+        help="Directory holding the local Mermaid bundle (implies --offline)",
+    )
+    parser.set_defaults(clear_cache=False)
+    args = parser.parse_args(argv)
+    if args.poll <= 0:
+        parser.error("--poll interval must be positive")
+    if args.cache_size < 1:
+        parser.error("--cache-size must be at least 1")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    star_path = Path(args.star_file)
+
+    try:
+        mermaid_asset = _local_mermaid(args)
+    except AssetError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    logging.basicConfig(format="%(message)s", level=logging.INFO)
+    print(f"Reading pipeline from: {star_path}", file=sys.stderr)
+    # Opened once and shared by every request; closed when the server stops
+    enrichment_cache = _open_cache(args)
+    service = PipelineService(
+        star_path,
+        enrich=_serve_enricher(star_path.parent, args.jobs, enrichment_cache),
+        renderer=args.renderer,
+        scripts=inline_script(mermaid_asset) if mermaid_asset else None,
+        cache_size=args.cache_size,
+        poll_interval=args.poll,
+    )
+    print(f"Found {len(service.pipeline.jobs)} jobs and {len(service.pipeline.edges)} edges", file=sys.stderr)
+
+    server = PipelineServer((args.host, args.port), service)
+    host, port = server.server_address[:2]
+    print(f"Serving on http://{host}:{port}/ (Ctrl-C to stop)", file=sys.stderr)
+    service.start_polling()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Stopped serving.", file=sys.stderr)
+    finally:
+        server.server_close()
+        service.stop_polling()
+        if enrichment_cache is not None:
+            enrichment_cache.close()
+
+
+def _batch_project(star_path: Path, out_dir: Path, args, scripts: str | None) -> dict:
+    """Write one project's full diagram for ``batch``, returning its summary counts."""
+    from relion_pipeline_visualizer.batch import pipeline_summary
+
+    pipeline = parse_pipeline(star_path)
+    cache = _open_cache(args)
+    try:
+        enrich_jobs(pipeline, star_path.parent, cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    jobs, edges = get_full_graph(pipeline)
+    jobs, edges, groups = _collapse(args, pipeline, jobs, edges, set())
+    out_dir.mkdir(parents=True, exist_ok=True)
+    source_path = out_dir / f"pipeline{FORMATS[args.format].suffix}"
+    _write_outputs(
+        source_path, source_path.with_suffix(".html"), f"RELION Pipeline — {star_path.parent}",
+        jobs, edges, pipeline, set(), groups, args, scripts,
+    )
+    return pipeline_summary(pipeline)
+
+
+def batch_main(argv: list[str]) -> None:
+    """``relion_pipeline_visualizer batch``: diagrams for many projects plus an index page."""
+    import os
+
+    from relion_pipeline_visualizer.batch import find_projects, output_names, run_batch, write_index
+
+    parser = argparse.ArgumentParser(
+        prog="relion_pipeline_visualizer batch",
+        description="Write the full pipeline diagram of many RELION projects, using one "
+                    "worker process per core, and an index page summarising them.",
+    )
+    parser.add_argument(
+        "projects",
+        nargs="*",
+        metavar="PROJECT",
+        help="Project directories or their default_pipeline.star; quoted glob patterns "
+             "such as '/data/*/' are expanded and skip directories without a pipeline",
+    )
+    parser.add_argument(
+        "--project-list",
+        metavar="FILE",
+        help="Also read projects (or patterns) from FILE, one per line",
+    )
+    parser.add_argument(
+        "--output", "-o",
+        required=True,
+        metavar="DIR",
+        help="Directory for index.html, summary.json and one subdirectory per project",
+    )
+    parser.add_argument(
+        "--force", "-f",
+        action="store_true",
+        help="Overwrite an existing index, summary and project outputs without prompting",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        metavar="N",
+        help="Number of worker processes (default: one per core)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=600.0,
+        metavar="SECONDS",
+        help="Give up on a project after SECONDS and move on; 0 for no limit (default: 600)",
+    )
+    parser.add_argument(
+        "--reduce",
+        action="store_true",
+        help="Drop edges implied by a longer path (transitive reduction) before rendering",
+    )
+    parser.add_argument(
+        "--collapse",
+        choices=("auto",) + COLLAPSE_MODES,
+        help="Merge jobs into summary nodes, as for a single project",
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=200,
+        metavar="N",
+        help="Node budget for --collapse auto (default: 200)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(FORMATS),
+        default="mermaid",
+        help="Format of the diagram file written next to each HTML viewer (default: mermaid)",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("mermaid", "svg"),
+        default="mermaid",
+        help="How the HTML viewers draw the graph: Mermaid in the browser (default) or inline SVG",
+    )
+    parser.add_argument(
+        "--job-info",
+        choices=JOB_INFO_MODES,
+        default="inline",
+        help="Where to put the tooltip data (default: inline)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the on-disk cache of parsed note.txt and model files",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Use a local, hash-checked Mermaid bundle, copied once to DIR/assets/",
+    )
+    parser.add_argument(
+        "--asset-dir",
+        metavar="DIR",
+        help="Directory holding the local Mermaid bundle (implies --offline)",
+    )
+    parser.set_defaults(clear_cache=False)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.timeout < 0:
+        parser.error("--timeout must not be negative")
+    if args.max_nodes < 0:
+        parser.error("--max-nodes must not be negative")
+    patterns = list(args.projects)
+    if args.project_list:
+        with open(args.project_list, encoding="utf-8") as fp:
+            patterns += [line.strip() for line in fp if line.strip() and not line.startswith("#")]
+    if not patterns:
+        parser.error("no projects given")
+
+    try:
+        mermaid_asset = _local_mermaid(args)
+    except AssetError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    out_dir = Path(args.output)
+    index_path = out_dir / "index.html"
+    star_paths = find_projects(patterns)
+    if not star_paths:
+        print("Error: no projects found.", file=sys.stderr)
+        sys.exit(1)
+    suffix = FORMATS[args.format].suffix
+    _refuse_overwrite(
+        [index_path, out_dir / "summary.json"] + [
+            path
+            for name in output_names(star_paths).values()
+            for path in _output_paths(out_dir / name / f"pipeline{suffix}", args.job_info)
+        ],
+        args.force,
+    )
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # Pages sit one directory below the shared bundle
+    scripts = script_tag(f"../{publish_asset(mermaid_asset, out_dir)}") if mermaid_asset else None
+
+    def progress(summary, done: int, total: int) -> None:
+        note = f": {summary.error}" if summary.error else ""
+        print(f"  [{done}/{total}] {summary.status:<7} {summary.name} ({summary.seconds:.1f}s){note}",
+              file=sys.stderr)
+
+    workers = min(args.workers, len(star_paths))
+    print(f"Processing {len(star_paths)} projects with {workers} workers...", file=sys.stderr)
+    summaries = run_batch(
+        star_paths, out_dir, _batch_project, (args, scripts),
+        workers=workers, timeout=args.timeout or None, progress=progress,
+    )
+
+    with atomic_write(out_dir / "summary.json") as fp:
+        json.dump([vars(s) for s in summaries], fp, indent=2)
+        fp.write("\n")
+    with atomic_write(index_path) as fp:
+        write_index(fp, "RELION Projects", summaries, "pipeline.html")
+    n_bad = sum(1 for s in summaries if s.status != "ok")
+    print(f"Wrote index page:     {index_path}", file=sys.stderr)
+    if n_bad:
+        print(f"{n_bad} of {len(summaries)} projects failed or timed out.", file=sys.stderr)
+        sys.exit(1)
+    print("Done.", file=sys.stderr)
+
+
 def main(argv: list[str] | None = None) -> None:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ["serve"]:
+        serve_main(argv[1:])
+        return
+    if argv[:1] == ["batch"]:
+        batch_main(argv[1:])
+        return
+
     parser = argparse.ArgumentParser(
         description="Visualize a RELION pipeline STAR file as a Mermaid diagram.",
+        epilog="Run 'relion_pipeline_visualizer serve --help' to serve lineages over HTTP, or "
+               "'relion_pipeline_visualizer batch --help' to process many projects at once.",
     )
     parser.add_argument("star_file", help="Path to default_pipeline.star")
-    parser.add_argument("--job", help="Focus on a specific job (e.g. '93', 'job093', or 'Refine3D/job093/')")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("--job", help="Focus on a specific job (e.g. '93', 'job093', or 'Refine3D/job093/')")
+    selection.add_argument(
+        "--all-jobs",
+        action="store_true",
+        help="Write a lineage diagram for every job plus an index page into the --output directory",
+    )
+    selection.add_argument(
+        "--jobs-of-type",
+        action="append",
+        metavar="TYPE",
+        help="Like --all-jobs, but only for jobs of TYPE (e.g. Refine3D); may be repeated",
+    )
     parser.add_argument(
         "--upstream",
         action="store_true",
@@ -173,6 +763,42 @@ def main(argv: list[str] | None = None) -> None:
         action="store_true",
         help="Include downstream descendants",
     )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        metavar="N",
+        help="Follow at most N edges from the selected job(s); cut-off jobs are marked with ⋯",
+    )
+    parser.add_argument(
+        "--up-depth",
+        type=int,
+        metavar="N",
+        help="Depth limit for upstream ancestors (overrides --depth)",
+    )
+    parser.add_argument(
+        "--down-depth",
+        type=int,
+        metavar="N",
+        help="Depth limit for downstream descendants (overrides --depth)",
+    )
+    parser.add_argument(
+        "--reduce",
+        action="store_true",
+        help="Drop edges implied by a longer path (transitive reduction) before rendering",
+    )
+    parser.add_argument(
+        "--collapse",
+        choices=("auto",) + COLLAPSE_MODES,
+        help="Merge jobs into summary nodes: linear 'chains', same-type sibling 'fans', "
+             "one node per job 'type', or 'auto' to apply these in turn until --max-nodes is met",
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        default=200,
+        metavar="N",
+        help="Node budget for --collapse auto (default: 200)",
+    )
     parser.add_argument(
         "--output", "-o",
         help="Base name for output files, e.g. 'my_pipeline' produces my_pipeline.mmd and my_pipeline.html (default: pipeline.mmd/.html next to star_file)",
@@ -182,6 +808,92 @@ def main(argv: list[str] | None = None) -> None:
         action="store_true",
         help="Overwrite existing output files without prompting",
     )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Read job files with N parallel workers (helps on network filesystems, default: 1)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the on-disk cache of parsed note.txt and model files",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="Empty the on-disk cache before reading job files",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(FORMATS),
+        default="mermaid",
+        help="Format of the diagram file written next to the HTML viewer: "
+             "mermaid (.mmd, default), dot (.dot), json (node-link .json), "
+             "cytoscape (.cyjs) or svg (.svg)",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=("mermaid", "svg"),
+        default="mermaid",
+        help="How the HTML viewer draws the graph: Mermaid in the browser (default) "
+             "or a pre-computed inline SVG that needs no network access",
+    )
+    parser.add_argument(
+        "--job-info",
+        choices=JOB_INFO_MODES,
+        default="inline",
+        help="Where to put the tooltip data: inline in the HTML (default), a gzip "
+             "sidecar fetched on first hover (needs an HTTP server), or one small "
+             "script per job loaded on hover (also works from file://)",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Embed a local, hash-checked Mermaid bundle instead of loading it from the CDN",
+    )
+    parser.add_argument(
+        "--asset-dir",
+        metavar="DIR",
+        help="Directory holding the local Mermaid bundle (implies --offline; "
+             "default: the user cache directory)",
+    )
+    parser.add_argument(
+        "--fetch-assets",
+        nargs="?",
+        const=MERMAID_URL,
+        metavar="URL_OR_FILE",
+        help="Download mermaid.min.js (or copy a local file) into the asset directory "
+             "and record its hash",
+    )
+    parser.add_argument(
+        "--watch",
+        nargs="?",
+        type=float,
+        const=5.0,
+        metavar="SECONDS",
+        help="Keep running and update the outputs when the pipeline or its running "
+             "jobs change, polling every SECONDS (default: 5); open pages reload themselves",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT",
+        help="Time each stage and every job file read, print a summary and write "
+             "a JSON report to REPORT",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        metavar="N",
+        help="Number of slowest job files listed in the --profile report (default: 10)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Write a cProfile dump of the run to FILE (view with 'python -m pstats FILE' or snakeviz)",
+    )
     parser.add_argument(
         "--mermaid",
         action="store_true",
@@ -194,19 +906,57 @@ def main(argv: list[str] | None = None) -> None:
     )
 
     args = parser.parse_args(argv)
+    if args.watch is not None and (args.all_jobs or args.jobs_of_type):
+        parser.error("--watch cannot be combined with --all-jobs or --jobs-of-type")
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch interval must be positive")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    for flag in ("depth", "up_depth", "down_depth", "max_nodes"):
+        value = getattr(args, flag)
+        if value is not None and value < 0:
+            parser.error(f"--{flag.replace('_', '-')} must not be negative")
+    if not (args.job or args.all_jobs or args.jobs_of_type):
+        for flag in ("depth", "up_depth", "down_depth"):
+            if getattr(args, flag) is not None:
+                parser.error(f"--{flag.replace('_', '-')} needs --job, --all-jobs or --jobs-of-type")
+    with _profiled(args, argv):
+        _run(args)
+
+
+def _run(args) -> None:
+    """Produce the outputs selected by the parsed command line."""
     star_path = Path(args.star_file)
     project_dir = star_path.parent
 
+    # Resolve the offline Mermaid bundle first so a missing asset fails fast
+    try:
+        if args.fetch_assets:
+            asset_dir = Path(args.asset_dir) if args.asset_dir else default_asset_dir()
+            fetched = fetch_asset(asset_dir, args.fetch_assets)
+            print(f"Stored {fetched.name} in: {asset_dir}", file=sys.stderr)
+        mermaid_asset = _local_mermaid(args)
+    except AssetError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
     print(f"Reading pipeline from: {star_path}", file=sys.stderr)
-    pipeline = parse_pipeline(args.star_file)
+    with stage("parse_pipeline"):
+        pipeline = parse_pipeline(args.star_file)
     print(f"Found {len(pipeline.jobs)} jobs and {len(pipeline.edges)} edges", file=sys.stderr)
 
-    print("Enriching jobs with note.txt commands and model statistics...", file=sys.stderr)
-    enrich_jobs(pipeline, project_dir)
-    n_commands = sum(1 for j in pipeline.jobs.values() if j.last_command)
-    n_models = sum(1 for j in pipeline.jobs.values() if j.model_classes)
-    print(f"  {n_commands} jobs with commands, {n_models} jobs with model data", file=sys.stderr)
+    upstream = args.upstream
+    downstream = args.downstream
+    # Default to upstream if neither flag given
+    if not upstream and not downstream:
+        upstream = True
+
+    if args.all_jobs or args.jobs_of_type:
+        _export_lineages(args, pipeline, star_path, upstream, downstream, mermaid_asset)
+        print("Done.", file=sys.stderr)
+        return
 
+    job_name = None
     if args.job:
         job_name = _resolve_job_name(args.job, pipeline)
         if job_name is None:
@@ -216,91 +966,41 @@ def main(argv: list[str] | None = None) -> None:
                 print(f"  {name}", file=sys.stderr)
             sys.exit(1)
 
-        upstream = args.upstream
-        downstream = args.downstream
-        # Default to upstream if neither flag given
-        if not upstream and not downstream:
-            upstream = True
-
-        direction = []
-        if upstream:
-            direction.append("upstream")
-        if downstream:
-            direction.append("downstream")
-        print(f"Extracting subgraph for {job_name} ({' + '.join(direction)})...", file=sys.stderr)
-        jobs, edges = get_subgraph(pipeline, job_name, upstream=upstream, downstream=downstream)
-        print(f"  Subgraph: {len(jobs)} jobs, {len(edges)} edges", file=sys.stderr)
-    else:
-        print("Rendering full pipeline...", file=sys.stderr)
-        jobs, edges = get_full_graph(pipeline)
-
-    mermaid_text = render_mermaid(jobs, edges, pipeline)
+    enriched: set[str] = set()
+    graph = _view_graph(args, pipeline, project_dir, job_name, upstream, downstream, enriched)
+    jobs, edges, truncated, groups = graph
 
     # Determine output paths
+    fmt = FORMATS[args.format]
     if args.output:
         out = Path(args.output)
         # If user gave a path with extension, use it; otherwise treat as base name
-        if out.suffix in (".mmd", ".html"):
-            mmd_path = out.with_suffix(".mmd")
+        if out.suffix in (".html", *(f.suffix for f in FORMATS.values())):
+            source_path = out.with_suffix(fmt.suffix)
         else:
-            mmd_path = out.with_suffix(".mmd")
+            source_path = out.with_suffix(fmt.suffix)
     else:
-        mmd_path = star_path.parent / "pipeline.mmd"
+        source_path = star_path.parent / f"pipeline{fmt.suffix}"
 
-    html_path = mmd_path.with_suffix(".html")
+    html_path = source_path.with_suffix(".html")
 
     # Check for existing files
-    if not args.force:
-        existing = [p for p in (mmd_path, html_path) if p.exists()]
-        if existing:
-            names = ", ".join(str(p) for p in existing)
-            print(f"Output file(s) already exist: {names}", file=sys.stderr)
-            print("Use -f to overwrite.", file=sys.stderr)
-            sys.exit(0)
-
-    # Write .mmd file
-    mmd_path.write_text(mermaid_text)
-    print(f"Wrote Mermaid diagram: {mmd_path}", file=sys.stderr)
-
-    # Build tooltip data keyed by Mermaid node ID
-    job_info = {}
-    for job_name in jobs:
-        job = pipeline.jobs.get(job_name)
-        if job:
-            mg = job.model_general
-            job_info[job.job_id] = {
-                "name": job.name,
-                "alias": job.alias,
-                "type_label": job.type_label,
-                "status": job.status,
-                "last_command": job.last_command,
-                "pixel_size": mg.pixel_size if mg else None,
-                "iteration": mg.iteration if mg else None,
-                "model_classes": [
-                    {
-                        "class_index": mc.class_index,
-                        "resolution": mc.estimated_resolution,
-                        "completeness": mc.overall_fourier_completeness,
-                        "distribution": mc.class_distribution,
-                        "accuracy_rot": mc.accuracy_rotations,
-                        "accuracy_trans": mc.accuracy_translations_angst,
-                    }
-                    for mc in job.model_classes
-                ] if job.model_classes else None,
-            }
+    _refuse_overwrite(_output_paths(source_path, args.job_info), args.force)
 
-    # Write .html file
+    # Write the diagram source and .html files
     title = "RELION Pipeline"
     if args.job:
         title = f"RELION Pipeline — {job_name}"
-    html_content = HTML_TEMPLATE.format(
-        title=title,
-        mermaid=mermaid_text,
-        job_info_json=json.dumps(job_info),
-    )
-    html_path.write_text(html_content)
+    scripts = inline_script(mermaid_asset) if mermaid_asset else None
+    write_view = partial(_write_view, source_path, html_path, title, args=args, scripts=scripts)
+    digest = write_view(graph, pipeline)
+    print(f"Wrote {fmt.description}: {source_path}", file=sys.stderr)
     print(f"Wrote HTML viewer:    {html_path}", file=sys.stderr)
 
+    if args.mermaid or args.kroki:
+        with stage("render_mermaid"):
+            mermaid_text = render_mermaid(jobs, edges, pipeline, truncated, groups)
+
     if args.mermaid:
         import base64
         import webbrowser
@@ -328,4 +1028,16 @@ def main(argv: list[str] | None = None) -> None:
     if args.mermaid or args.kroki:
         print("Note: enriched tooltips (commands, model stats) only work in the HTML output.", file=sys.stderr)
 
+    if args.watch:
+        def rebuild(new_pipeline, changed: set[str]) -> None:
+            nonlocal digest
+            enriched.difference_update(changed)
+            graph = _view_graph(args, new_pipeline, project_dir, job_name, upstream, downstream, enriched, log=False)
+            new_digest = write_view(graph, new_pipeline, previous=digest)
+            if new_digest != digest:
+                digest = new_digest
+                print(f"Updated {html_path} ({len(changed)} jobs changed)", file=sys.stderr)
+
+        _watch(args, star_path, pipeline, rebuild)
+
     print("Done.", file=sys.stderr)
@@ -0,0 +1,215 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Output backends for the diagram source file.
+
+Every backend has the signature of ``render_mermaid_to``: it streams one
+graph to an open text file. Job metadata is serialised by
+``writers.job_metadata``, the same function that feeds the HTML tooltips.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import TextIO
+
+from relion_pipeline_visualizer.mermaid import (
+    COLLAPSED_STYLE,
+    STATUS_STYLES,
+    TRUNCATED_STYLE,
+    TYPE_STYLES,
+    node_style,
+    render_mermaid_to,
+)
+from relion_pipeline_visualizer.parser import Pipeline
+from relion_pipeline_visualizer.svg import render_svg_to
+from relion_pipeline_visualizer.writers import job_metadata
+
+Writer = Callable[..., None]
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """A diagram backend selectable with ``--format``."""
+    name: str
+    suffix: str
+    description: str
+    write: Writer
+    media_type: str
+
+
+def _style_properties(style: str) -> dict[str, str]:
+    """Split a Mermaid ``classDef`` style such as 'fill:#fff,stroke:#333'."""
+    return dict(item.partition(":")[::2] for item in style.split(","))
+
+
+# Mermaid class name -> style properties, in the order classes are applied
+_CLASS_PROPERTIES = {
+    **{name.lower(): _style_properties(style) for name, style in TYPE_STYLES.items()},
+    "collapsed": _style_properties(COLLAPSED_STYLE),
+    **{name.lower(): _style_properties(style) for name, style in STATUS_STYLES.items()},
+    "truncated": _style_properties(TRUNCATED_STYLE),
+}
+
+
+def _plain_label(label: str) -> str:
+    return label.replace("<br/>", "\n")
+
+
+def _drawn(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None,
+    groups: dict[str, list[str]] | None,
+):
+    """Styles of the drawable jobs and the edges between them, both sorted."""
+    styles = {}
+    for job_name in sorted(jobs):
+        style = node_style(job_name, pipeline, truncated, groups)
+        if style is not None:
+            styles[job_name] = style
+    drawn_edges = [(s, t) for s, t in sorted(edges) if s in styles and t in styles]
+    return styles, drawn_edges
+
+
+def _write_json_items(fp: TextIO, items: Iterable[dict], indent: str) -> None:
+    """Stream the body of a JSON array, one item per line at ``indent``."""
+    first = True
+    for item in items:
+        fp.write(("\n" if first else ",\n") + indent + json.dumps(item))
+        first = False
+    if not first:
+        fp.write("\n" + indent[:-2])
+
+
+def _dot_quote(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{escaped}"'
+
+
+def render_dot_to(
+    fp: TextIO,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> None:
+    """Write a Graphviz DOT digraph with the Mermaid colours.
+
+    Lay it out with ``dot`` or, for very large pipelines, ``sfdp``.
+    """
+    styles, drawn_edges = _drawn(jobs, edges, pipeline, truncated, groups)
+    fp.write("digraph pipeline {\n")
+    fp.write("    rankdir=TB;\n")
+    fp.write('    node [shape=box, style="rounded,filled", fontname="Helvetica", '
+             'fillcolor="#ECECFF", color="#9370DB"];\n\n')
+
+    for job_name, style in styles.items():
+        props: dict[str, str] = {}
+        for css_class in style.classes:
+            props.update(_CLASS_PROPERTIES[css_class])
+        attrs = [f"label={_dot_quote(_plain_label(style.label))}", f"tooltip={_dot_quote(job_name)}"]
+        if "fill" in props:
+            attrs.append(f'fillcolor="{props["fill"]}"')
+        if "color" in props:
+            attrs.append(f'fontcolor="{props["color"]}"')
+        if "stroke" in props:
+            attrs.append(f'color="{props["stroke"]}"')
+        if "stroke-width" in props:
+            attrs.append(f"penwidth={float(props['stroke-width'].removesuffix('px')) / 2:g}")
+        if "stroke-dasharray" in props:
+            attrs.append('style="rounded,filled,dashed"')
+        fp.write(f"    {style.node_id} [{', '.join(attrs)}];\n")
+
+    fp.write("\n")
+    for src, tgt in drawn_edges:
+        fp.write(f"    {styles[src].node_id} -> {styles[tgt].node_id};\n")
+    fp.write("}\n")
+
+
+def render_node_link_to(
+    fp: TextIO,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> None:
+    """Write node-link JSON (readable by ``networkx.node_link_graph``).
+
+    Nodes are keyed by full job name and carry the job metadata, the drawn
+    label and the style classes.
+    """
+    styles, drawn_edges = _drawn(jobs, edges, pipeline, truncated, groups)
+    fp.write('{\n  "directed": true,\n  "multigraph": false,\n  "graph": {},\n  "nodes": [')
+    _write_json_items(fp, (
+        {
+            "id": job_name,
+            "node_id": style.node_id,
+            "label": _plain_label(style.label),
+            "classes": style.classes,
+            **job_metadata(job_name, pipeline, truncated, groups),
+        }
+        for job_name, style in styles.items()
+    ), "    ")
+    fp.write('],\n  "links": [')
+    _write_json_items(fp, ({"source": src, "target": tgt} for src, tgt in drawn_edges), "    ")
+    fp.write("]\n}\n")
+
+
+def render_cytoscape_to(
+    fp: TextIO,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> None:
+    """Write Cytoscape.js elements JSON (``cy.add(data.elements)``).
+
+    Element IDs are the Mermaid node IDs; the style classes match the
+    Mermaid ``classDef`` names so a stylesheet can reuse them.
+    """
+    styles, drawn_edges = _drawn(jobs, edges, pipeline, truncated, groups)
+    fp.write('{\n  "elements": {\n    "nodes": [')
+    _write_json_items(fp, (
+        {
+            "data": {
+                "id": style.node_id,
+                "label": _plain_label(style.label),
+                **job_metadata(job_name, pipeline, truncated, groups),
+            },
+            "classes": " ".join(style.classes),
+        }
+        for job_name, style in styles.items()
+    ), "      ")
+    fp.write('],\n    "edges": [')
+    _write_json_items(fp, (
+        {
+            "data": {
+                "id": f"{styles[src].node_id}-{styles[tgt].node_id}",
+                "source": styles[src].node_id,
+                "target": styles[tgt].node_id,
+            },
+        }
+        for src, tgt in drawn_edges
+    ), "      ")
+    fp.write("]\n  }\n}\n")
+
+
+FORMATS = {
+    fmt.name: fmt
+    for fmt in (
+        OutputFormat("mermaid", ".mmd", "Mermaid diagram", render_mermaid_to, "text/plain"),
+        OutputFormat("dot", ".dot", "Graphviz DOT file", render_dot_to, "text/vnd.graphviz"),
+        OutputFormat("json", ".json", "node-link JSON", render_node_link_to, "application/json"),
+        OutputFormat("cytoscape", ".cyjs", "Cytoscape.js JSON", render_cytoscape_to, "application/json"),
+        OutputFormat("svg", ".svg", "SVG drawing", render_svg_to, "image/svg+xml"),
+    )
+}
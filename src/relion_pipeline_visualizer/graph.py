@@ -5,77 +5,469 @@
 
 from __future__ import annotations
 
-from collections import defaultdict, deque
+from array import array
+from collections import deque
+from dataclasses import dataclass
 
 from relion_pipeline_visualizer.parser import Pipeline
 
 
-def get_full_graph(pipeline: Pipeline) -> tuple[set[str], set[tuple[str, str]]]:
-    """Return all jobs and edges."""
-    return set(pipeline.jobs.keys()), set(pipeline.edges)
+@dataclass
+class Adjacency:
+    """Forward and reverse adjacency of a pipeline in compressed sparse row form.
 
+    Job names are mapped to dense integer indices (``names``/``index``); the
+    children of job ``i`` are ``fwd_idx[fwd_ptr[i]:fwd_ptr[i + 1]]`` and its
+    parents are the same slice of ``rev_idx``/``rev_ptr``.
+    """
+    names: list[str]
+    index: dict[str, int]
+    fwd_ptr: array
+    fwd_idx: array
+    rev_ptr: array
+    rev_idx: array
 
-def get_ancestors(pipeline: Pipeline, job_name: str) -> tuple[set[str], set[tuple[str, str]]]:
-    """BFS backwards from job_name, returning upstream jobs and edges."""
-    # Build reverse adjacency: target -> set of sources
-    reverse_adj: dict[str, set[str]] = defaultdict(set)
-    for src, tgt in pipeline.edges:
-        reverse_adj[tgt].add(src)
+    @classmethod
+    def build(cls, jobs, edges) -> Adjacency:
+        nodes = set(jobs)
+        for src, tgt in edges:
+            nodes.add(src)
+            nodes.add(tgt)
+        names = sorted(nodes)
+        index = {name: i for i, name in enumerate(names)}
+        n = len(names)
+        pairs = sorted((index[src], index[tgt]) for src, tgt in edges)
+        fwd_ptr, fwd_idx = cls._compress(n, pairs)
+        rev_ptr, rev_idx = cls._compress(n, sorted((t, s) for s, t in pairs))
+        return cls(names, index, fwd_ptr, fwd_idx, rev_ptr, rev_idx)
 
-    visited: set[str] = {job_name}
-    queue = deque([job_name])
-    edges: set[tuple[str, str]] = set()
+    @staticmethod
+    def _compress(n: int, pairs: list[tuple[int, int]]) -> tuple[array, array]:
+        """CSR arrays for ``pairs`` sorted by source index."""
+        ptr = array("i", [0]) * (n + 1)
+        for src, _ in pairs:
+            ptr[src + 1] += 1
+        for i in range(n):
+            ptr[i + 1] += ptr[i]
+        return ptr, array("i", (tgt for _, tgt in pairs))
 
-    while queue:
-        current = queue.popleft()
-        for parent in reverse_adj.get(current, set()):
-            edges.add((parent, current))
-            if parent not in visited:
-                visited.add(parent)
-                queue.append(parent)
+    def children(self, i: int) -> array:
+        return self.fwd_idx[self.fwd_ptr[i]:self.fwd_ptr[i + 1]]
 
-    return visited, edges
+    def parents(self, i: int) -> array:
+        return self.rev_idx[self.rev_ptr[i]:self.rev_ptr[i + 1]]
 
 
-def get_descendants(pipeline: Pipeline, job_name: str) -> tuple[set[str], set[tuple[str, str]]]:
-    """BFS forwards from job_name, returning downstream jobs and edges."""
-    forward_adj: dict[str, set[str]] = defaultdict(set)
-    for src, tgt in pipeline.edges:
-        forward_adj[src].add(tgt)
+def get_adjacency(pipeline: Pipeline) -> Adjacency:
+    """Return the pipeline's adjacency index, rebuilding it only after edits."""
+    edges = pipeline.edges
+    key = (id(edges), getattr(edges, "version", None), len(edges), len(pipeline.jobs))
+    cached = pipeline._adjacency
+    # A plain set (no version counter) cannot report edits, so always rebuild
+    if cached is None or key[1] is None or cached[0] != key:
+        cached = (key, Adjacency.build(pipeline.jobs, edges))
+        pipeline._adjacency = cached
+    return cached[1]
 
-    visited: set[str] = {job_name}
-    queue = deque([job_name])
-    edges: set[tuple[str, str]] = set()
 
+def _traverse(
+    ptr: array,
+    idx: array,
+    start: int,
+    max_depth: int | None = None,
+) -> tuple[list[int], list[tuple[int, int]], set[int]]:
+    """Level-tracking BFS over one CSR direction.
+
+    Returns the visited nodes, the traversed (from, to) pairs and the
+    truncated frontier: nodes at ``max_depth`` that were not expanded but
+    have neighbours outside the visited set. Pairs between visited frontier
+    nodes are still included so the drawn subgraph has no missing links.
+    """
+    depth = {start: 0}
+    order = [start]
+    queue = deque(order)
+    pairs: list[tuple[int, int]] = []
+    frontier: list[int] = []
     while queue:
         current = queue.popleft()
-        for child in forward_adj.get(current, set()):
-            edges.add((current, child))
-            if child not in visited:
-                visited.add(child)
-                queue.append(child)
+        if max_depth is not None and depth[current] >= max_depth:
+            frontier.append(current)
+            continue
+        for nxt in idx[ptr[current]:ptr[current + 1]]:
+            pairs.append((current, nxt))
+            if nxt not in depth:
+                depth[nxt] = depth[current] + 1
+                order.append(nxt)
+                queue.append(nxt)
 
-    return visited, edges
+    truncated: set[int] = set()
+    for node in frontier:
+        for nxt in idx[ptr[node]:ptr[node + 1]]:
+            if nxt in depth:
+                pairs.append((node, nxt))
+            else:
+                truncated.add(node)
+    return order, pairs, truncated
 
 
-def get_subgraph(
+def _walk(
+    pipeline: Pipeline,
+    job_name: str,
+    reverse: bool,
+    max_depth: int | None,
+) -> tuple[set[str], set[tuple[str, str]], set[str]]:
+    """Jobs, edges and truncated jobs reached from job_name in one direction."""
+    adj = get_adjacency(pipeline)
+    start = adj.index.get(job_name)
+    if start is None:
+        return {job_name}, set(), set()
+    names = adj.names
+    if reverse:
+        order, pairs, truncated = _traverse(adj.rev_ptr, adj.rev_idx, start, max_depth)
+        edges = {(names[p], names[c]) for c, p in pairs}
+    else:
+        order, pairs, truncated = _traverse(adj.fwd_ptr, adj.fwd_idx, start, max_depth)
+        edges = {(names[p], names[c]) for p, c in pairs}
+    return {names[i] for i in order}, edges, {names[i] for i in truncated}
+
+
+def get_full_graph(pipeline: Pipeline) -> tuple[set[str], set[tuple[str, str]]]:
+    """Return all jobs and edges."""
+    return set(pipeline.jobs.keys()), set(pipeline.edges)
+
+
+def get_ancestors(
+    pipeline: Pipeline,
+    job_name: str,
+    max_depth: int | None = None,
+) -> tuple[set[str], set[tuple[str, str]]]:
+    """BFS backwards from job_name, returning upstream jobs and edges.
+
+    ``max_depth`` limits the number of edges followed from job_name.
+    """
+    jobs, edges, _ = _walk(pipeline, job_name, True, max_depth)
+    return jobs, edges
+
+
+def get_descendants(
+    pipeline: Pipeline,
+    job_name: str,
+    max_depth: int | None = None,
+) -> tuple[set[str], set[tuple[str, str]]]:
+    """BFS forwards from job_name, returning downstream jobs and edges.
+
+    ``max_depth`` limits the number of edges followed from job_name.
+    """
+    jobs, edges, _ = _walk(pipeline, job_name, False, max_depth)
+    return jobs, edges
+
+
+def get_neighbourhood(
     pipeline: Pipeline,
     job_name: str,
     upstream: bool = True,
     downstream: bool = False,
-) -> tuple[set[str], set[tuple[str, str]]]:
-    """Combine ancestors and/or descendants based on flags."""
+    up_depth: int | None = None,
+    down_depth: int | None = None,
+) -> tuple[set[str], set[tuple[str, str]], set[str]]:
+    """Like ``get_subgraph``, also returning the jobs where a depth limit cut the traversal."""
     jobs: set[str] = {job_name}
     edges: set[tuple[str, str]] = set()
+    truncated: set[str] = set()
 
     if upstream:
-        up_jobs, up_edges = get_ancestors(pipeline, job_name)
+        up_jobs, up_edges, up_truncated = _walk(pipeline, job_name, True, up_depth)
         jobs |= up_jobs
         edges |= up_edges
+        truncated |= up_truncated
 
     if downstream:
-        down_jobs, down_edges = get_descendants(pipeline, job_name)
+        down_jobs, down_edges, down_truncated = _walk(pipeline, job_name, False, down_depth)
         jobs |= down_jobs
         edges |= down_edges
+        truncated |= down_truncated
+
+    return jobs, edges, truncated
+
 
+def get_subgraph(
+    pipeline: Pipeline,
+    job_name: str,
+    upstream: bool = True,
+    downstream: bool = False,
+    up_depth: int | None = None,
+    down_depth: int | None = None,
+) -> tuple[set[str], set[tuple[str, str]]]:
+    """Combine ancestors and/or descendants based on flags, optionally depth-limited."""
+    jobs, edges, _ = get_neighbourhood(pipeline, job_name, upstream, downstream, up_depth, down_depth)
     return jobs, edges
+
+
+def topological_order(adj: Adjacency) -> list[int] | None:
+    """Kahn topological order of job indices, or None if the graph has a cycle."""
+    n = len(adj.names)
+    indegree = [adj.rev_ptr[i + 1] - adj.rev_ptr[i] for i in range(n)]
+    queue = deque(i for i in range(n) if indegree[i] == 0)
+    order: list[int] = []
+    while queue:
+        current = queue.popleft()
+        order.append(current)
+        for child in adj.children(current):
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return order if len(order) == n else None
+
+
+def _closure(ptr: array, idx: array, order: list[int]) -> list[int]:
+    """Per-node bitsets of everything reachable through ``ptr``/``idx``, self included.
+
+    ``order`` must list every node after all of its neighbours in this
+    direction, so each bitset is the union of already finished ones.
+    """
+    masks = [0] * len(order)
+    for node in order:
+        mask = 1 << node
+        for nxt in idx[ptr[node]:ptr[node + 1]]:
+            mask |= masks[nxt]
+        masks[node] = mask
+    return masks
+
+
+def _bits(mask: int):
+    """Yield the indices of the set bits of ``mask``."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def get_subgraphs(
+    pipeline: Pipeline,
+    job_names: list[str],
+    upstream: bool = True,
+    downstream: bool = False,
+) -> dict[str, tuple[set[str], set[tuple[str, str]]]]:
+    """``get_subgraph`` for many jobs at once, sharing one closure computation.
+
+    Ancestor and descendant sets of every job are computed together as
+    bitsets over a topological order, so the cost is one pass over the
+    graph plus the size of each returned subgraph.
+    """
+    adj = get_adjacency(pipeline)
+    order = topological_order(adj)
+    if order is None:
+        # Not a DAG: fall back to one traversal per job
+        return {
+            name: get_subgraph(pipeline, name, upstream=upstream, downstream=downstream)
+            for name in job_names
+        }
+
+    ancestors = _closure(adj.rev_ptr, adj.rev_idx, order) if upstream else None
+    descendants = _closure(adj.fwd_ptr, adj.fwd_idx, order[::-1]) if downstream else None
+    names = adj.names
+
+    result: dict[str, tuple[set[str], set[tuple[str, str]]]] = {}
+    for name in job_names:
+        i = adj.index.get(name)
+        if i is None:
+            result[name] = ({name}, set())
+            continue
+        jobs: set[str] = {name}
+        edges: set[tuple[str, str]] = set()
+        if ancestors is not None:
+            for node in _bits(ancestors[i]):
+                jobs.add(names[node])
+                edges.update((names[p], names[node]) for p in adj.parents(node))
+        if descendants is not None:
+            for node in _bits(descendants[i]):
+                jobs.add(names[node])
+                edges.update((names[node], names[c]) for c in adj.children(node))
+        result[name] = (jobs, edges)
+    return result
+
+
+def transitive_reduction(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+) -> set[tuple[str, str]]:
+    """Drop every edge u -> v for which v is also reachable from u by a longer path.
+
+    Reachability is computed as bitsets in reverse topological order, and
+    each job's children are visited in topological order so an edge is
+    redundant exactly when its target is already covered by an earlier
+    child. Graphs with a cycle are returned unchanged.
+    """
+    adj = Adjacency.build(jobs, edges)
+    order = topological_order(adj)
+    if order is None:
+        return set(edges)
+    position = [0] * len(order)
+    for pos, node in enumerate(order):
+        position[node] = pos
+
+    reach = [0] * len(order)  # strict descendants of each node
+    kept: list[tuple[int, int]] = []
+    for node in reversed(order):
+        covered = 0
+        for child in sorted(adj.children(node), key=position.__getitem__):
+            if covered >> child & 1:
+                continue
+            kept.append((node, child))
+            covered |= reach[child] | (1 << child)
+        reach[node] = covered
+
+    names = adj.names
+    return {(names[src], names[tgt]) for src, tgt in kept}
+
+
+# ── Collapsing large graphs ──────────────────────────────────────────
+#
+# Collapse functions take and return (jobs, edges, groups). Every node of a
+# collapsed graph is still a real job name: the representative of its
+# group (the head of a chain, the first of a fan). ``groups`` maps each
+# representative that stands for more than one job to its sorted members.
+
+COLLAPSE_MODES = ("chains", "fans", "type")
+
+
+def _merge(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    groups: dict[str, list[str]],
+    partition: list[list[str]],
+) -> tuple[set[str], set[tuple[str, str]], dict[str, list[str]]]:
+    """Merge each node list in ``partition`` into one node represented by its first entry."""
+    rep_of = {node: node for node in jobs}
+    new_groups = {rep: members for rep, members in groups.items() if rep in jobs}
+    for part in partition:
+        if len(part) < 2:
+            continue
+        members = sorted(m for node in part for m in groups.get(node, [node]))
+        rep = part[0]
+        for node in part:
+            rep_of[node] = rep
+            new_groups.pop(node, None)
+        new_groups[rep] = members
+    new_jobs = set(rep_of.values())
+    new_edges = {(rep_of[s], rep_of[t]) for s, t in edges if rep_of[s] != rep_of[t]}
+    return new_jobs, new_edges, new_groups
+
+
+def _group_type(pipeline: Pipeline, node: str, groups: dict[str, list[str]]) -> str | None:
+    """Job type shared by every member of ``node``, or None for mixed groups."""
+    types = {
+        pipeline.jobs[m].job_type if m in pipeline.jobs else None
+        for m in groups.get(node, [node])
+    }
+    return types.pop() if len(types) == 1 else None
+
+
+def collapse_chains(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    groups: dict[str, list[str]] | None = None,
+    keep: set[str] | None = None,
+) -> tuple[set[str], set[tuple[str, str]], dict[str, list[str]]]:
+    """Merge linear runs into one node.
+
+    A link is part of a run when it is the only way out of its source and
+    the only way into its target, and the target has at most one child, so
+    hubs with several children are never swallowed into a chain.
+    """
+    groups = groups or {}
+    keep = keep or set()
+    out_deg: dict[str, int] = dict.fromkeys(jobs, 0)
+    in_deg: dict[str, int] = dict.fromkeys(jobs, 0)
+    for src, tgt in edges:
+        out_deg[src] += 1
+        in_deg[tgt] += 1
+
+    # Follow each chain from its head
+    nxt = {
+        src: tgt for src, tgt in edges
+        if out_deg[src] == 1 and in_deg[tgt] == 1 and out_deg[tgt] <= 1
+        and src not in keep and tgt not in keep
+    }
+    heads = set(nxt) - set(nxt.values())
+    partition = []
+    for head in sorted(heads):
+        chain = [head]
+        while chain[-1] in nxt:
+            chain.append(nxt[chain[-1]])
+        partition.append(chain)
+    return _merge(jobs, edges, groups, partition)
+
+
+def collapse_fans(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    groups: dict[str, list[str]] | None = None,
+    keep: set[str] | None = None,
+) -> tuple[set[str], set[tuple[str, str]], dict[str, list[str]]]:
+    """Merge same-type siblings that have exactly the same parents and children."""
+    groups = groups or {}
+    keep = keep or set()
+    parents: dict[str, set[str]] = {node: set() for node in jobs}
+    children: dict[str, set[str]] = {node: set() for node in jobs}
+    for src, tgt in edges:
+        children[src].add(tgt)
+        parents[tgt].add(src)
+
+    fans: dict[tuple, list[str]] = {}
+    for node in sorted(jobs - keep):
+        job_type = _group_type(pipeline, node, groups)
+        if job_type is None or not parents[node]:
+            continue
+        key = (job_type, frozenset(parents[node]), frozenset(children[node]))
+        fans.setdefault(key, []).append(node)
+    return _merge(jobs, edges, groups, list(fans.values()))
+
+
+def collapse_by_type(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    groups: dict[str, list[str]] | None = None,
+    keep: set[str] | None = None,
+) -> tuple[set[str], set[tuple[str, str]], dict[str, list[str]]]:
+    """Merge every node of the same job type into one node.
+
+    Mixed groups from earlier passes count as the type of their representative.
+    """
+    groups = groups or {}
+    keep = keep or set()
+    by_type: dict[str, list[str]] = {}
+    for node in sorted(jobs - keep):
+        job = pipeline.jobs.get(node)
+        by_type.setdefault(job.job_type if job else "", []).append(node)
+    return _merge(jobs, edges, groups, list(by_type.values()))
+
+
+def collapse_graph(
+    pipeline: Pipeline,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    modes: tuple[str, ...] = COLLAPSE_MODES,
+    max_nodes: int | None = None,
+    keep: set[str] | None = None,
+) -> tuple[set[str], set[tuple[str, str]], dict[str, list[str]]]:
+    """Apply the collapse ``modes`` in order, stopping once at most ``max_nodes`` remain.
+
+    Without ``max_nodes`` every mode is applied. Jobs in ``keep`` (e.g. the
+    focus job of a subgraph) are never merged.
+    """
+    groups: dict[str, list[str]] = {}
+    for mode in modes:
+        if max_nodes is not None and len(jobs) <= max_nodes:
+            break
+        if mode == "chains":
+            jobs, edges, groups = collapse_chains(jobs, edges, groups, keep)
+        elif mode == "fans":
+            jobs, edges, groups = collapse_fans(jobs, edges, pipeline, groups, keep)
+        elif mode == "type":
+            jobs, edges, groups = collapse_by_type(jobs, edges, pipeline, groups, keep)
+        else:
+            raise ValueError(f"Unknown collapse mode: {mode}")
+    return jobs, edges, groups
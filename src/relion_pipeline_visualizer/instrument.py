@@ -0,0 +1,222 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Per-stage and per-file timing for ``--profile``.
+
+Code marks its stages with ``stage(name)`` and the job files it reads with
+``file_read(path)``. Both do nothing unless a ``Profiler`` has been made
+active with ``profiling()``, so the hooks can stay in the normal code path.
+
+Bytes read come from the kernel's I/O counters (``rchar`` in
+``/proc/self/io`` for stages, ``/proc/thread-self/io`` for files, so reads
+on other enrichment threads are not counted twice); they are None on
+platforms without them.
+"""
+
+from __future__ import annotations
+
+import platform
+import sys
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+
+REPORT_VERSION = 1
+
+
+def _rchar(proc_file: str, start: bool) -> int | None:
+    """Bytes read so far according to ``proc_file``.
+
+    A ``start`` sample counts its own read of ``proc_file``, so the
+    difference to a later end sample is only what was read in between.
+    """
+    try:
+        with open(proc_file, "rb", buffering=0) as fp:
+            data = fp.read()
+    except OSError:
+        return None
+    for line in data.splitlines():
+        if line.startswith(b"rchar:"):
+            # The counter only includes this read once it has returned
+            return int(line[6:]) + (len(data) if start else 0)
+    return None
+
+
+@dataclass
+class StageTiming:
+    """Accumulated cost of every run of one stage."""
+    name: str
+    calls: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    bytes_read: int | None = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "bytes_read": self.bytes_read,
+        }
+
+
+@dataclass
+class FileRead:
+    """One job file read (or looked up in the enrichment cache)."""
+    path: str
+    stage: str | None = None
+    wall: float = 0.0
+    cpu: float = 0.0
+    bytes_read: int | None = None
+    cached: bool = False
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "stage": self.stage,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "bytes_read": self.bytes_read,
+            "cached": self.cached,
+        }
+
+
+@dataclass
+class Profiler:
+    """Collects stage timings and file reads for one run."""
+    stages: dict[str, StageTiming] = field(default_factory=dict)
+    files: list[FileRead] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    started_cpu: float = field(default_factory=time.process_time)
+    current_stage: str | None = None
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_stage(self, name: str, wall: float, cpu: float, bytes_read: int | None) -> None:
+        with self._lock:
+            timing = self.stages.setdefault(name, StageTiming(name))
+            timing.calls += 1
+            timing.wall += wall
+            timing.cpu += cpu
+            if timing.bytes_read is not None:
+                timing.bytes_read = None if bytes_read is None else timing.bytes_read + bytes_read
+
+    def add_file(self, read: FileRead) -> None:
+        with self._lock:
+            self.files.append(read)
+
+    def slowest_files(self, top: int) -> list[FileRead]:
+        return sorted(self.files, key=lambda r: r.wall, reverse=True)[:top]
+
+    def report(self, top: int = 10, argv: list[str] | None = None) -> dict:
+        """JSON-ready summary: totals, every stage and the ``top`` slowest files."""
+        sizes = [r.bytes_read for r in self.files if not r.cached]
+        return {
+            "report_version": REPORT_VERSION,
+            "package_version": _package_version(),
+            "python": platform.python_version(),
+            "platform": sys.platform,
+            "argv": argv,
+            "wall_s": round(time.perf_counter() - self.started, 6),
+            "cpu_s": round(time.process_time() - self.started_cpu, 6),
+            "stages": [timing.as_dict() for timing in self.stages.values()],
+            "files": {
+                "count": len(self.files),
+                "cached": sum(1 for r in self.files if r.cached),
+                "wall_s": round(sum(r.wall for r in self.files), 6),
+                "bytes_read": None if None in sizes else sum(sizes),
+                "slowest": [r.as_dict() for r in self.slowest_files(top)],
+            },
+        }
+
+
+def _package_version() -> str | None:
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return version("relion-pipeline-visualizer")
+    except PackageNotFoundError:
+        return None
+
+
+_active: Profiler | None = None
+
+
+@contextmanager
+def profiling(profiler: Profiler) -> Iterator[Profiler]:
+    """Make ``profiler`` receive every ``stage`` and ``file_read`` until exit."""
+    global _active
+    previous, _active = _active, profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of the run with the active profiler, if any."""
+    profiler = _active
+    if profiler is None:
+        yield
+        return
+    outer, profiler.current_stage = profiler.current_stage, name
+    rchar = _rchar("/proc/self/io", start=True)
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        after = _rchar("/proc/self/io", start=False)
+        profiler.add_stage(name, wall, cpu, None if rchar is None or after is None else after - rchar)
+        profiler.current_stage = outer
+
+
+# Returned when profiling is off; attributes set on it are ignored
+_UNRECORDED = FileRead("")
+
+
+@contextmanager
+def file_read(path: str | Path) -> Iterator[FileRead]:
+    """Time reading one file on the current thread; set ``.cached`` on a cache hit."""
+    profiler = _active
+    if profiler is None:
+        yield _UNRECORDED
+        return
+    read = FileRead(str(path), profiler.current_stage)
+    rchar = _rchar("/proc/thread-self/io", start=True)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield read
+    finally:
+        read.wall, read.cpu = time.perf_counter() - wall, time.thread_time() - cpu
+        after = _rchar("/proc/thread-self/io", start=False)
+        if rchar is not None and after is not None:
+            read.bytes_read = after - rchar
+        profiler.add_file(read)
+
+
+def format_summary(report: dict, top: int = 5) -> list[str]:
+    """A few human-readable lines from ``Profiler.report`` for stderr."""
+    def size(n: int | None) -> str:
+        return "?" if n is None else f"{n / 1024:.1f} KiB"
+
+    lines = [f"Profile: {report['wall_s']:.3f}s wall, {report['cpu_s']:.3f}s CPU"]
+    for s in report["stages"]:
+        lines.append(
+            f"  {s['name']:<16} {s['wall_s']:8.3f}s wall {s['cpu_s']:8.3f}s CPU "
+            f"{size(s['bytes_read']):>12}  ({s['calls']}x)"
+        )
+    files = report["files"]
+    if files["count"]:
+        lines.append(
+            f"  {files['count']} job files ({files['cached']} from cache), "
+            f"{files['wall_s']:.3f}s, {size(files['bytes_read'])} read; slowest:"
+        )
+        for r in files["slowest"][:top]:
+            lines.append(f"    {r['wall_s']:8.4f}s {size(r['bytes_read']):>12}  {r['path']}")
+    return lines
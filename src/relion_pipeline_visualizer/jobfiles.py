@@ -0,0 +1,88 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Per-job directory index built from a single ``os.scandir`` pass."""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# run_it025_model.star, run_ct25_it026_model.star, run_it010_half1_model.star
+ITERATION_MODEL_RE = re.compile(r"run(?:_ct(\d+))?_it(\d+)(?:_half([12]))?_model\.star")
+
+
+def iteration_model_key(filename: str) -> tuple[int, int, int] | None:
+    """Sort key ``(iteration, continuation, preference)`` for an iteration model file.
+
+    Returns None for any other file. Iterations are compared numerically, so
+    the key does not rely on zero-padding. For the same iteration the merged
+    model is preferred over ``_half1``, which is preferred over ``_half2``.
+    """
+    m = ITERATION_MODEL_RE.fullmatch(filename)
+    if m is None:
+        return None
+    ct, it, half = m.groups()
+    preference = 2 if half is None else (1 if half == "1" else 0)
+    return int(it), int(ct) if ct else 0, preference
+
+
+@dataclass
+class JobFileIndex:
+    """Files in one job directory, listed once and queried by name.
+
+    Covers the iteration models written by Class2D/Class3D, InitialModel,
+    Refine3D and MultiBody, including ``_ct`` continuation names.
+    """
+    job_dir: Path
+    entries: dict[str, os.DirEntry] = field(default_factory=dict)
+    last_model_name: str | None = None
+    last_model_key: tuple[int, int, int] | None = None
+
+    @classmethod
+    def scan(cls, job_dir: Path) -> JobFileIndex:
+        """List ``job_dir`` once; a missing directory gives an empty index."""
+        index = cls(job_dir)
+        try:
+            it = os.scandir(job_dir)
+        except (FileNotFoundError, NotADirectoryError):
+            return index
+        with it:
+            for entry in it:
+                index.entries[entry.name] = entry
+                key = iteration_model_key(entry.name)
+                if key is not None and (index.last_model_key is None or key > index.last_model_key):
+                    index.last_model_name, index.last_model_key = entry.name, key
+        return index
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def path(self, name: str) -> Path | None:
+        """Full path of ``name`` if it exists in the directory."""
+        return self.job_dir / name if name in self.entries else None
+
+    def stat(self, name: str) -> os.stat_result | None:
+        """Stat result of a regular file ``name``, or None if absent."""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        try:
+            if not entry.is_file():
+                return None
+            return entry.stat()
+        except OSError:
+            return None
+
+    @property
+    def last_iteration(self) -> int | None:
+        """Highest iteration number among the iteration model files."""
+        return self.last_model_key[0] if self.last_model_key else None
+
+    def last_iteration_model(self) -> Path | None:
+        """Model STAR file of the highest iteration, or None."""
+        return self.path(self.last_model_name) if self.last_model_name else None
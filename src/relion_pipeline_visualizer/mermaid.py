@@ -5,6 +5,10 @@
 
 from __future__ import annotations
 
+import io
+from dataclasses import dataclass
+from typing import TextIO
+
 from relion_pipeline_visualizer.parser import Pipeline
 
 # Color palette by job type
@@ -27,67 +31,158 @@ STATUS_STYLES = {
     "Running": "stroke:#FF9800,stroke-width:6px,stroke-dasharray:5",
 }
 
+# Jobs whose lineage continues beyond a depth limit
+TRUNCATED_STYLE = "stroke:#9E9E9E,stroke-width:6px,stroke-dasharray:2 8"
+TRUNCATED_MARKER = "<br/>⋯"
+
+# Collapsed nodes that merge jobs of different types
+COLLAPSED_STYLE = "fill:#9E9E9E,color:#fff,font-size:48px,stroke:#333,stroke-width:8px"
+
+
+def group_label(members: list[str], pipeline: Pipeline) -> str:
+    """Label for a collapsed node, e.g. '5 × Class3D' or '3 jobs<br/>Extract, JoinStar, Select'."""
+    types = sorted({pipeline.jobs[m].job_type for m in members if m in pipeline.jobs})
+    if len(types) == 1:
+        return f"{len(members)} × {types[0]}"
+    return f"{len(members)} jobs<br/>{', '.join(types)}"
+
+
+@dataclass
+class NodeStyle:
+    """How one drawn job looks, independent of the output format."""
+    node_id: str
+    label: str
+    type_class: str | None
+    status_class: str | None
+    truncated: bool
+
+    @property
+    def classes(self) -> list[str]:
+        """CSS classes in the order they are applied (later ones override)."""
+        classes = [self.type_class, self.status_class, "truncated" if self.truncated else None]
+        return [c for c in classes if c]
+
+
+def node_style(
+    job_name: str,
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> NodeStyle | None:
+    """Label and style classes of a job (or collapsed group); None if unknown."""
+    job = pipeline.jobs.get(job_name)
+    if job is None:
+        return None
+    groups = groups or {}
+    members = [pipeline.jobs[m] for m in groups.get(job_name, []) if m in pipeline.jobs] or [job]
+    if len(members) > 1:
+        label = group_label([m.name for m in members], pipeline)
+    else:
+        label = job.display_label
+    is_truncated = any(m.name in (truncated or ()) for m in members)
+    if is_truncated:
+        label += TRUNCATED_MARKER
+
+    if len({m.job_type for m in members}) > 1:
+        type_class = "collapsed"
+    elif job.job_type in TYPE_STYLES:
+        type_class = job.job_type.lower()
+    else:
+        type_class = None
+    status_class = next(
+        (status.lower() for status in STATUS_STYLES if any(m.status == status for m in members)),
+        None,
+    )
+    return NodeStyle(job.job_id, label, type_class, status_class, is_truncated)
+
 
 def render_mermaid(
     jobs: set[str],
     edges: set[tuple[str, str]],
     pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
 ) -> str:
-    lines = ["graph TD"]
+    """Render a Mermaid flowchart to a string (see ``render_mermaid_to``)."""
+    buf = io.StringIO()
+    render_mermaid_to(buf, jobs, edges, pipeline, truncated, groups)
+    return buf.getvalue()
+
+
+def render_mermaid_to(
+    fp: TextIO,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> None:
+    """Write a Mermaid flowchart to ``fp`` line by line.
+
+    ``truncated`` jobs are marked as cut by a depth limit. Nodes listed in
+    ``groups`` (see ``graph.collapse_graph``) are drawn as one summary node
+    for all of their member jobs.
+    """
+    fp.write("graph TD\n")
 
     # Group jobs by type for class assignment
     type_members: dict[str, list[str]] = {}
     status_members: dict[str, list[str]] = {}
+    truncated_members: list[str] = []
 
     # Sort jobs for deterministic output
     for job_name in sorted(jobs):
-        job = pipeline.jobs.get(job_name)
-        if job is None:
+        style = node_style(job_name, pipeline, truncated, groups)
+        if style is None:
             continue
-        node_id = job.job_id
-        label = job.display_label
-        lines.append(f'    {node_id}["{label}"]')
+        node_id = style.node_id
+        fp.write(f'    {node_id}["{style.label}"]\n')
+        if style.type_class:
+            type_members.setdefault(style.type_class, []).append(node_id)
+        if style.status_class:
+            status_members.setdefault(style.status_class, []).append(node_id)
+        if style.truncated:
+            truncated_members.append(node_id)
 
-        job_type = job.job_type
-        if job_type in TYPE_STYLES:
-            type_members.setdefault(job_type, []).append(node_id)
-
-        if job.status in STATUS_STYLES:
-            status_members.setdefault(job.status, []).append(node_id)
-
-    lines.append("")
+    fp.write("\n")
 
     # Edges (sorted for deterministic output)
     for src, tgt in sorted(edges):
         src_job = pipeline.jobs.get(src)
         tgt_job = pipeline.jobs.get(tgt)
         if src_job and tgt_job:
-            lines.append(f"    {src_job.job_id} --> {tgt_job.job_id}")
+            fp.write(f"    {src_job.job_id} --> {tgt_job.job_id}\n")
 
-    lines.append("")
+    fp.write("\n")
 
     # classDef for each job type
     for type_name, style in TYPE_STYLES.items():
         css_class = type_name.lower()
-        lines.append(f"    classDef {css_class} {style}")
+        fp.write(f"    classDef {css_class} {style}\n")
 
     # classDef for status overrides
     for status, style in STATUS_STYLES.items():
         css_class = status.lower()
-        lines.append(f"    classDef {css_class} {style}")
+        fp.write(f"    classDef {css_class} {style}\n")
+
+    if "collapsed" in type_members:
+        fp.write(f"    classDef collapsed {COLLAPSED_STYLE}\n")
 
-    lines.append("")
+    if truncated_members:
+        fp.write(f"    classDef truncated {TRUNCATED_STYLE}\n")
+
+    fp.write("\n")
 
     # Apply type classes
-    for type_name, members in sorted(type_members.items()):
-        css_class = type_name.lower()
+    for css_class, members in sorted(type_members.items()):
         member_list = ",".join(sorted(members))
-        lines.append(f"    class {member_list} {css_class}")
+        fp.write(f"    class {member_list} {css_class}\n")
 
     # Apply status classes (these override the border/stroke only)
-    for status, members in sorted(status_members.items()):
-        css_class = status.lower()
+    for css_class, members in sorted(status_members.items()):
         member_list = ",".join(sorted(members))
-        lines.append(f"    class {member_list} {css_class}")
+        fp.write(f"    class {member_list} {css_class}\n")
 
-    return "\n".join(lines) + "\n"
+    # Mark jobs cut by a depth limit
+    if truncated_members:
+        fp.write(f"    class {','.join(sorted(truncated_members))} truncated\n")
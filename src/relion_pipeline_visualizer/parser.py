@@ -5,14 +5,30 @@
 
 from __future__ import annotations
 
+import hashlib
+import os
 import re
-from dataclasses import dataclass, field
+import sys
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict, dataclass, field, fields
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import starfile
+from relion_pipeline_visualizer.instrument import file_read
+from relion_pipeline_visualizer.jobfiles import JobFileIndex, iteration_model_key
+from relion_pipeline_visualizer.star import (
+    StarParseError,
+    find_loop_blocks,
+    iter_loop_rows,
+    iter_star_rows,
+    read_star_blocks,
+)
 
+if TYPE_CHECKING:
+    from relion_pipeline_visualizer.cache import EnrichmentCache
 
-@dataclass
+
+@dataclass(slots=True)
 class ModelClassInfo:
     """Per-class statistics from a RELION model STAR file."""
     class_index: int
@@ -23,15 +39,24 @@ class ModelClassInfo:
     overall_fourier_completeness: float
 
 
-@dataclass
+@dataclass(slots=True)
 class ModelGeneralInfo:
     """General model statistics from a RELION model STAR file."""
     pixel_size: float | None = None
     iteration: int | None = None
 
 
-@dataclass
+_JOB_ID = re.compile(r"(job\d+)")
+
+
+@dataclass(slots=True)
 class Job:
+    """One pipeline process.
+
+    ``job_type`` and ``job_id`` are derived once from the name, and
+    ``display_label`` from the name and alias, as rendering reads them for
+    every node. Assigning ``alias`` updates the label.
+    """
     name: str  # e.g. "Refine3D/job058/"
     alias: str | None  # e.g. "Refine3D/j087_J068_c01/" or None
     type_label: str  # e.g. "relion.refine3d"
@@ -39,34 +64,183 @@ class Job:
     last_command: str | None = None
     model_classes: list[ModelClassInfo] | None = None
     model_general: ModelGeneralInfo | None = None
+    job_type: str = field(init=False, repr=False, compare=False)  # e.g. "Refine3D"
+    job_id: str = field(init=False, repr=False, compare=False)  # e.g. "job058"
+    display_label: str = field(init=False, repr=False, compare=False)  # Mermaid node label
+
+    def __post_init__(self) -> None:
+        job_type, _, rest = self.name.partition("/")
+        self.job_type = sys.intern(job_type)
+        # Names are almost always 'Type/jobNNN/'; anything else takes the regex
+        job_id = rest[:-1]
+        if not (job_id.startswith("job") and job_id[3:].isdigit() and rest.endswith("/")):
+            m = _JOB_ID.search(self.name)
+            job_id = m.group(1) if m else self.name
+        self.job_id = job_id
+        # display_label was set along with the alias, see _set_alias
+
+
+def _display_label(name: str, alias: str | None) -> str:
+    if alias:
+        return f"{alias.rstrip('/').split('/')[-1]}<br/>{name.partition('/')[0]}"
+    return name.rstrip("/")
+
+
+# Route assignments to Job.alias (including the one in __init__) through
+# the slot's own descriptor plus a relabel, so display_label never goes stale
+_alias_slot = Job.alias
+
+
+def _set_alias(job: Job, alias: str | None) -> None:
+    _alias_slot.__set__(job, alias)
+    job.display_label = _display_label(job.name, alias)
+
+
+Job.alias = property(_alias_slot.__get__, _set_alias)
+
+
+class EdgeSet(set):
+    """Set of (source_job, target_job) edges that counts its own mutations.
+
+    ``version`` changes whenever the set is modified, which lets derived
+    structures such as the graph adjacency index know when to rebuild.
+    """
+    __slots__ = ("version",)
+
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self.version = 0
 
-    @property
-    def job_type(self) -> str:
-        """Extract short type like 'Refine3D' from the job name."""
-        return self.name.split("/")[0]
+    def add(self, edge):
+        self.version += 1
+        super().add(edge)
 
-    @property
-    def job_id(self) -> str:
-        """Extract job ID like 'job058' from the job name."""
-        m = re.search(r"(job\d+)", self.name)
-        return m.group(1) if m else self.name
+    def discard(self, edge):
+        self.version += 1
+        super().discard(edge)
 
-    @property
-    def display_label(self) -> str:
-        """Label for Mermaid node display."""
-        if self.alias:
-            alias_short = self.alias.rstrip("/").split("/")[-1]
-            return f"{alias_short}<br/>{self.job_type}"
-        return self.name.rstrip("/")
+    def remove(self, edge):
+        self.version += 1
+        super().remove(edge)
+
+    def pop(self):
+        self.version += 1
+        return super().pop()
+
+    def clear(self):
+        self.version += 1
+        super().clear()
+
+    def update(self, *others):
+        self.version += 1
+        super().update(*others)
+
+    def difference_update(self, *others):
+        self.version += 1
+        super().difference_update(*others)
+
+    def intersection_update(self, *others):
+        self.version += 1
+        super().intersection_update(*others)
+
+    def symmetric_difference_update(self, other):
+        self.version += 1
+        super().symmetric_difference_update(other)
+
+    def __ior__(self, other):
+        self.version += 1
+        return super().__ior__(other)
+
+    def __iand__(self, other):
+        self.version += 1
+        return super().__iand__(other)
+
+    def __isub__(self, other):
+        self.version += 1
+        return super().__isub__(other)
+
+    def __ixor__(self, other):
+        self.version += 1
+        return super().__ixor__(other)
 
 
 @dataclass
 class Pipeline:
     jobs: dict[str, Job] = field(default_factory=dict)
-    edges: set[tuple[str, str]] = field(default_factory=set)  # (source_job, target_job)
+    edges: EdgeSet = field(default_factory=EdgeSet)  # (source_job, target_job)
+    # Adjacency index cached by graph.get_adjacency()
+    _adjacency: object = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.edges, EdgeSet):
+            self.edges = EdgeSet(self.edges)
+
+
+PIPELINE_BLOCKS = {"pipeline_processes", "pipeline_input_edges", "pipeline_output_edges"}
 
 
 def parse_pipeline(path: str | Path) -> Pipeline:
+    """Parse a RELION default_pipeline.star into jobs and job-to-job edges.
+
+    Uses the built-in streaming reader and only falls back to ``starfile``
+    when the file is not in the layout RELION writes.
+    """
+    try:
+        return _parse_pipeline_native(path)
+    except StarParseError:
+        return _parse_pipeline_starfile(path)
+
+
+def _add_process(pipeline: Pipeline, row) -> None:
+    # Names are interned so that edges share the job's string; type and
+    # status labels repeat across thousands of jobs
+    name = sys.intern(row["rlnPipeLineProcessName"])
+    alias_raw = row["rlnPipeLineProcessAlias"]
+    alias = None if alias_raw == "None" else alias_raw
+    pipeline.jobs[name] = Job(
+        name=name,
+        alias=alias,
+        type_label=sys.intern(row["rlnPipeLineProcessTypeLabel"]),
+        status=sys.intern(row["rlnPipeLineProcessStatusLabel"]),
+    )
+
+
+def _derive_edges(
+    pipeline: Pipeline,
+    input_edges: Iterable[tuple[str, str]],
+    node_producer: dict[str, str],
+) -> None:
+    """Add job-to-job edges for (node, consuming job) pairs."""
+    for node_name, target_job in input_edges:
+        source_job = node_producer.get(node_name)
+        if source_job and source_job != target_job:
+            pipeline.edges.add((sys.intern(source_job), sys.intern(target_job)))
+
+
+def _parse_pipeline_native(path: str | Path) -> Pipeline:
+    pipeline = Pipeline()
+    # Input edges are written before output edges, so keep them until every
+    # node producer is known.
+    input_edges: list[tuple[str, str]] = []
+    node_producer: dict[str, str] = {}
+
+    for block, row in iter_star_rows(path, PIPELINE_BLOCKS):
+        if block == "pipeline_processes":
+            _add_process(pipeline, row)
+        elif block == "pipeline_input_edges":
+            input_edges.append((row["rlnPipeLineEdgeFromNode"], row["rlnPipeLineEdgeProcess"]))
+        elif block == "pipeline_output_edges":
+            node_producer[row["rlnPipeLineEdgeToNode"]] = row["rlnPipeLineEdgeProcess"]
+
+    _derive_edges(pipeline, input_edges, node_producer)
+    return pipeline
+
+
+def _parse_pipeline_starfile(path: str | Path) -> Pipeline:
+    # starfile pulls in pandas, so it is only imported for files the
+    # native reader cannot handle
+    import starfile
+
     data = starfile.read(str(path))
 
     processes = data["pipeline_processes"]
@@ -76,45 +250,248 @@ def parse_pipeline(path: str | Path) -> Pipeline:
     # Build job lookup
     pipeline = Pipeline()
     for _, row in processes.iterrows():
-        name = row["rlnPipeLineProcessName"]
-        alias_raw = row["rlnPipeLineProcessAlias"]
-        alias = None if alias_raw == "None" else alias_raw
-        pipeline.jobs[name] = Job(
-            name=name,
-            alias=alias,
-            type_label=row["rlnPipeLineProcessTypeLabel"],
-            status=row["rlnPipeLineProcessStatusLabel"],
-        )
+        _add_process(pipeline, row)
 
     # Build node-to-producing-job map from output edges
     # output_edges: Job -> Node
     node_producer: dict[str, str] = {}
     for _, row in output_edges.iterrows():
-        job_name = row["rlnPipeLineEdgeProcess"]
-        node_name = row["rlnPipeLineEdgeToNode"]
-        node_producer[node_name] = job_name
+        node_producer[row["rlnPipeLineEdgeToNode"]] = row["rlnPipeLineEdgeProcess"]
 
     # Derive job-to-job edges from input edges
     # input_edges: Node -> Job (node is consumed by job)
-    for _, row in input_edges.iterrows():
-        node_name = row["rlnPipeLineEdgeFromNode"]
-        target_job = row["rlnPipeLineEdgeProcess"]
-        source_job = node_producer.get(node_name)
-        if source_job and source_job != target_job:
-            pipeline.edges.add((source_job, target_job))
+    _derive_edges(
+        pipeline,
+        zip(input_edges["rlnPipeLineEdgeFromNode"], input_edges["rlnPipeLineEdgeProcess"]),
+        node_producer,
+    )
+    return pipeline
+
 
+@dataclass
+class _BlockState:
+    columns: list[str]
+    length: int  # characters from the first row to the end of the last row read
+    rows: int
+    digest: bytes
+
+
+@dataclass
+class PipelineParseState:
+    """What ``update_pipeline`` remembers about the pipeline file it last read.
+
+    Start with an empty state; ``full_parse`` tells whether the last update
+    had to read the whole file.
+    """
+    file_key: tuple[int, int] | None = None
+    blocks: dict[str, _BlockState] = field(default_factory=dict)
+    process_names: list[str] = field(default_factory=list)
+    node_producer: dict[str, str] = field(default_factory=dict)
+    # Input edges whose producing job has not been seen yet
+    pending_inputs: list[tuple[str, str]] = field(default_factory=list)
+    full_parse: bool = False
+
+    def reset(self) -> None:
+        """Forget everything read so far."""
+        empty = PipelineParseState()
+        for f in fields(self):
+            setattr(self, f.name, getattr(empty, f.name))
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _apply_new_rows(text: str, found: dict, state: PipelineParseState, block: str, fresh: bool):
+    """Yield the rows of ``block`` that ``state`` has not seen, updating it.
+
+    Raises ``_Restructured`` when the rows already read have changed.
+    """
+    known = None if fresh else state.blocks.get(block)
+    if block not in found:
+        if known is not None and known.rows:
+            raise _Restructured(block)
+        return
+    columns, start, end = found[block]
+    if known is None:
+        known = _BlockState(columns, 0, 0, _digest(""))
+    elif (
+        known.columns != columns
+        or start + known.length > end
+        or _digest(text[start:start + known.length]) != known.digest
+    ):
+        raise _Restructured(block)
+
+    read_end = start + known.length
+    for row, line_end in iter_loop_rows(text, read_end, end, columns):
+        known.rows += 1
+        read_end = line_end
+        yield row
+    known.length = read_end - start
+    known.digest = _digest(text[start:read_end])
+    state.blocks[block] = known
+
+
+class _Restructured(Exception):
+    """Rows that were already applied have changed; a full parse is needed."""
+
+
+def update_pipeline(
+    pipeline: Pipeline | None,
+    path: str | Path,
+    state: PipelineParseState,
+) -> Pipeline:
+    """Bring ``pipeline`` up to date with the file at ``path``.
+
+    RELION rewrites ``default_pipeline.star`` by appending rows to each
+    block and changing status labels in place. This applies only the new
+    process, input and output edge rows and the changed labels to the given
+    pipeline, remembering in ``state`` how far each block has been read.
+    Earlier edge rows are not tokenised again; their text is only compared
+    with a stored digest. When rows were removed or rewritten (e.g. a job
+    was deleted), or an appended output row gives a node a new producer,
+    everything is parsed again. The returned pipeline is the same object
+    unless a full parse was needed (or ``pipeline`` was None).
+    """
+    path = Path(path)
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    if pipeline is not None and key == state.file_key:
+        state.full_parse = False
+        return pipeline
+
+    text = path.read_text()
+    try:
+        found = find_loop_blocks(text, PIPELINE_BLOCKS)
+    except StarParseError:
+        # Not the layout RELION writes: parse it in full every time
+        state.reset()
+        state.full_parse = True
+        return parse_pipeline(path)
+
+    fresh = pipeline is None
+    if not fresh:
+        try:
+            _apply_pipeline_rows(pipeline, text, found, state, fresh=False)
+        except (_Restructured, StarParseError):
+            fresh = True
+    if fresh:
+        pipeline = Pipeline()
+        state.reset()
+        _apply_pipeline_rows(pipeline, text, found, state, fresh=True)
+    state.file_key = key
+    state.full_parse = fresh
     return pipeline
 
 
-def parse_note_txt(project_dir: Path, job_name: str) -> str | None:
-    """Extract the last executed command from a job's note.txt file."""
-    note_path = project_dir / job_name / "note.txt"
+def _apply_pipeline_rows(
+    pipeline: Pipeline,
+    text: str,
+    found: dict,
+    state: PipelineParseState,
+    fresh: bool,
+) -> None:
+    # Processes: every row is re-read because status labels change in place,
+    # but existing jobs must keep their order
+    rows: list[dict[str, str]] = []
+    names: list[str] = []
+    if "pipeline_processes" in found:
+        columns, start, end = found["pipeline_processes"]
+        rows = [row for row, _ in iter_loop_rows(text, start, end, columns)]
+        names = [row["rlnPipeLineProcessName"] for row in rows]
+    if names[:len(state.process_names)] != state.process_names:
+        raise _Restructured("pipeline_processes")
+
+    # Collect the new edge rows before touching the pipeline, so a
+    # restructured file leaves it unchanged
+    outputs = list(_apply_new_rows(text, found, state, "pipeline_output_edges", fresh))
+    inputs = list(_apply_new_rows(text, found, state, "pipeline_input_edges", fresh))
+    # A node taking a new producer would move edges already derived from
+    # it; the full parse links every input to the node's last producer
+    for row in outputs:
+        producer = state.node_producer.get(row["rlnPipeLineEdgeToNode"])
+        if producer is not None and producer != row["rlnPipeLineEdgeProcess"]:
+            raise _Restructured("pipeline_output_edges")
+
+    for row, name in zip(rows, names):
+        job = pipeline.jobs.get(name)
+        if job is None:
+            _add_process(pipeline, row)
+            continue
+        alias_raw = row["rlnPipeLineProcessAlias"]
+        alias = None if alias_raw == "None" else alias_raw
+        if alias != job.alias:
+            job.alias = alias
+        job.type_label = sys.intern(row["rlnPipeLineProcessTypeLabel"])
+        job.status = sys.intern(row["rlnPipeLineProcessStatusLabel"])
+    state.process_names = names
+
+    for row in outputs:
+        state.node_producer[row["rlnPipeLineEdgeToNode"]] = row["rlnPipeLineEdgeProcess"]
+    pending = state.pending_inputs + [
+        (row["rlnPipeLineEdgeFromNode"], row["rlnPipeLineEdgeProcess"]) for row in inputs
+    ]
+    state.pending_inputs = [edge for edge in pending if edge[0] not in state.node_producer]
+    _derive_edges(pipeline, (edge for edge in pending if edge[0] in state.node_producer), state.node_producer)
+
+
+NOTE_BLOCK_SIZE = 8192
+
+
+def iter_note_commands(note_path: Path, block_size: int = NOTE_BLOCK_SIZE) -> Iterator[str]:
+    """Lazily yield the commands recorded in a note.txt file, newest first.
+
+    RELION writes each command as a line starting with a backtick after a
+    ``++++ Executing command`` header. The file is read backwards in
+    ``block_size`` chunks, so taking only the first command reads just the
+    tail of the file however many times the job was continued.
+    """
+    with open(note_path, "rb") as fh:
+        pos = fh.seek(0, 2)
+        carry = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            fh.seek(pos)
+            lines = (fh.read(step) + carry).split(b"\n")
+            # The first piece may be the tail of a line that starts in an
+            # earlier block; keep it until that block has been read.
+            if pos > 0:
+                carry = lines.pop(0)
+            for line in reversed(lines):
+                if line.startswith(b"`") and len(line.rstrip(b"\r")) > 1:
+                    yield line.decode(errors="replace").strip()
+
+
+def read_last_command(note_path: Path) -> str | None:
+    """Return the last command recorded in a note.txt file, or None."""
     if not note_path.is_file():
         return None
-    text = note_path.read_text()
-    # Each command block: line starting with ` through to the next ++++ line
-    commands = re.findall(r"^(`[^\n]+)", text, re.MULTILINE)
-    return commands[-1].strip() if commands else None
+    return next(iter_note_commands(note_path), None)
+
+
+def parse_note_txt(project_dir: Path, job_name: str) -> str | None:
+    """Extract the last executed command from a job's note.txt file."""
+    return read_last_command(project_dir / job_name / "note.txt")
+
+
+MODEL_BLOCKS = {"model_general", "model_classes"}
+
+
+def _read_model_blocks(model_path: Path) -> dict:
+    """Read the model_general and model_classes blocks of a model STAR file."""
+    try:
+        return read_star_blocks(model_path, MODEL_BLOCKS)
+    except StarParseError:
+        import starfile
+
+        data = starfile.read(str(model_path))
+        blocks: dict = {}
+        for key, value in data.items():
+            for name in MODEL_BLOCKS:
+                if name in key and name not in blocks:
+                    blocks[name] = value if isinstance(value, dict) else value.to_dict("records")
+        return blocks
 
 
 def parse_model_star(model_path: Path) -> tuple[list[ModelClassInfo] | None, ModelGeneralInfo | None]:
@@ -122,41 +499,35 @@ def parse_model_star(model_path: Path) -> tuple[list[ModelClassInfo] | None, Mod
     if not model_path.is_file():
         return None, None
     try:
-        data = starfile.read(str(model_path))
+        data = _read_model_blocks(model_path)
     except Exception:
         return None, None
 
     # Parse model_general
     general = None
-    general_key = None
-    for key in data:
-        if "model_general" in key:
-            general_key = key
-            break
-    if general_key is not None:
-        gen = data[general_key]
+    gen = data.get("model_general")
+    if isinstance(gen, list):
+        gen = gen[0] if gen else None
+    if gen is not None:
         pixel_size = None
         iteration = None
         if "rlnPixelSize" in gen:
             pixel_size = float(gen["rlnPixelSize"])
         # Extract iteration from filename (run_it025_model.star -> 25)
-        m = re.search(r"run_it(\d+)_", model_path.name)
-        if m:
-            iteration = int(m.group(1))
+        key = iteration_model_key(model_path.name)
+        if key is not None:
+            iteration = key[0]
         general = ModelGeneralInfo(pixel_size=pixel_size, iteration=iteration)
 
     # Parse model_classes
-    table_key = None
-    for key in data:
-        if "model_classes" in key:
-            table_key = key
-            break
-    if table_key is None:
+    rows = data.get("model_classes")
+    if rows is None:
         return None, general
+    if isinstance(rows, dict):
+        rows = [rows]
 
-    df = data[table_key]
     results = []
-    for _, row in df.iterrows():
+    for row in rows:
         results.append(ModelClassInfo(
             class_index=len(results) + 1,
             class_distribution=float(row.get("rlnClassDistribution", 0.0)),
@@ -170,20 +541,125 @@ def parse_model_star(model_path: Path) -> tuple[list[ModelClassInfo] | None, Mod
 
 def find_last_iteration_model(project_dir: Path, job_name: str) -> Path | None:
     """Find the last iteration model STAR file for a Class3D job."""
-    job_dir = project_dir / job_name
-    model_files = sorted(job_dir.glob("run_it*_model.star"))
-    return model_files[-1] if model_files else None
-
-
-def enrich_jobs(pipeline: Pipeline, project_dir: Path) -> None:
-    """Enrich jobs with note.txt commands and model data. Modifies in-place."""
-    for job_name, job in pipeline.jobs.items():
-        job.last_command = parse_note_txt(project_dir, job_name)
-
-        if job.job_type == "Refine3D":
-            model_path = project_dir / job_name / "run_model.star"
-            job.model_classes, job.model_general = parse_model_star(model_path)
-        elif job.job_type == "Class3D":
-            model_path = find_last_iteration_model(project_dir, job_name)
-            if model_path:
-                job.model_classes, job.model_general = parse_model_star(model_path)
+    return JobFileIndex.scan(project_dir / job_name).last_iteration_model()
+
+
+def _model_to_json(model: tuple[list[ModelClassInfo] | None, ModelGeneralInfo | None]) -> dict:
+    classes, general = model
+    return {
+        "classes": [asdict(mc) for mc in classes] if classes else None,
+        "general": asdict(general) if general else None,
+    }
+
+
+def _model_from_json(value: dict) -> tuple[list[ModelClassInfo] | None, ModelGeneralInfo | None]:
+    classes = [ModelClassInfo(**mc) for mc in value["classes"]] if value["classes"] else None
+    general = ModelGeneralInfo(**value["general"]) if value["general"] else None
+    return classes, general
+
+
+def _read_cached(
+    cache: EnrichmentCache | None,
+    path: Path,
+    parse,
+    encode=None,
+    decode=None,
+    stat: os.stat_result | None = None,
+):
+    """Return ``parse(path)``, reusing the cached result while the file is unchanged."""
+    with file_read(path) as read:
+        if cache is None:
+            return parse(path)
+        if stat is None:
+            try:
+                stat = path.stat()
+            except OSError:
+                return parse(path)
+        found, value = cache.get(path, stat)
+        if found:
+            read.cached = True
+            return decode(value) if decode else value
+        result = parse(path)
+        cache.put(path, stat, encode(result) if encode else result)
+        return result
+
+
+def _enrich_job(
+    project_dir: Path,
+    job: Job,
+    cache: EnrichmentCache | None = None,
+) -> tuple[str | None, list[ModelClassInfo] | None, ModelGeneralInfo | None]:
+    """Read note.txt and model statistics for one job without modifying it."""
+    # One directory listing answers every existence/stat question below
+    index = JobFileIndex.scan(project_dir / job.name)
+
+    last_command = None
+    note_stat = index.stat("note.txt")
+    if note_stat is not None:
+        last_command = _read_cached(cache, index.path("note.txt"), read_last_command, stat=note_stat)
+
+    model_name = None
+    if job.job_type == "Refine3D":
+        model_name = "run_model.star"
+    elif job.job_type == "Class3D":
+        model_name = index.last_model_name
+
+    model_classes, model_general = None, None
+    model_stat = index.stat(model_name) if model_name else None
+    if model_stat is not None:
+        model_classes, model_general = _read_cached(
+            cache, index.path(model_name), parse_model_star, _model_to_json, _model_from_json, stat=model_stat,
+        )
+
+    return last_command, model_classes, model_general
+
+
+def enrich_jobs(
+    pipeline: Pipeline,
+    project_dir: Path,
+    job_names: Iterable[str] | None = None,
+    workers: int = 1,
+    cache: EnrichmentCache | None = None,
+) -> dict[str, Exception]:
+    """Enrich jobs with note.txt commands and model data. Modifies in-place.
+
+    Only the jobs in ``job_names`` are read when it is given (typically the
+    job set returned by ``get_subgraph``), so files of jobs that will not be
+    rendered are never touched.
+
+    With ``workers > 1`` jobs are read concurrently on a bounded thread pool,
+    which mostly helps on network filesystems where each metadata call is
+    slow. Results are applied in pipeline order either way. A job whose
+    files cannot be read is left unenriched and its error is returned,
+    keyed by job name, instead of aborting the whole run. Parsed files are
+    looked up in, and added to, ``cache`` when one is given.
+    """
+    if job_names is None:
+        jobs = list(pipeline.jobs.values())
+    else:
+        wanted = set(job_names)
+        jobs = [job for name, job in pipeline.jobs.items() if name in wanted]
+    errors: dict[str, Exception] = {}
+
+    def visit(job: Job):
+        try:
+            return _enrich_job(project_dir, job, cache)
+        except (OSError, ValueError) as exc:
+            return exc
+
+    if workers > 1 and len(jobs) > 1:
+        # Imported here: concurrent.futures also loads logging and inspect
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(visit, jobs))
+    else:
+        outcomes = [visit(job) for job in jobs]
+
+    for job, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, Exception):
+            errors[job.name] = outcome
+            continue
+        job.last_command, job.model_classes, job.model_general = outcome
+
+    return errors
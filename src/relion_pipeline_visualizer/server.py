@@ -0,0 +1,400 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Long-running HTTP server for the ``serve`` subcommand.
+
+The pipeline is parsed once and kept in memory together with the enrichment
+read so far and its adjacency index; every lineage request is answered from
+those, and rendered pages are kept in an LRU cache. A background thread
+polls the STAR file with ``PipelineWatcher`` and empties the cache whenever
+the pipeline changes.
+"""
+
+from __future__ import annotations
+
+import copy
+import html
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from relion_pipeline_visualizer.formats import FORMATS
+from relion_pipeline_visualizer.graph import (
+    COLLAPSE_MODES,
+    collapse_graph,
+    get_adjacency,
+    get_neighbourhood,
+    get_subgraphs,
+    transitive_reduction,
+)
+from relion_pipeline_visualizer.mermaid import render_mermaid_to
+from relion_pipeline_visualizer.parser import Pipeline, parse_pipeline
+from relion_pipeline_visualizer.svg import render_svg_to
+from relion_pipeline_visualizer.watch import PipelineWatcher
+from relion_pipeline_visualizer.writers import (
+    INDEX_ROW_TEMPLATE,
+    INDEX_TEMPLATE,
+    build_job_info,
+    version_poller,
+    write_html,
+)
+
+logger = logging.getLogger(__name__)
+
+# Clicking a job in a served page opens that job's lineage with the same
+# view options; summary nodes of collapsed groups are not jobs.
+_NAVIGATE_SCRIPT = """\
+  <script>
+    document.addEventListener("click", function(e) {
+      var node = e.target.closest && e.target.closest(".node");
+      if (!node) return;
+      var did = node.getAttribute("data-id");
+      var m = did && did in jobInfo ? [did] : node.id.match(/job\\d+/);
+      if (m && jobInfo[m[0]] && !jobInfo[m[0]].members) location.href = m[0] + location.search;
+    });
+  </script>
+"""
+
+
+class LRUCache:
+    """A small least-recently-used mapping with hit/miss counters."""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key):
+        """The cached value for ``key`` (now the most recent), or None."""
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._items[key]
+
+    def put(self, key, value) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+
+def _flag(query: dict[str, list[str]], name: str) -> bool:
+    value = query.get(name, ["0"])[-1].lower()
+    if value in ("1", "true", "yes", "on", ""):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"{name} must be 0 or 1, not {value!r}")
+
+
+def _count(query: dict[str, list[str]], name: str, default: int | None) -> int | None:
+    if name not in query:
+        return default
+    value = query[name][-1]
+    if not value.isdigit():
+        raise ValueError(f"{name} must be a non-negative integer, not {value!r}")
+    return int(value)
+
+
+@dataclass(frozen=True)
+class ViewOptions:
+    """What one lineage request asks for; also its key in the page cache."""
+    upstream: bool = True
+    downstream: bool = False
+    depth: int | None = None
+    reduce: bool = False
+    collapse: str | None = None
+    max_nodes: int = 200
+    format: str = "html"
+
+    @classmethod
+    def from_query(cls, query: str) -> ViewOptions:
+        """Parse ``up=1&down=1&depth=N&reduce=1&collapse=auto&max_nodes=N&format=...``.
+
+        As on the command line, the lineage is upstream when neither
+        direction is given. Raises ValueError for invalid values.
+        """
+        params = parse_qs(query, keep_blank_values=True)
+        upstream, downstream = _flag(params, "up"), _flag(params, "down")
+        collapse = params.get("collapse", [None])[-1] or None
+        if collapse not in (None, "auto", *COLLAPSE_MODES):
+            raise ValueError(f"unknown collapse mode {collapse!r}")
+        fmt = params.get("format", ["html"])[-1]
+        if fmt != "html" and fmt not in FORMATS:
+            raise ValueError(f"unknown format {fmt!r}")
+        return cls(
+            upstream=upstream or not downstream,
+            downstream=downstream,
+            depth=_count(params, "depth", None),
+            reduce=_flag(params, "reduce"),
+            collapse=collapse,
+            max_nodes=_count(params, "max_nodes", 200),
+            format=fmt,
+        )
+
+
+class PipelineService:
+    """The in-memory pipeline behind the server.
+
+    ``enrich(pipeline, job_names)`` reads note.txt and model files for jobs
+    the first time a page shows them. ``refresh`` updates the pipeline in
+    place, so it is only read under the lock: a request copies the jobs of
+    its lineage and enriches and renders the copy without holding it.
+    """
+
+    def __init__(
+        self,
+        star_path: str | Path,
+        *,
+        enrich: Callable[[Pipeline, set[str]], None] | None = None,
+        renderer: str = "mermaid",
+        scripts: str | None = None,
+        cache_size: int = 128,
+        poll_interval: float = 5.0,
+    ):
+        self.star_path = Path(star_path)
+        self.enrich = enrich
+        self.renderer = renderer
+        self.scripts = scripts
+        self.poll_interval = poll_interval
+        self.watcher = PipelineWatcher(self.star_path, parse_pipeline(self.star_path))
+        self.enriched: set[str] = set()
+        self.cache = LRUCache(cache_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller: threading.Thread | None = None
+        self._reindex()
+
+    @property
+    def pipeline(self) -> Pipeline:
+        return self.watcher.pipeline
+
+    def _reindex(self) -> None:
+        """Rebuild the job ID lookup and the adjacency index for a new pipeline state."""
+        self.job_ids = {job.job_id: name for name, job in self.pipeline.jobs.items()}
+        get_adjacency(self.pipeline)
+        self.version = str(time.time_ns())
+
+    def refresh(self) -> bool:
+        """Poll the pipeline once; return True (and drop cached pages) if it changed."""
+        with self._lock:
+            pipeline_changed, changed = self.watcher.poll()
+            if not (pipeline_changed or changed):
+                return False
+            self.enriched -= changed
+            self.cache.clear()
+            self._reindex()
+            return True
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                if self.refresh():
+                    logger.info("Pipeline changed; %d jobs", len(self.pipeline.jobs))
+            except (OSError, ValueError) as e:
+                logger.warning("Could not read the pipeline (%s); retrying", e)
+
+    def start_polling(self) -> None:
+        """Refresh in a background thread every ``poll_interval`` seconds."""
+        self._poller = threading.Thread(target=self._poll, name="pipeline-poller", daemon=True)
+        self._poller.start()
+
+    def stop_polling(self) -> None:
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def resolve(self, job_id: str) -> str | None:
+        """Full job name for 'job093', '93' or the full name itself, with or without its '/'."""
+        jobs = self.pipeline.jobs
+        for name in (job_id, f"{job_id}/"):
+            if name in jobs:
+                return name
+        if job_id.isdigit():
+            job_id = f"job{job_id.zfill(3)}"
+        return self.job_ids.get(job_id)
+
+    def _snapshot(self, job_name: str, options: ViewOptions):
+        """Copy the jobs and edges of one lineage out of the live pipeline.
+
+        Called under the lock; the copy can then be enriched and rendered
+        without it while ``refresh`` updates the live pipeline in place.
+        """
+        pipeline = self.pipeline
+        jobs, edges, truncated = get_neighbourhood(
+            pipeline, job_name, options.upstream, options.downstream, options.depth, options.depth,
+        )
+        snapshot = Pipeline({name: copy.copy(pipeline.jobs[name]) for name in jobs}, set(edges))
+        return snapshot, jobs, edges, truncated, jobs - self.enriched
+
+    def _keep_enrichment(self, snapshot: Pipeline, enriched: set[str]) -> None:
+        """Copy enrichment read outside the lock back onto the live jobs (under the lock)."""
+        for name in enriched:
+            job, read = self.pipeline.jobs.get(name), snapshot.jobs[name]
+            if job is not None:
+                job.last_command, job.model_classes, job.model_general = (
+                    read.last_command, read.model_classes, read.model_general,
+                )
+        self.enriched |= enriched
+
+    def render_job(self, job_id: str, options: ViewOptions) -> bytes | None:
+        """The page (or diagram file) for one lineage, from the cache when possible.
+
+        Returns None if ``job_id`` is not in the pipeline. The lock is only
+        held to look the job up, copy its lineage and use the cache, so
+        requests are enriched and rendered concurrently.
+        """
+        with self._lock:
+            job_name = self.resolve(job_id)
+            if job_name is None:
+                return None
+            key = (job_name, options)
+            body = self.cache.get(key)
+            if body is not None:
+                return body
+            version = self.version
+            snapshot, jobs, edges, truncated, unread = self._snapshot(job_name, options)
+
+        if self.enrich is not None and unread:
+            self.enrich(snapshot, unread)
+        if options.reduce:
+            edges = transitive_reduction(jobs, edges)
+        groups: dict[str, list[str]] = {}
+        if options.collapse == "auto":
+            jobs, edges, groups = collapse_graph(snapshot, jobs, edges, COLLAPSE_MODES, options.max_nodes, {job_name})
+        elif options.collapse:
+            jobs, edges, groups = collapse_graph(snapshot, jobs, edges, (options.collapse,), None, {job_name})
+        graph = dict(jobs=jobs, edges=edges, pipeline=snapshot, truncated=truncated, groups=groups)
+        out = io.StringIO()
+        if options.format == "html":
+            draw = render_svg_to if self.renderer == "svg" else render_mermaid_to
+            head = _NAVIGATE_SCRIPT + version_poller(
+                Path(snapshot.jobs[job_name].job_id), version, self.poll_interval,
+            )
+            write_html(
+                out, html.escape(f"RELION Pipeline — {job_name}"), lambda fp: draw(fp, **graph),
+                build_job_info(jobs, snapshot, truncated, groups), self.renderer,
+                scripts=self.scripts, head=head,
+            )
+        else:
+            FORMATS[options.format].write(out, **graph)
+        body = out.getvalue().encode("utf-8")
+
+        with self._lock:
+            # A page built from a pipeline that has since changed is not kept
+            if self.version == version:
+                if self.enrich is not None and unread:
+                    self._keep_enrichment(snapshot, unread)
+                self.cache.put(key, body)
+        return body
+
+    def render_index(self) -> bytes:
+        """The job list, linking every job to its upstream lineage."""
+        with self._lock:
+            body = self.cache.get("index")
+            if body is not None:
+                return body
+            version = self.version
+            pipeline = self.pipeline
+            targets = sorted(pipeline.jobs)
+            lineages = get_subgraphs(pipeline, targets, True, False)
+            jobs = [(name, pipeline.jobs[name], len(lineages[name][0])) for name in targets]
+            rows = [(name, job.job_id, job.alias, job.status, n_jobs) for name, job, n_jobs in jobs]
+
+        body = INDEX_TEMPLATE.format(
+            title=html.escape(f"RELION Pipeline — {self.star_path}"),
+            rows="\n".join(
+                INDEX_ROW_TEMPLATE.format(
+                    href=html.escape(f"job/{job_id}"),
+                    name=html.escape(name),
+                    alias=html.escape(alias or ""),
+                    status=html.escape(status),
+                    n_jobs=n_jobs,
+                )
+                for name, job_id, alias, status, n_jobs in rows
+            ),
+        ).encode("utf-8")
+        with self._lock:
+            if self.version == version:
+                self.cache.put("index", body)
+        return body
+
+    def version_script(self) -> bytes:
+        return f'pipelineVersion("{self.version}");\n'.encode("utf-8")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: PipelineServer
+
+    def _send(self, status: HTTPStatus, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send(status, f"{status.value} {status.phrase}: {message}\n".encode("utf-8"), "text/plain")
+
+    def do_GET(self) -> None:
+        service = self.server.service
+        url = urlsplit(self.path)
+        if url.path in ("/", "/index.html"):
+            self._send(HTTPStatus.OK, service.render_index(), "text/html")
+            return
+        if url.path.endswith(".version.js"):
+            self._send(HTTPStatus.OK, service.version_script(), "text/javascript")
+            return
+        if not url.path.startswith("/job/"):
+            self._error(HTTPStatus.NOT_FOUND, url.path)
+            return
+        job_id = url.path[len("/job/"):]
+        try:
+            options = ViewOptions.from_query(url.query)
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        # Resolved under the service's lock, as a refresh may remove the job
+        body = service.render_job(job_id.strip("/"), options)
+        if body is None:
+            self._error(HTTPStatus.NOT_FOUND, f"no job {job_id!r} in the pipeline")
+            return
+        content_type = "text/html" if options.format == "html" else FORMATS[options.format].media_type
+        self._send(HTTPStatus.OK, body, content_type)
+
+    do_HEAD = do_GET
+
+
+class PipelineServer(ThreadingHTTPServer):
+    """``ThreadingHTTPServer`` answering lineage requests from a ``PipelineService``.
+
+    Routes: ``/`` (job list), ``/job/<id>?up=1&down=1&depth=N`` and the
+    version script open pages poll to reload after a pipeline change.
+    """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], service: PipelineService):
+        super().__init__(address, _Handler)
+        self.service = service
@@ -0,0 +1,196 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Line-streaming reader for the STAR files written by RELION.
+
+Only the subset of STAR used by RELION is supported: ``data_`` blocks holding
+either ``_rlnKey value`` pairs or a single ``loop_`` table. Column names are
+returned without the leading underscore (as ``starfile`` does) and all values
+are returned as strings; callers convert what they need.
+"""
+
+from __future__ import annotations
+
+import re
+import shlex
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+
+class StarParseError(ValueError):
+    """Raised when a STAR file does not follow the layout written by RELION."""
+
+
+def _split_values(line: str) -> list[str]:
+    """Split a data line into values, honouring quotes only when present."""
+    if '"' in line or "'" in line:
+        return shlex.split(line)
+    return line.split()
+
+
+def _iter_rows(
+    lines: Iterable[str],
+    blocks: set[str] | None = None,
+) -> Iterator[tuple[str, bool, dict[str, str]]]:
+    """Yield ``(block_name, is_loop, row)`` for each row in ``lines``.
+
+    Loop blocks yield one row per data line; pair blocks yield a single row
+    once the block ends. When ``blocks`` is given, other blocks are skipped
+    without tokenising and iteration stops as soon as every requested block
+    has been read.
+    """
+    block: str | None = None
+    wanted = False
+    columns: list[str] | None = None  # set while inside a loop_
+    in_header = False
+    pairs: dict[str, str] | None = None
+    remaining = set(blocks) if blocks is not None else None
+
+    for raw in lines:
+        line = raw.strip()
+        if not line or line[0] == "#":
+            continue
+
+        if line.startswith("data_"):
+            if pairs:
+                yield block, False, pairs
+            if remaining is not None and not remaining:
+                return
+            block = line[5:]
+            wanted = remaining is None or block in remaining
+            if remaining is not None:
+                remaining.discard(block)
+            columns = None
+            in_header = False
+            pairs = None
+            continue
+
+        if not wanted:
+            continue
+
+        if line.startswith("loop_"):
+            columns = []
+            in_header = True
+            continue
+
+        if line[0] == "_":
+            if columns is not None:
+                if not in_header:
+                    raise StarParseError(f"Column definition after loop rows in block '{block}': {line}")
+                columns.append(line.split(None, 1)[0][1:])
+            else:
+                parts = line.split(None, 1)
+                value = _split_values(parts[1]) if len(parts) > 1 else []
+                if pairs is None:
+                    pairs = {}
+                pairs[parts[0][1:]] = value[0] if value else ""
+            continue
+
+        if columns is None:
+            raise StarParseError(f"Unexpected data line outside a loop in block '{block}': {line}")
+        in_header = False
+        values = _split_values(line)
+        if len(values) != len(columns):
+            raise StarParseError(
+                f"Expected {len(columns)} values in block '{block}', got {len(values)}: {line}"
+            )
+        yield block, True, dict(zip(columns, values))
+
+    if pairs:
+        yield block, False, pairs
+
+
+def iter_star_rows(
+    source: str | Path | Iterable[str],
+    blocks: set[str] | None = None,
+) -> Iterator[tuple[str, dict[str, str]]]:
+    """Stream ``(block_name, row)`` pairs from a STAR file or iterable of lines."""
+    if isinstance(source, (str, Path)):
+        with open(source) as fh:
+            for block, _, row in _iter_rows(fh, blocks):
+                yield block, row
+    else:
+        for block, _, row in _iter_rows(source, blocks):
+            yield block, row
+
+
+def read_star_blocks(
+    path: str | Path,
+    blocks: set[str],
+) -> dict[str, dict[str, str] | list[dict[str, str]]]:
+    """Read only the named data blocks from a STAR file.
+
+    Loop blocks are returned as a list of row dicts and pair blocks as a
+    single dict, mirroring ``starfile.read``. Reading stops once every
+    requested block has been seen, so large trailing tables are never read.
+    """
+    result: dict[str, dict[str, str] | list[dict[str, str]]] = {}
+    with open(path) as fh:
+        for block, is_loop, row in _iter_rows(fh, blocks):
+            if is_loop:
+                result.setdefault(block, []).append(row)
+            else:
+                result[block] = row
+    return result
+
+
+_DATA_LINE_RE = re.compile(r"^data_(\S*)[ \t]*\r?$", re.MULTILINE)
+
+
+def find_loop_blocks(text: str, blocks: set[str]) -> dict[str, tuple[list[str], int, int]]:
+    """Locate loop blocks in the text of a STAR file without reading their rows.
+
+    Returns ``{block: (columns, rows_start, block_end)}`` with character
+    offsets into ``text``; rows lie in ``text[rows_start:block_end]``
+    (see ``iter_loop_rows``). Missing blocks are left out.
+    """
+    headers = [(m.group(1), m.start(), m.end()) for m in _DATA_LINE_RE.finditer(text)]
+    found = {}
+    for i, (block, _, pos) in enumerate(headers):
+        if block not in blocks:
+            continue
+        end = headers[i + 1][1] if i + 1 < len(headers) else len(text)
+        columns: list[str] = []
+        is_loop = False
+        while pos < end:
+            line_end = text.find("\n", pos, end)
+            line_end = end if line_end == -1 else line_end + 1
+            line = text[pos:line_end].strip()
+            if line.startswith("loop_"):
+                is_loop = True
+            elif line.startswith("_"):
+                columns.append(line.split(None, 1)[0][1:])
+            elif line and line[0] != "#":
+                break
+            pos = line_end
+        if not is_loop:
+            raise StarParseError(f"Block '{block}' is not a loop")
+        found[block] = (columns, pos, end)
+    return found
+
+
+def iter_loop_rows(
+    text: str,
+    start: int,
+    end: int,
+    columns: list[str],
+) -> Iterator[tuple[dict[str, str], int]]:
+    """Yield ``(row, line_end)`` for the data lines of ``text[start:end]``.
+
+    ``line_end`` is the offset just past the row's line, so a caller can
+    remember how far it has read.
+    """
+    pos = start
+    while pos < end:
+        line_end = text.find("\n", pos, end)
+        line_end = end if line_end == -1 else line_end + 1
+        line = text[pos:line_end].strip()
+        pos = line_end
+        if not line or line[0] == "#":
+            continue
+        values = _split_values(line)
+        if len(values) != len(columns):
+            raise StarParseError(f"Expected {len(columns)} values, got {len(values)}: {line}")
+        yield dict(zip(columns, values)), line_end
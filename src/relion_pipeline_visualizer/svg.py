@@ -0,0 +1,405 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Layered (Sugiyama-style) layout and static SVG rendering.
+
+Produces the same picture as the Mermaid flowchart without any JavaScript
+layout engine, so the HTML viewer works offline and opens instantly even
+for very large pipelines.
+"""
+
+from __future__ import annotations
+
+import html
+import io
+from dataclasses import dataclass, field
+from typing import TextIO
+
+from relion_pipeline_visualizer.mermaid import (
+    COLLAPSED_STYLE,
+    STATUS_STYLES,
+    TRUNCATED_STYLE,
+    TYPE_STYLES,
+    node_style,
+)
+from relion_pipeline_visualizer.parser import Pipeline
+
+FONT_SIZE = 48
+CHAR_WIDTH = 0.6        # average glyph width as a fraction of the font size
+LINE_HEIGHT = 1.25
+NODE_PAD_X = 30
+NODE_PAD_Y = 20
+NODE_GAP = 60           # horizontal space between neighbouring nodes
+LAYER_GAP = 120         # vertical space between layers
+MARGIN = 20
+SWEEPS = 8              # barycenter sweeps (each one down and one up)
+ALIGN_PASSES = 4        # coordinate alignment passes
+
+
+@dataclass
+class Layout:
+    """Node boxes and edge polylines of a layered drawing.
+
+    ``nodes`` maps a node to the centre ``(x, y)`` of its box, ``sizes`` to
+    its ``(width, height)`` and ``edges`` maps each drawable edge to the
+    points it passes through, from the bottom of the source box to the top
+    of the target box.
+    """
+    nodes: dict[str, tuple[float, float]] = field(default_factory=dict)
+    sizes: dict[str, tuple[float, float]] = field(default_factory=dict)
+    edges: dict[tuple[str, str], list[tuple[float, float]]] = field(default_factory=dict)
+    layers: list[list[str]] = field(default_factory=list)
+    width: float = 0.0
+    height: float = 0.0
+
+
+def assign_layers(nodes: list[str], edges: list[tuple[str, str]]) -> dict[str, int]:
+    """Longest-path layering: every node sits below all of its parents.
+
+    Cycles cannot occur in a RELION pipeline, but if one does the remaining
+    node with the smallest name is treated as a source and the edges that
+    would point upwards are ignored.
+    """
+    children: dict[str, list[str]] = {n: [] for n in nodes}
+    indegree = dict.fromkeys(nodes, 0)
+    for src, tgt in edges:
+        children[src].append(tgt)
+        indegree[tgt] += 1
+
+    layer = dict.fromkeys(nodes, 0)
+    remaining = set(nodes)
+    ready = [n for n in nodes if indegree[n] == 0]
+    while remaining:
+        if not ready:
+            ready = [min(remaining)]
+        while ready:
+            node = ready.pop()
+            if node not in remaining:
+                continue
+            remaining.discard(node)
+            for child in children[node]:
+                if child not in remaining:
+                    continue
+                layer[child] = max(layer[child], layer[node] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    ready.append(child)
+    return layer
+
+
+def _barycenter_sweep(
+    layers: list[list[str]],
+    neighbours: dict[str, list[str]],
+    order: range,
+    ref_offset: int,
+) -> None:
+    """Reorder each layer in ``order`` by the mean position of its neighbours.
+
+    ``ref_offset`` selects the fixed reference layer (-1 above, +1 below).
+    Nodes without neighbours in the reference layer keep their position.
+    """
+    for i in order:
+        ref = layers[i + ref_offset]
+        pos = {n: p for p, n in enumerate(ref)}
+        keyed = []
+        for p, node in enumerate(layers[i]):
+            ps = [pos[m] for m in neighbours[node] if m in pos]
+            keyed.append((sum(ps) / len(ps) if ps else float(p), p, node))
+        keyed.sort()
+        layers[i] = [node for _, _, node in keyed]
+
+
+def count_crossings(layers: list[list[str]], down: dict[str, list[str]]) -> int:
+    """Number of edge crossings between consecutive layers."""
+    total = 0
+    for upper, lower in zip(layers, layers[1:]):
+        pos = {n: p for p, n in enumerate(lower)}
+        ends = [p for n in upper for p in sorted(pos[c] for c in down[n])]
+        # Inversions in the sequence of lower end positions are crossings
+        total += _inversions(ends)
+    return total
+
+
+def _inversions(seq: list[int]) -> int:
+    """Count inversions with a Fenwick tree."""
+    if not seq:
+        return 0
+    size = max(seq) + 1
+    tree = [0] * (size + 1)
+    count = 0
+    for seen, value in enumerate(seq):
+        i, le = value + 1, 0
+        while i > 0:
+            le += tree[i]
+            i -= i & -i
+        count += seen - le
+        i = value + 1
+        while i <= size:
+            tree[i] += 1
+            i += i & -i
+    return count
+
+
+def order_layers(
+    nodes: list[str],
+    edges: list[tuple[str, str]],
+    layer: dict[str, int],
+) -> tuple[list[list[str]], dict[str, list[str]], list[tuple[str, str, list[str]]]]:
+    """Split long edges with dummy nodes and reduce crossings by barycenter.
+
+    Returns the ordered layers, the downward adjacency between consecutive
+    layers (including dummies) and, for every edge, its chain of dummy
+    nodes. The best ordering seen across all sweeps is kept.
+    """
+    n_layers = max(layer.values(), default=-1) + 1
+    layers: list[list[str]] = [[] for _ in range(n_layers)]
+    for node in nodes:
+        layers[layer[node]].append(node)
+
+    down: dict[str, list[str]] = {n: [] for n in nodes}
+    up: dict[str, list[str]] = {n: [] for n in nodes}
+    chains: list[tuple[str, str, list[str]]] = []
+    for src, tgt in edges:
+        if layer[tgt] <= layer[src]:
+            continue
+        chain = []
+        prev = src
+        for k in range(layer[src] + 1, layer[tgt]):
+            dummy = f"\0{src}\0{tgt}\0{k}"
+            layers[k].append(dummy)
+            down[dummy], up[dummy] = [], []
+            down[prev].append(dummy)
+            up[dummy].append(prev)
+            chain.append(dummy)
+            prev = dummy
+        down[prev].append(tgt)
+        up[tgt].append(prev)
+        chains.append((src, tgt, chain))
+
+    best = [list(lay) for lay in layers]
+    best_crossings = count_crossings(layers, down)
+    for _ in range(SWEEPS):
+        if best_crossings == 0:
+            break
+        _barycenter_sweep(layers, up, range(1, n_layers), -1)
+        _barycenter_sweep(layers, down, range(n_layers - 2, -1, -1), +1)
+        crossings = count_crossings(layers, down)
+        if crossings < best_crossings:
+            best, best_crossings = [list(lay) for lay in layers], crossings
+    return best, down, chains
+
+
+def _separate(desired: list[float], widths: list[float]) -> list[float]:
+    """Closest positions to ``desired`` that keep the layer order without overlap.
+
+    Averages a left-to-right and a right-to-left packing; both respect the
+    minimum separation, so their mean does too.
+    """
+    n = len(desired)
+    sep = [(widths[i] + widths[i + 1]) / 2 + NODE_GAP for i in range(n - 1)]
+    left = list(desired)
+    for i in range(1, n):
+        left[i] = max(left[i], left[i - 1] + sep[i - 1])
+    right = list(desired)
+    for i in range(n - 2, -1, -1):
+        right[i] = min(right[i], right[i + 1] - sep[i])
+    return [(a + b) / 2 for a, b in zip(left, right)]
+
+
+def assign_coordinates(
+    layers: list[list[str]],
+    down: dict[str, list[str]],
+    sizes: dict[str, tuple[float, float]],
+) -> dict[str, tuple[float, float]]:
+    """Place layers top to bottom and pull nodes towards their neighbours."""
+    up: dict[str, list[str]] = {n: [] for lay in layers for n in lay}
+    for node, kids in down.items():
+        for kid in kids:
+            up[kid].append(node)
+
+    x: dict[str, float] = {}
+    for lay in layers:
+        widths = [sizes[n][0] for n in lay]
+        x.update(zip(lay, _separate([0.0] * len(lay), widths)))
+
+    for _ in range(ALIGN_PASSES):
+        for order, adj in ((layers[1:], up), (layers[-2::-1], down)):
+            for lay in order:
+                desired = []
+                for node in lay:
+                    ns = adj[node]
+                    desired.append(sum(x[m] for m in ns) / len(ns) if ns else x[node])
+                widths = [sizes[n][0] for n in lay]
+                x.update(zip(lay, _separate(desired, widths)))
+
+    coords: dict[str, tuple[float, float]] = {}
+    y = MARGIN
+    for lay in layers:
+        height = max((sizes[n][1] for n in lay), default=0.0)
+        for node in lay:
+            coords[node] = (x[node], y + height / 2)
+        y += height + LAYER_GAP
+    return coords
+
+
+def _label_lines(label: str) -> list[str]:
+    return label.split("<br/>")
+
+
+def node_size(label: str) -> tuple[float, float]:
+    """Box size for a (possibly multi-line) label."""
+    lines = _label_lines(label)
+    width = max(len(line) for line in lines) * FONT_SIZE * CHAR_WIDTH + 2 * NODE_PAD_X
+    height = len(lines) * FONT_SIZE * LINE_HEIGHT + 2 * NODE_PAD_Y
+    return width, height
+
+
+def layered_layout(
+    labels: dict[str, str],
+    edges: set[tuple[str, str]],
+) -> Layout:
+    """Sugiyama-style layout of ``labels`` (node -> label) and ``edges``.
+
+    Layering by longest path, crossing reduction by barycenter sweeps and
+    coordinate assignment by iterative neighbour averaging.
+    """
+    nodes = sorted(labels)
+    edge_list = sorted((s, t) for s, t in edges if s in labels and t in labels and s != t)
+    layer = assign_layers(nodes, edge_list)
+    layers, down, chains = order_layers(nodes, edge_list, layer)
+
+    sizes = {n: node_size(labels[n]) for n in nodes}
+    for lay in layers:
+        for node in lay:
+            sizes.setdefault(node, (0.0, 0.0))
+    coords = assign_coordinates(layers, down, sizes)
+
+    # Shift so the leftmost box starts at the margin
+    min_x = min((coords[n][0] - sizes[n][0] / 2 for n in coords), default=0.0)
+    shift = MARGIN - min_x
+    coords = {n: (cx + shift, cy) for n, (cx, cy) in coords.items()}
+
+    out = Layout(layers=[[n for n in lay if n in labels] for lay in layers])
+    out.nodes = {n: coords[n] for n in nodes}
+    out.sizes = {n: sizes[n] for n in nodes}
+    for src, tgt, chain in chains:
+        sx, sy = out.nodes[src]
+        tx, ty = out.nodes[tgt]
+        points = [(sx, sy + sizes[src][1] / 2)]
+        points.extend(coords[d] for d in chain)
+        points.append((tx, ty - sizes[tgt][1] / 2))
+        out.edges[(src, tgt)] = points
+    out.width = max((coords[n][0] + sizes[n][0] / 2 for n in coords), default=0.0) + MARGIN
+    out.height = max((coords[n][1] + sizes[n][1] / 2 for n in coords), default=0.0) + MARGIN
+    return out
+
+
+def _svg_style(style: str) -> tuple[str, str]:
+    """Translate a Mermaid ``classDef`` style into SVG box and text rules."""
+    box, text = [], []
+    for item in style.split(","):
+        key, _, value = item.partition(":")
+        if key == "color":
+            text.append(f"fill:{value}")
+        elif key == "font-size":
+            text.append(f"font-size:{value}")
+        elif key == "stroke-dasharray":
+            # Mermaid reads a lone number as "dash gap"
+            box.append(f"{key}:{value if ' ' in value else f'{value} {value}'}")
+        else:
+            box.append(f"{key}:{value}")
+    return ";".join(box), ";".join(text)
+
+
+def _stylesheet() -> str:
+    rules = [
+        ".node rect { fill:#ECECFF; stroke:#9370DB; stroke-width:1px; }",
+        f".node text {{ font-family:sans-serif; font-size:{FONT_SIZE}px; fill:#333; }}",
+        ".edge { fill:none; stroke:#333; stroke-width:2px; }",
+    ]
+    classes = [(t.lower(), s) for t, s in TYPE_STYLES.items()]
+    classes.append(("collapsed", COLLAPSED_STYLE))
+    # Status and truncation come last so they override the type stroke
+    classes.extend((s.lower(), style) for s, style in STATUS_STYLES.items())
+    classes.append(("truncated", TRUNCATED_STYLE))
+    for css_class, style in classes:
+        box, text = _svg_style(style)
+        if box:
+            rules.append(f".node.{css_class} rect {{ {box}; }}")
+        if text:
+            rules.append(f".node.{css_class} text {{ {text}; }}")
+    return "\n".join(rules)
+
+
+def render_svg(
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> str:
+    """Render a static SVG drawing to a string (see ``render_svg_to``)."""
+    buf = io.StringIO()
+    render_svg_to(buf, jobs, edges, pipeline, truncated, groups)
+    return buf.getvalue()
+
+
+def render_svg_to(
+    fp: TextIO,
+    jobs: set[str],
+    edges: set[tuple[str, str]],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> None:
+    """Lay out the graph and write it to ``fp`` as inline SVG.
+
+    Node styling, collapsed groups and truncation markers follow
+    ``render_mermaid_to``; each node is a ``<g class="node">`` with the
+    Mermaid node ID in ``data-id`` so the viewer tooltips find it.
+    """
+    styles = {}
+    for job_name in sorted(jobs):
+        style = node_style(job_name, pipeline, truncated, groups)
+        if style is not None:
+            styles[job_name] = style
+    labels = {job_name: style.label for job_name, style in styles.items()}
+
+    layout = layered_layout(labels, edges)
+
+    fp.write(
+        f'<svg xmlns="http://www.w3.org/2000/svg" class="pipeline-svg" '
+        f'viewBox="0 0 {layout.width:.0f} {layout.height:.0f}" '
+        f'style="max-width:{layout.width:.0f}px;width:100%">\n'
+    )
+    fp.write(
+        "<defs><marker id=\"arrow\" viewBox=\"0 0 10 10\" refX=\"10\" refY=\"5\" "
+        "markerWidth=\"8\" markerHeight=\"8\" orient=\"auto-start-reverse\">"
+        "<path d=\"M 0 0 L 10 5 L 0 10 z\" fill=\"#333\"/></marker></defs>\n"
+    )
+    fp.write(f"<style>\n{_stylesheet()}\n</style>\n")
+
+    for src, tgt in sorted(layout.edges):
+        points = " L ".join(f"{px:.1f} {py:.1f}" for px, py in layout.edges[(src, tgt)])
+        fp.write(f'<path class="edge" d="M {points}" marker-end="url(#arrow)"/>\n')
+
+    for job_name, style in styles.items():
+        node_id = style.node_id
+        cx, cy = layout.nodes[job_name]
+        w, h = layout.sizes[job_name]
+        lines = _label_lines(style.label)
+        css = " ".join(["node", *style.classes])
+        fp.write(f'<g class="{css}" id="{node_id}" data-id="{node_id}">')
+        fp.write(
+            f'<rect x="{cx - w / 2:.1f}" y="{cy - h / 2:.1f}" '
+            f'width="{w:.1f}" height="{h:.1f}" rx="5"/>'
+        )
+        first = cy - (len(lines) - 1) * FONT_SIZE * LINE_HEIGHT / 2
+        fp.write(f'<text x="{cx:.1f}" text-anchor="middle" dominant-baseline="central">')
+        for i, line in enumerate(lines):
+            fp.write(f'<tspan x="{cx:.1f}" y="{first + i * FONT_SIZE * LINE_HEIGHT:.1f}">{html.escape(line)}</tspan>')
+        fp.write("</text></g>\n")
+
+    fp.write("</svg>\n")
@@ -0,0 +1,387 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Synthetic RELION projects of any size, for benchmarks and tests.
+
+A project starts with the usual pre-processing chain (Import, MotionCorr,
+CtfFind, AutoPick, Extract, Class2D, Select, InitialModel) and then grows
+rounds of Class3D -> Select -> Refine3D -> MaskCreate -> PostProcess, with
+occasional CtfRefine/Polish and JoinStar, each branching from a recent
+particle set and map. Job directories get note.txt files with repeated
+``--continue`` restarts and the iteration files RELION leaves behind;
+only the last Class3D iteration and Refine3D's run_model.star carry full
+model statistics, since enrichment only lists the earlier ones.
+
+Run ``python -m relion_pipeline_visualizer.synthetic OUT_DIR --jobs N``
+to write one.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from relion_pipeline_visualizer.writers import atomic_write
+
+STAR_VERSION = "# version 50001"
+
+# Process type label of each job type
+TYPE_LABELS = {
+    "Import": "relion.import.movies",
+    "MotionCorr": "relion.motioncorr.own",
+    "CtfFind": "relion.ctffind.ctffind4",
+    "AutoPick": "relion.autopick.log",
+    "Extract": "relion.extract",
+    "Class2D": "relion.class2d.em",
+    "Select": "relion.select.interactive",
+    "InitialModel": "relion.initialmodel",
+    "Class3D": "relion.class3d",
+    "Refine3D": "relion.refine3d",
+    "MaskCreate": "relion.maskcreate",
+    "PostProcess": "relion.postprocess",
+    "CtfRefine": "relion.ctfrefine",
+    "Polish": "relion.polish.train",
+    "JoinStar": "relion.joinstar.particles",
+}
+
+# RELION programs recorded in note.txt
+PROGRAMS = {
+    "Import": "relion_import",
+    "MotionCorr": "relion_run_motioncorr_mpi",
+    "CtfFind": "relion_run_ctffind_mpi",
+    "AutoPick": "relion_autopick_mpi",
+    "Extract": "relion_preprocess_mpi",
+    "Class2D": "relion_refine_mpi",
+    "Select": "relion_display",
+    "InitialModel": "relion_refine",
+    "Class3D": "relion_refine_mpi",
+    "Refine3D": "relion_refine_mpi",
+    "MaskCreate": "relion_mask_create",
+    "PostProcess": "relion_postprocess",
+    "CtfRefine": "relion_ctf_refine_mpi",
+    "Polish": "relion_motion_refine_mpi",
+    "JoinStar": "relion_star_handler",
+}
+
+PARTICLES = "ParticleGroupMetadata.star.relion"
+DENSITY_MAP = "DensityMap.mrc.relion"
+
+
+@dataclass
+class SyntheticJob:
+    """One job of a synthetic pipeline with its input and output nodes."""
+    name: str
+    job_type: str
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[tuple[str, str]] = field(default_factory=list)  # (node, node type label)
+    status: str = "Succeeded"
+    alias: str | None = None
+    iterations: int = 0
+
+    def output(self, suffix: str) -> str:
+        """Full name of this job's output node ending in ``suffix``."""
+        return f"{self.name}{suffix}"
+
+
+class _Builder:
+    """Grows a job list while tracking the latest particle sets and maps."""
+
+    def __init__(self, n_jobs: int, rng: random.Random, class3d_iterations: int, refine_iterations: int):
+        self.n_jobs = n_jobs
+        self.rng = rng
+        self.class3d_iterations = class3d_iterations
+        self.refine_iterations = refine_iterations
+        self.jobs: list[SyntheticJob] = []
+        self.particles: list[str] = []
+        self.maps: list[str] = []
+        self.micrographs: str | None = None
+
+    @property
+    def full(self) -> bool:
+        return len(self.jobs) >= self.n_jobs
+
+    def add(self, job_type: str, inputs: list[str], outputs: list[tuple[str, str]], iterations: int = 0):
+        if self.full:
+            return None
+        name = f"{job_type}/job{len(self.jobs) + 1:03d}/"
+        job = SyntheticJob(name, job_type, inputs, [(name + o, label) for o, label in outputs], iterations=iterations)
+        self.jobs.append(job)
+        return job
+
+    def recent(self, items: list[str]) -> str:
+        """Prefer the last few entries, as users mostly build on recent results."""
+        return self.rng.choice(items[-8:]) if self.rng.random() < 0.8 else self.rng.choice(items)
+
+    def preprocessing(self) -> None:
+        imp = self.add("Import", [], [("movies.star", "MicrographMovieGroupMetadata.star.relion")])
+        mc = imp and self.add("MotionCorr", [imp.output("movies.star")],
+                              [("corrected_micrographs.star", "MicrographGroupMetadata.star.relion.motioncorr")])
+        ctf = mc and self.add("CtfFind", [mc.output("corrected_micrographs.star")],
+                              [("micrographs_ctf.star", "MicrographGroupMetadata.star.relion.ctf")])
+        if ctf:
+            self.micrographs = ctf.output("micrographs_ctf.star")
+        pick = ctf and self.add("AutoPick", [self.micrographs],
+                                [("autopick.star", "MicrographCoordsGroup.star.relion.autopick")])
+        ext = pick and self.add("Extract", [self.micrographs, pick.output("autopick.star")],
+                                [("particles.star", PARTICLES)])
+        if ext:
+            self.particles.append(ext.output("particles.star"))
+        c2d = ext and self.add("Class2D", [ext.output("particles.star")],
+                               [("run_it025_optimiser.star", "OptimiserData.star.relion.class2d")], iterations=25)
+        sel = c2d and self.add("Select", [c2d.output("run_it025_optimiser.star")], [("particles.star", PARTICLES)])
+        if sel:
+            self.particles.append(sel.output("particles.star"))
+        ini = sel and self.add("InitialModel", [sel.output("particles.star")],
+                               [("initial_model.mrc", DENSITY_MAP + ".initialmodel")], iterations=200)
+        if ini:
+            self.maps.append(ini.output("initial_model.mrc"))
+
+    def refinement_round(self) -> None:
+        particles, reference = self.recent(self.particles), self.recent(self.maps)
+        iterations = self.class3d_iterations
+        it = f"run_it{iterations:03d}_"
+        c3d = self.add("Class3D", [particles, reference], [
+            (f"{it}optimiser.star", "OptimiserData.star.relion.class3d"),
+            (f"{it}data.star", PARTICLES + ".class3d"),
+            *((f"{it}class{k:03d}.mrc", DENSITY_MAP + ".class3d") for k in range(1, 5)),
+        ], iterations=iterations)
+        if c3d is None:
+            return
+        self.maps.append(c3d.output(f"{it}class001.mrc"))
+        sel = self.add("Select", [c3d.output(f"{it}optimiser.star")], [("particles.star", PARTICLES)])
+        if sel is None:
+            return
+        self.particles.append(sel.output("particles.star"))
+        ref = self.add("Refine3D", [sel.output("particles.star"), c3d.output(f"{it}class001.mrc")], [
+            ("run_data.star", PARTICLES + ".refine3d"),
+            ("run_class001.mrc", DENSITY_MAP + ".refine3d"),
+            ("run_half1_class001_unfil.mrc", DENSITY_MAP + ".halfmap.refine3d"),
+            ("run_optimiser.star", "OptimiserData.star.relion.refine3d"),
+        ], iterations=self.refine_iterations)
+        if ref is None:
+            return
+        self.particles.append(ref.output("run_data.star"))
+        self.maps.append(ref.output("run_class001.mrc"))
+        mask = self.add("MaskCreate", [ref.output("run_class001.mrc")], [("mask.mrc", "Mask3D.mrc.relion")])
+        post = mask and self.add("PostProcess", [ref.output("run_half1_class001_unfil.mrc"), mask.output("mask.mrc")], [
+            ("postprocess.mrc", DENSITY_MAP + ".postprocess"),
+            ("postprocess.star", "ProcessData.star.relion.postprocess"),
+        ])
+        if post is None:
+            return
+        self.maps.append(post.output("postprocess.mrc"))
+        if self.rng.random() < 0.3:
+            ctf = self.add("CtfRefine", [ref.output("run_data.star"), post.output("postprocess.star")],
+                           [("particles_ctf_refine.star", PARTICLES + ".ctfrefine")])
+            if ctf is None:
+                return
+            self.particles.append(ctf.output("particles_ctf_refine.star"))
+            if self.rng.random() < 0.5:
+                polish = self.add("Polish", [ctf.output("particles_ctf_refine.star"), post.output("postprocess.star")],
+                                  [("shiny.star", PARTICLES + ".polish")])
+                if polish:
+                    self.particles.append(polish.output("shiny.star"))
+        if len(self.particles) > 2 and self.rng.random() < 0.1:
+            first, second = self.rng.sample(self.particles[-6:], 2)
+            join = self.add("JoinStar", [first, second], [("join_particles.star", PARTICLES)])
+            if join:
+                self.particles.append(join.output("join_particles.star"))
+
+    def finish(self) -> None:
+        """Set statuses: consumed jobs succeeded, some leaves failed, the newest run."""
+        consumed = {"/".join(node.split("/")[:2]) + "/" for job in self.jobs for node in job.inputs}
+        for job in self.jobs:
+            if job.name in consumed:
+                continue
+            roll = self.rng.random()
+            if roll < 0.15:
+                job.status = "Failed"
+                job.iterations = self.rng.randint(0, job.iterations) if job.iterations else 0
+            elif roll < 0.2:
+                job.status = "Aborted"
+            if self.rng.random() < 0.05:
+                job.alias = f"{job.job_type}/round{self.rng.randint(1, 99):02d}/"
+        for job in self.jobs[-2:]:
+            if job.name not in consumed:
+                job.status = "Running"
+                job.iterations //= 2
+
+
+def synthetic_pipeline(
+    n_jobs: int,
+    seed: int = 0,
+    class3d_iterations: int = 50,
+    refine_iterations: int = 20,
+) -> list[SyntheticJob]:
+    """Exactly ``n_jobs`` jobs forming a plausible, branching RELION project."""
+    builder = _Builder(n_jobs, random.Random(seed), class3d_iterations, refine_iterations)
+    builder.preprocessing()
+    while not builder.full:
+        builder.refinement_round()
+    builder.finish()
+    return builder.jobs
+
+
+def _write_loop(fp, block: str, columns: list[str], rows) -> None:
+    fp.write(f"\n{STAR_VERSION}\n\ndata_{block}\n\nloop_\n")
+    for i, column in enumerate(columns, 1):
+        fp.write(f"_{column} #{i}\n")
+    for row in rows:
+        fp.write(" ".join(row) + "\n")
+    fp.write("\n")
+
+
+def write_pipeline_star(jobs: list[SyntheticJob], path: Path) -> None:
+    """Write ``default_pipeline.star`` for ``jobs`` in RELION's layout."""
+    with atomic_write(path) as fp:
+        fp.write(f"\n{STAR_VERSION}\n\ndata_pipeline_general\n\n")
+        fp.write(f"_rlnPipeLineJobCounter {len(jobs) + 1:>26}\n\n")
+        _write_loop(fp, "pipeline_processes", [
+            "rlnPipeLineProcessName", "rlnPipeLineProcessAlias",
+            "rlnPipeLineProcessTypeLabel", "rlnPipeLineProcessStatusLabel",
+        ], ((job.name, job.alias or "None", TYPE_LABELS[job.job_type], job.status) for job in jobs))
+        _write_loop(fp, "pipeline_nodes", [
+            "rlnPipeLineNodeName", "rlnPipeLineNodeTypeLabel", "rlnPipeLineNodeTypeLabelDepth",
+        ], ((node, label, "1") for job in jobs for node, label in job.outputs))
+        _write_loop(fp, "pipeline_input_edges", [
+            "rlnPipeLineEdgeFromNode", "rlnPipeLineEdgeProcess",
+        ], ((node, job.name) for job in jobs for node in job.inputs))
+        _write_loop(fp, "pipeline_output_edges", [
+            "rlnPipeLineEdgeProcess", "rlnPipeLineEdgeToNode",
+        ], ((job.name, node) for job in jobs for node, _ in job.outputs))
+
+
+def _note_txt(job: SyntheticJob, restarts: int) -> str:
+    program = PROGRAMS[job.job_type]
+    args = " ".join(f"--i {node}" for node in job.inputs)
+    command = f"`which {program}` --o {job.name}run {args} --j 8 --pipeline_control {job.name}"
+    parts = [f" ++++ Executing new job on Mon Jan  6 09:00:00 2025\n ++++ with the following command(s): \n{command}\n ++++ \n"]
+    for restart in range(restarts):
+        it = max(job.iterations * (restart + 1) // (restarts + 1), 1)
+        parts.append(
+            f" ++++ Executing new job on Mon Jan  6 {10 + restart % 12:02d}:00:00 2025\n"
+            f" ++++ with the following command(s): \n"
+            f"`which {program}` --continue {job.name}run_it{it:03d}_optimiser.star "
+            f"--o {job.name}run_ct{it} --j 8 --pipeline_control {job.name}\n ++++ \n"
+        )
+    return "".join(parts)
+
+
+def _model_star(job: SyntheticJob, iteration: int, n_classes: int, shells: int, rng: random.Random) -> str:
+    """A model STAR file with general, per-class and per-shell blocks."""
+    resolution = 3.0 + rng.random() * 5
+    lines = [
+        "", STAR_VERSION, "", "data_model_general", "",
+        f"_rlnReferenceDimensionality {3:>20}",
+        f"_rlnCurrentResolution {resolution:>26.6f}",
+        f"_rlnCurrentIteration {iteration:>20}",
+        f"_rlnPixelSize {1.06:>34.6f}",
+        f"_rlnNrClasses {n_classes:>20}",
+        "", "", STAR_VERSION, "", "data_model_classes", "", "loop_",
+        "_rlnReferenceImage #1", "_rlnClassDistribution #2", "_rlnAccuracyRotations #3",
+        "_rlnAccuracyTranslationsAngst #4", "_rlnEstimatedResolution #5", "_rlnOverallFourierCompleteness #6",
+    ]
+    shares = [rng.random() + 0.1 for _ in range(n_classes)]
+    for k in range(1, n_classes + 1):
+        lines.append(
+            f"{job.name}run_it{iteration:03d}_class{k:03d}.mrc {shares[k - 1] / sum(shares):.6f} "
+            f"{1 + rng.random() * 4:.6f} {0.3 + rng.random():.6f} "
+            f"{resolution + rng.random() * 3:.6f} {0.6 + rng.random() * 0.4:.6f}"
+        )
+    for k in range(1, n_classes + 1):
+        lines += [
+            "", "", STAR_VERSION, "", f"data_model_class_{k}", "", "loop_",
+            "_rlnSpectralIndex #1", "_rlnResolution #2", "_rlnSsnrMap #3", "_rlnFourierCompleteness #4",
+        ]
+        for shell in range(shells):
+            lines.append(f"{shell} {shell / (shells * 2.12):.6f} {max(1000.0 / (shell + 1) - 5, 0):.6f} 1.000000")
+    return "\n".join(lines) + "\n\n"
+
+
+def write_job_files(
+    jobs: list[SyntheticJob],
+    project_dir: Path,
+    seed: int = 0,
+    max_restarts: int = 30,
+    n_classes: int = 4,
+    shells: int = 30,
+) -> None:
+    """Write note.txt and iteration files for every job under ``project_dir``.
+
+    Most jobs were started once or twice, a few were continued up to
+    ``max_restarts`` times. Class3D and Refine3D directories get one
+    optimiser/data/model file per iteration; the model of the last
+    Class3D iteration and Refine3D's run_model.star hold ``n_classes``
+    classes with ``shells`` resolution shells each, earlier models are
+    short stubs.
+    """
+    rng = random.Random(seed + 1)
+    for job in jobs:
+        job_dir = project_dir / job.name
+        job_dir.mkdir(parents=True, exist_ok=True)
+        restarts = min(int(rng.paretovariate(1.2)) - 1, max_restarts) if job.iterations else 0
+        (job_dir / "note.txt").write_text(_note_txt(job, restarts))
+        if job.job_type == "Class3D":
+            for it in range(job.iterations + 1):
+                last = it == job.iterations
+                (job_dir / f"run_it{it:03d}_optimiser.star").write_text("")
+                (job_dir / f"run_it{it:03d}_data.star").write_text("")
+                model = _model_star(job, it, n_classes, shells, rng) if last else f"data_model_general\n_rlnCurrentIteration {it}\n"
+                (job_dir / f"run_it{it:03d}_model.star").write_text(model)
+        elif job.job_type == "Refine3D":
+            for it in range(job.iterations + 1):
+                (job_dir / f"run_it{it:03d}_optimiser.star").write_text("")
+                (job_dir / f"run_it{it:03d}_half1_model.star").write_text("")
+                (job_dir / f"run_it{it:03d}_half2_model.star").write_text("")
+            if job.status == "Succeeded":
+                (job_dir / "run_model.star").write_text(_model_star(job, job.iterations, 1, shells, rng))
+
+
+def generate_project(
+    project_dir: str | Path,
+    n_jobs: int,
+    seed: int = 0,
+    job_files: bool = True,
+    **options,
+) -> Path:
+    """Write a synthetic project and return the path of its default_pipeline.star.
+
+    ``options`` go to ``synthetic_pipeline`` (iteration counts) and
+    ``write_job_files`` (restarts, classes, shells). With
+    ``job_files=False`` only the STAR file is written.
+    """
+    project_dir = Path(project_dir)
+    project_dir.mkdir(parents=True, exist_ok=True)
+    pipeline_options = {k: options.pop(k) for k in ("class3d_iterations", "refine_iterations") if k in options}
+    jobs = synthetic_pipeline(n_jobs, seed, **pipeline_options)
+    star_path = project_dir / "default_pipeline.star"
+    write_pipeline_star(jobs, star_path)
+    if job_files:
+        write_job_files(jobs, project_dir, seed, **options)
+    return star_path
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic RELION project for benchmarking.")
+    parser.add_argument("project_dir", help="Directory to create the project in")
+    parser.add_argument("--jobs", type=int, default=1000, metavar="N", help="Number of jobs (default: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--iterations", type=int, default=50, metavar="N",
+                        help="Iterations of each Class3D job (default: 50)")
+    parser.add_argument("--no-job-files", action="store_true",
+                        help="Only write default_pipeline.star, no job directories")
+    args = parser.parse_args(argv)
+    star_path = generate_project(
+        args.project_dir, args.jobs, args.seed, job_files=not args.no_job_files,
+        class3d_iterations=args.iterations,
+    )
+    print(f"Wrote {args.jobs} jobs to: {star_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
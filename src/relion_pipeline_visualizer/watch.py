@@ -0,0 +1,110 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Change detection for ``--watch``.
+
+Polling is done with ``stat`` calls only: one for the pipeline STAR file and
+one directory listing per running job, so a poll costs almost nothing even
+on network filesystems where inotify is not available.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+from relion_pipeline_visualizer.jobfiles import JobFileIndex
+from relion_pipeline_visualizer.parser import Pipeline, PipelineParseState, update_pipeline
+
+# Files whose changes alter what enrichment reads for a job
+_SIGNATURE_FILES = ("note.txt", "run_model.star")
+
+
+def file_key(path: Path) -> tuple[int, int] | None:
+    """``(mtime_ns, size)`` of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def job_signature(project_dir: Path, job_name: str) -> tuple:
+    """Identity of the files enrichment reads for a job, from one directory listing."""
+    index = JobFileIndex.scan(project_dir / job_name)
+    parts = []
+    for name in (*_SIGNATURE_FILES, index.last_model_name):
+        st = index.stat(name) if name else None
+        parts.append((name, st.st_mtime_ns, st.st_size) if st else (name, None, None))
+    return tuple(parts)
+
+
+def carry_enrichment(old: Pipeline, new: Pipeline) -> None:
+    """Copy enrichment results from ``old`` onto the same jobs in ``new``."""
+    for name, job in new.jobs.items():
+        previous = old.jobs.get(name)
+        if previous is not None:
+            job.last_command = previous.last_command
+            job.model_classes = previous.model_classes
+            job.model_general = previous.model_general
+
+
+class PipelineWatcher:
+    """Tracks a pipeline STAR file and the files of its running jobs.
+
+    ``poll()`` reads the pipeline only when its STAR file changed, parsing
+    just the rows RELION appended when it can, and reports which jobs need
+    to be enriched again: new jobs, jobs whose status changed and running
+    jobs whose note.txt or model files changed.
+    """
+
+    def __init__(self, star_path: str | Path, pipeline: Pipeline):
+        self.star_path = Path(star_path)
+        self.project_dir = self.star_path.parent
+        self.pipeline = pipeline
+        self.star_key = file_key(self.star_path)
+        self.parse_state = PipelineParseState()
+        self.signatures: dict[str, tuple] = {}
+        self._track_running()
+
+    def _track_running(self) -> set[str]:
+        """Update signatures of running jobs; return those whose files changed."""
+        changed = set()
+        running = {name for name, job in self.pipeline.jobs.items() if job.status == "Running"}
+        for name in running:
+            signature = job_signature(self.project_dir, name)
+            if name in self.signatures and self.signatures[name] != signature:
+                changed.add(name)
+            self.signatures[name] = signature
+        for name in set(self.signatures) - running:
+            del self.signatures[name]
+        return changed
+
+    def poll(self) -> tuple[bool, set[str]]:
+        """Return ``(pipeline_changed, jobs_to_re_enrich)``."""
+        changed: set[str] = set()
+        pipeline_changed = False
+        key = file_key(self.star_path)
+        if key != self.star_key:
+            # Parse before recording the new key, so a failed read of a
+            # half-written file is retried on the next poll. Statuses are
+            # copied first because an incremental update changes jobs in place
+            old = self.pipeline
+            statuses = {name: job.status for name, job in old.jobs.items()}
+            if not self.parse_state.blocks:
+                # The first pipeline came from parse_pipeline; adopt it as the base
+                old = None
+            new = update_pipeline(old, self.star_path, self.parse_state)
+            self.star_key = key
+            if new is not self.pipeline:
+                carry_enrichment(self.pipeline, new)
+            changed = {
+                name for name, job in new.jobs.items()
+                if statuses.get(name) != job.status
+            }
+            self.pipeline = new
+            pipeline_changed = True
+        changed |= self._track_running()
+        return pipeline_changed, changed
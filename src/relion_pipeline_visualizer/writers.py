@@ -0,0 +1,496 @@
+# relion-pipeline-visualizer
+# Copyright (C) 2025 Sean Connell <sean.connell@gmail.com>
+# Structural Biology of Cellular Machines Laboratory, Biobizkaia
+# Licensed under the GNU General Public License v3.0 (GPL-3.0)
+
+"""Streaming writers for the HTML viewer, plus atomic file replacement."""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TextIO
+
+from relion_pipeline_visualizer.parser import Pipeline
+
+
+HTML_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+{head}  <style>
+    body {{ margin: 0; padding: 20px; background: #fff; }}
+    #diagram {{ text-align: center; }}
+    .job-tooltip {{
+      position: absolute;
+      background: #222;
+      color: #fff;
+      padding: 8px 12px;
+      border-radius: 6px;
+      font: 24px/1.4 monospace;
+      white-space: pre-wrap;
+      max-width: 700px;
+      pointer-events: none;
+      z-index: 1000;
+      box-shadow: 0 2px 8px rgba(0,0,0,0.3);
+    }}
+  </style>
+</head>
+<body>
+  <div id="diagram">
+{diagram}
+  </div>
+{scripts}
+  <script>
+    var jobInfo = {job_info_json};
+
+    // Tooltip data that is not inline (null entries) is fetched on first hover
+{loader}
+
+    function withJobInfo(jobId, done) {{
+      if (jobInfo[jobId]) done(jobInfo[jobId]);
+      else loadJobInfo(jobId, done);
+    }}
+
+    function describeJob(info) {{
+      var lines = [];
+      if (info.members) {{
+        lines.push("Collapsed " + info.members.length + " jobs:");
+        info.members.forEach(function(m) {{ lines.push("  " + m); }});
+        return lines;
+      }}
+      lines.push("Job:    " + info.name);
+      if (info.alias) lines.push("Alias:  " + info.alias);
+      lines.push("Type:   " + info.type_label);
+      lines.push("Status: " + info.status);
+      if (info.truncated) lines.push("(lineage continues beyond the depth limit)");
+
+      if (info.last_command) {{
+        lines.push("");
+        lines.push("Command:");
+        var cmd = info.last_command;
+        if (cmd.length > 300) cmd = cmd.substring(0, 300) + "...";
+        lines.push("  " + cmd);
+      }}
+
+      if (info.model_classes && info.model_classes.length > 0) {{
+        lines.push("");
+        if (info.pixel_size) lines.push("Pixel size:   " + info.pixel_size.toFixed(3) + " A/px");
+        if (info.iteration) lines.push("Iteration:    " + info.iteration);
+        if (info.model_classes.length === 1) {{
+          var mc = info.model_classes[0];
+          lines.push("Resolution:   " + mc.resolution.toFixed(2) + " A");
+          lines.push("Completeness: " + (mc.completeness * 100).toFixed(1) + "%");
+          lines.push("Distribution: " + (mc.distribution * 100).toFixed(1) + "%");
+          lines.push("Acc. rot:     " + mc.accuracy_rot.toFixed(2) + " deg");
+        }} else {{
+          lines.push("Classes:");
+          info.model_classes.forEach(function(mc) {{
+            lines.push("  Class " + mc.class_index
+              + ": " + mc.resolution.toFixed(2) + " A"
+              + " | " + (mc.completeness * 100).toFixed(1) + "%"
+              + " | " + (mc.distribution * 100).toFixed(1) + "%"
+              + " | " + mc.accuracy_rot.toFixed(2) + " deg");
+          }});
+        }}
+      }}
+      return lines;
+    }}
+
+    function attachTooltips() {{
+      var tip = document.createElement("div");
+      tip.className = "job-tooltip";
+      tip.style.display = "none";
+      document.body.appendChild(tip);
+      var hovered = null;
+
+      function findJobId(node) {{
+        var did = node.getAttribute("data-id");
+        if (did && did in jobInfo) return did;
+        var m = node.id.match(/job\\d+/);
+        return m ? m[0] : null;
+      }}
+
+      document.querySelectorAll(".node").forEach(function(node) {{
+        var jobId = findJobId(node);
+        if (!jobId || !(jobId in jobInfo)) return;
+
+        node.style.cursor = "pointer";
+        node.addEventListener("mouseenter", function(e) {{
+          hovered = jobId;
+          withJobInfo(jobId, function(info) {{
+            if (hovered !== jobId) return;
+            tip.textContent = describeJob(info).join("\\n");
+            tip.style.display = "block";
+          }});
+        }});
+        node.addEventListener("mousemove", function(e) {{
+          var tipW = tip.offsetWidth, tipH = tip.offsetHeight;
+          var x = e.pageX + 12, y = e.pageY + 12;
+          if (e.clientY + 12 + tipH > window.innerHeight) y = e.pageY - tipH - 12;
+          if (e.clientX + 12 + tipW > window.innerWidth) x = e.pageX - tipW - 12;
+          tip.style.left = x + "px";
+          tip.style.top = y + "px";
+        }});
+        node.addEventListener("mouseleave", function() {{
+          hovered = null;
+          tip.style.display = "none";
+        }});
+      }});
+    }}
+
+{start}
+  </script>
+</body>
+</html>
+"""
+
+
+INDEX_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <style>
+    body {{ margin: 0; padding: 20px; font: 16px/1.4 sans-serif; }}
+    table {{ border-collapse: collapse; }}
+    th, td {{ padding: 4px 12px; border-bottom: 1px solid #ddd; text-align: left; }}
+    .Failed {{ color: #f44336; }}
+    .Running {{ color: #FF9800; }}
+  </style>
+</head>
+<body>
+  <h1>{title}</h1>
+  <table>
+    <tr><th>Job</th><th>Alias</th><th>Status</th><th>Jobs in lineage</th></tr>
+{rows}
+  </table>
+</body>
+</html>
+"""
+
+INDEX_ROW_TEMPLATE = (
+    '    <tr><td><a href="{href}">{name}</a></td><td>{alias}</td>'
+    '<td class="{status}">{status}</td><td>{n_jobs}</td></tr>'
+)
+
+BATCH_INDEX_TEMPLATE = """\
+<!DOCTYPE html>
+<html>
+<head>
+  <meta charset="utf-8">
+  <title>{title}</title>
+  <style>
+    body {{ margin: 0; padding: 20px; font: 16px/1.4 sans-serif; }}
+    table {{ border-collapse: collapse; }}
+    th, td {{ padding: 4px 12px; border-bottom: 1px solid #ddd; text-align: left; }}
+    td.n {{ text-align: right; }}
+    .path {{ color: #666; font-size: 13px; }}
+    .failed, .timeout {{ color: #f44336; }}
+  </style>
+</head>
+<body>
+  <h1>{title}</h1>
+  <p>{counts}, generated {generated}.</p>
+  <table>
+    <tr><th>Project</th><th>Status</th><th>Jobs</th><th>Failed</th><th>Running</th>
+      <th>Best resolution</th><th>Seconds</th></tr>
+{rows}
+  </table>
+</body>
+</html>
+"""
+
+BATCH_INDEX_ROW_TEMPLATE = (
+    '    <tr><td>{project}<br><span class="path">{path}</span></td>'
+    '<td class="{status}" title="{error}">{status}</td><td class="n">{n_jobs}</td>'
+    '<td class="n">{n_failed}</td><td class="n">{n_running}</td><td>{resolution}</td>'
+    '<td class="n">{seconds}</td></tr>'
+)
+
+
+# Diagram wrapper, extra scripts and start-up code for each renderer. The
+# Mermaid page lays the graph out in the browser and attaches tooltips once
+# it has drawn; an inline SVG is already laid out and needs no library.
+VIEWERS = {
+    "mermaid": {
+        "open": '    <pre class="mermaid">\n',
+        "close": "\n    </pre>",
+        "scripts": '  <script src="https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.min.js"></script>',
+        "start": (
+            "    mermaid.initialize({ startOnLoad: false, fontSize: 48 });\n"
+            "    mermaid.run().then(attachTooltips);"
+        ),
+    },
+    "svg": {
+        "open": "",
+        "close": "",
+        "scripts": "",
+        "start": "    attachTooltips();",
+    },
+}
+
+# Where the viewer finds its tooltip data: inline in the page, in one gzip
+# sidecar fetched on the first hover (needs the page to be served over HTTP),
+# or in one small script per job, which also works from file:// URLs.
+JOB_INFO_MODES = ("inline", "gzip", "shards")
+
+_INLINE_LOADER = "    function loadJobInfo(jobId, done) {}"
+
+_GZIP_LOADER = """\
+    var jobInfoRequest = null;
+    function loadJobInfo(jobId, done) {
+      if (!jobInfoRequest) {
+        jobInfoRequest = fetch(%s)
+          .then(function(r) {
+            return new Response(r.body.pipeThrough(new DecompressionStream("gzip"))).json();
+          })
+          .then(function(all) { Object.assign(jobInfo, all); });
+      }
+      jobInfoRequest.then(function() { if (jobInfo[jobId]) done(jobInfo[jobId]); });
+    }"""
+
+_SHARD_LOADER = """\
+    var jobInfoWaiting = {};
+    function jobInfoLoaded(jobId, info) {
+      jobInfo[jobId] = info;
+      (jobInfoWaiting[jobId] || []).forEach(function(done) { done(info); });
+      delete jobInfoWaiting[jobId];
+    }
+    function loadJobInfo(jobId, done) {
+      if (jobInfoWaiting[jobId]) { jobInfoWaiting[jobId].push(done); return; }
+      jobInfoWaiting[jobId] = [done];
+      var script = document.createElement("script");
+      script.src = %s + jobId + ".js";
+      script.onerror = function() { delete jobInfoWaiting[jobId]; };
+      document.head.appendChild(script);
+    }"""
+
+# Reloads the page when the watcher writes a new version file. Loading it as
+# a script (rather than with fetch) also works for pages opened from disk.
+_VERSION_POLLER = """\
+  <script>
+    var pageVersion = %s;
+    function pipelineVersion(version) {
+      if (version !== pageVersion) location.reload();
+    }
+    setInterval(function() {
+      var script = document.createElement("script");
+      script.src = %s + "?t=" + Date.now();
+      script.onload = script.onerror = function() { script.remove(); };
+      document.head.appendChild(script);
+    }, %d);
+  </script>
+"""
+
+# Split once so the viewer can be written piecewise around the diagram and
+# the tooltip data; each piece is formatted separately, which also collapses
+# the doubled braces.
+_HTML_HEAD, _rest = HTML_TEMPLATE.split("{diagram}")
+_HTML_MIDDLE, _HTML_TAIL = _rest.split("{job_info_json}")
+del _rest
+
+
+def _current_umask() -> int:
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp creates files as 0600; give replaced outputs the usual permissions
+_UMASK = _current_umask()
+
+
+@contextmanager
+def atomic_write(path: str | Path, mode: str = "w") -> Iterator[TextIO]:
+    """Open a temporary file next to ``path`` and move it into place on success.
+
+    Readers never see a partially written file, and a failed write leaves
+    any previous version of ``path`` untouched. Use ``mode="wb"`` for bytes.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{path.name}.", suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as fp:
+            yield fp
+        os.chmod(tmp_name, 0o666 & ~_UMASK)
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
+def job_metadata(
+    job_name: str,
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> dict | None:
+    """JSON-ready description of one drawn job, shared by every output format.
+
+    Returns None for names that are not in the pipeline.
+    """
+    job = pipeline.jobs.get(job_name)
+    if job is None:
+        return None
+    mg = job.model_general
+    info = {
+        "name": job.name,
+        "alias": job.alias,
+        "type_label": job.type_label,
+        "status": job.status,
+        "last_command": job.last_command,
+        "pixel_size": mg.pixel_size if mg else None,
+        "iteration": mg.iteration if mg else None,
+        "model_classes": [
+            {
+                "class_index": mc.class_index,
+                "resolution": mc.estimated_resolution,
+                "completeness": mc.overall_fourier_completeness,
+                "distribution": mc.class_distribution,
+                "accuracy_rot": mc.accuracy_rotations,
+                "accuracy_trans": mc.accuracy_translations_angst,
+            }
+            for mc in job.model_classes
+        ] if job.model_classes else None,
+        "truncated": job_name in (truncated or ()),
+    }
+    if groups and job_name in groups:
+        info["members"] = [
+            f"{m} ({pipeline.jobs[m].status})" if m in pipeline.jobs else m
+            for m in groups[job_name]
+        ]
+    return info
+
+
+def build_job_info(
+    jobs: set[str],
+    pipeline: Pipeline,
+    truncated: set[str] | None = None,
+    groups: dict[str, list[str]] | None = None,
+) -> dict:
+    """Build tooltip data keyed by Mermaid node ID."""
+    job_info = {}
+    for job_name in sorted(jobs):
+        info = job_metadata(job_name, pipeline, truncated, groups)
+        if info is not None:
+            job_info[pipeline.jobs[job_name].job_id] = info
+    return job_info
+
+
+class HashingWriter:
+    """Text sink that only keeps a SHA-256 of what is written to it.
+
+    Lets a streaming writer be run to learn whether its output would change
+    without building that output in memory.
+    """
+
+    def __init__(self):
+        self._digest = hashlib.sha256()
+
+    def write(self, text: str) -> int:
+        self._digest.update(text.encode("utf-8"))
+        return len(text)
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+def version_file(html_path: Path) -> Path:
+    """Path of the file a watched page polls for its current version."""
+    return html_path.with_name(f"{html_path.stem}.version.js")
+
+
+def version_poller(html_path: Path, version: str, interval: float) -> str:
+    """Head snippet that reloads the page once ``version_file`` changes."""
+    return _VERSION_POLLER % (
+        json.dumps(version), json.dumps(version_file(html_path).name), max(int(interval * 1000), 500),
+    )
+
+
+def write_version_file(html_path: Path, version: str) -> None:
+    """Announce ``version`` to open copies of the page (see ``version_poller``)."""
+    with atomic_write(version_file(html_path)) as fp:
+        fp.write(f"pipelineVersion({json.dumps(version)});\n")
+
+
+def job_info_sidecar(html_path: Path, mode: str) -> Path | None:
+    """Path of the tooltip data written next to ``html_path`` in ``mode``."""
+    if mode == "gzip":
+        return html_path.with_name(f"{html_path.stem}.jobinfo.json.gz")
+    if mode == "shards":
+        return html_path.with_name(f"{html_path.stem}_jobinfo")
+    return None
+
+
+def write_job_info_sidecar(html_path: Path, job_info: dict, mode: str) -> tuple[dict, str]:
+    """Move ``job_info`` out of the page into its sidecar file(s).
+
+    Returns the job info to embed instead (node IDs mapped to None) and the
+    loader script that fetches the real entries on hover.
+    """
+    if mode == "inline":
+        return job_info, _INLINE_LOADER
+    sidecar = job_info_sidecar(html_path, mode)
+    if mode == "gzip":
+        # mtime=0 keeps the archive identical for identical data
+        with atomic_write(sidecar, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+            with io.TextIOWrapper(gz, encoding="utf-8") as fp:
+                json.dump(job_info, fp)
+        loader = _GZIP_LOADER % json.dumps(sidecar.name)
+    elif mode == "shards":
+        sidecar.mkdir(exist_ok=True)
+        for node_id, info in job_info.items():
+            with atomic_write(sidecar / f"{node_id}.js") as fp:
+                fp.write(f"jobInfoLoaded({json.dumps(node_id)}, ")
+                json.dump(info, fp)
+                fp.write(");\n")
+        # Shards of jobs no longer drawn are left over from earlier runs
+        for stale in sidecar.glob("*.js"):
+            if stale.stem not in job_info:
+                stale.unlink()
+        loader = _SHARD_LOADER % json.dumps(f"{sidecar.name}/")
+    else:
+        raise ValueError(f"unknown job info mode: {mode!r}")
+    return dict.fromkeys(job_info), loader
+
+
+def write_html(
+    fp: TextIO,
+    title: str,
+    write_diagram: Callable[[TextIO], None],
+    job_info: dict,
+    renderer: str = "mermaid",
+    loader: str = _INLINE_LOADER,
+    scripts: str | None = None,
+    head: str = "",
+) -> None:
+    """Stream the HTML viewer to ``fp``.
+
+    ``write_diagram`` writes the diagram into the page (for example
+    ``partial(render_mermaid_to, jobs=..., ...)``, or ``render_svg_to`` with
+    ``renderer="svg"``) and ``job_info`` is serialised straight into the
+    file, so no copy of the page is built. ``loader`` comes from
+    ``write_job_info_sidecar`` when the tooltip data lives outside the page.
+    ``scripts`` replaces the renderer's library tags, e.g. with a local
+    Mermaid bundle (see ``assets``); ``head`` is added to the page head,
+    e.g. a ``version_poller``.
+    """
+    viewer = VIEWERS[renderer]
+    fp.write(_HTML_HEAD.format(title=title, head=head))
+    fp.write(viewer["open"])
+    write_diagram(fp)
+    fp.write(viewer["close"])
+    fp.write(_HTML_MIDDLE.format(scripts=viewer["scripts"] if scripts is None else scripts))
+    json.dump(job_info, fp)
+    fp.write(_HTML_TAIL.format(loader=loader, start=viewer["start"]))
@@ -12,15 +12,32 @@ from relion_pipeline_visualizer.parser import (
     parse_note_txt,
     parse_model_star,
     find_last_iteration_model,
+    iter_note_commands,
+    read_last_command,
     ModelGeneralInfo,
+    _parse_pipeline_native,
+    _parse_pipeline_starfile,
 )
+from relion_pipeline_visualizer.star import StarParseError, iter_star_rows, read_star_blocks
 from relion_pipeline_visualizer.graph import (
+    Adjacency,
+    _closure,
+    collapse_by_type,
+    collapse_chains,
+    collapse_fans,
+    collapse_graph,
+    get_adjacency,
     get_full_graph,
+    get_neighbourhood,
     get_ancestors,
     get_descendants,
     get_subgraph,
+    get_subgraphs,
+    topological_order,
+    transitive_reduction,
 )
-from relion_pipeline_visualizer.mermaid import render_mermaid
+from relion_pipeline_visualizer.mermaid import render_mermaid, render_mermaid_to
+from relion_pipeline_visualizer.svg import assign_layers, count_crossings, layered_layout, order_layers, render_svg
 from relion_pipeline_visualizer.cli import _resolve_job_name
 
 DATA_DIR = Path(__file__).parent / "data"
@@ -29,6 +46,12 @@ SMALL_PROJECT = DATA_DIR / "small_project"
 FULL_STAR = DATA_DIR / "default_pipeline.star"
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the CLI's enrichment cache out of the user's home directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("xdg_cache")))
+
+
 # ── Parser tests ──────────────────────────────────────────────────────
 
 
@@ -42,6 +65,16 @@ def full_pipeline() -> Pipeline:
     return parse_pipeline(FULL_STAR)
 
 
+@pytest.fixture
+def project_star(tmp_path: Path) -> Path:
+    """A writable copy of small_project with its default_pipeline.star."""
+    import shutil
+    project = tmp_path / "project"
+    shutil.copytree(SMALL_PROJECT, project)
+    shutil.copy(SMALL_STAR, project / "default_pipeline.star")
+    return project / "default_pipeline.star"
+
+
 class TestParsePipeline:
     def test_job_count(self, small_pipeline: Pipeline):
         assert len(small_pipeline.jobs) == 11
@@ -105,6 +138,255 @@ class TestParsePipeline:
         assert len(full_pipeline.jobs) == 98
         assert len(full_pipeline.edges) > 100
 
+    def test_jobs_have_no_instance_dict(self, project_star: Path):
+        pipeline = parse_pipeline(project_star)
+        enrich_jobs(pipeline, project_star.parent)
+        job = pipeline.jobs["Refine3D/job004/"]
+        for obj in (job, job.model_classes[0], job.model_general):
+            assert not hasattr(obj, "__dict__")
+
+    def test_repeated_strings_are_shared(self, small_pipeline: Pipeline):
+        jobs = small_pipeline.jobs
+        assert jobs["Import/job001/"].status is jobs["Extract/job002/"].status
+        for src, tgt in small_pipeline.edges:
+            assert src is jobs[src].name and tgt is jobs[tgt].name
+
+    def test_alias_assignment_updates_display_label(self, small_pipeline: Pipeline):
+        job = small_pipeline.jobs["Import/job001/"]
+        job.alias = "Import/movies/"
+        assert job.display_label == "movies<br/>Import"
+        job.alias = None
+        assert job.display_label == "Import/job001"
+
+    def test_dataclass_api(self, small_pipeline: Pipeline):
+        import copy
+        import dataclasses
+
+        job = small_pipeline.jobs["Import/job001/"]
+        assert repr(job).startswith("Job(name='Import/job001/', alias=None,")
+        assert dataclasses.asdict(job)["name"] == "Import/job001/"
+        renamed = dataclasses.replace(job, alias="Import/movies/", status="Running")
+        assert (renamed.job_id, renamed.display_label) == ("job001", "movies<br/>Import")
+        assert job.status != "Running" and copy.copy(job) == job
+
+
+class TestStreamingStar:
+    @pytest.mark.parametrize("star", [SMALL_STAR, FULL_STAR])
+    def test_native_matches_starfile(self, star: Path):
+        native = _parse_pipeline_native(star)
+        reference = _parse_pipeline_starfile(star)
+        assert native.jobs == reference.jobs
+        assert native.edges == reference.edges
+        assert list(native.jobs) == list(reference.jobs)
+
+    def test_pair_block(self):
+        rows = list(iter_star_rows(FULL_STAR, {"pipeline_general"}))
+        assert rows == [("pipeline_general", {"rlnPipeLineJobCounter": "102"})]
+
+    def test_loop_rows(self):
+        rows = [row for block, row in iter_star_rows(SMALL_STAR) if block == "pipeline_processes"]
+        assert len(rows) == 11
+        assert rows[6]["rlnPipeLineProcessAlias"] == "Select/j007_best_class/"
+
+    def test_quoted_values(self):
+        lines = ["data_x", "loop_", "_a #1", "_b #2", 'foo "bar baz"']
+        assert list(iter_star_rows(lines)) == [("x", {"a": "foo", "b": "bar baz"})]
+
+    def test_stops_after_requested_blocks(self):
+        def lines():
+            yield from ["data_a", "_k 1", "data_b", "_k 2"]
+            raise AssertionError("read past the requested block")
+
+        assert list(iter_star_rows(lines(), {"a"})) == [("a", {"k": "1"})]
+
+    def test_malformed_row_raises(self):
+        with pytest.raises(StarParseError):
+            list(iter_star_rows(["data_x", "loop_", "_a #1", "_b #2", "only_one"]))
+
+    def test_fallback_to_starfile(self, monkeypatch):
+        import relion_pipeline_visualizer.parser as parser_mod
+
+        def broken(path):
+            raise StarParseError("unsupported")
+
+        monkeypatch.setattr(parser_mod, "_parse_pipeline_native", broken)
+        pipeline = parse_pipeline(SMALL_STAR)
+        assert len(pipeline.jobs) == 11
+
+
+# ── Import time tests ────────────────────────────────────────────────
+
+
+def _imported_modules(*args: str) -> set[str]:
+    """Modules a fresh interpreter imports for ``args``, from ``-X importtime``."""
+    import subprocess
+    import sys
+
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], capture_output=True, text=True)
+    return {
+        line.split("|")[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    }
+
+
+# Heavy or rarely needed modules that must only load on the paths using them
+_LAZY_MODULES = {"pandas", "numpy", "starfile", "urllib.request", "http.server", "cProfile", "concurrent.futures"}
+
+
+class TestImportTime:
+    def test_cli_import_is_light(self):
+        modules = _imported_modules("-c", "import relion_pipeline_visualizer.cli")
+        assert "relion_pipeline_visualizer.cli" in modules
+        assert not modules & _LAZY_MODULES
+
+    def test_job_lookup_error_is_light(self):
+        modules = _imported_modules("-m", "relion_pipeline_visualizer", str(SMALL_STAR), "--job", "999")
+        assert "relion_pipeline_visualizer.parser" in modules
+        assert not modules & _LAZY_MODULES
+
+
+# ── Incremental parse tests ──────────────────────────────────────────
+
+
+def _star_blocks(text: str) -> list[tuple[str, list[str], list[str]]]:
+    """Split RELION STAR text into (block, header lines, row lines)."""
+    blocks = []
+    for line in text.splitlines():
+        if line.startswith("data_"):
+            blocks.append((line.strip()[5:], [line], []))
+        elif not blocks:
+            continue
+        elif line.strip() and not line.lstrip().startswith(("#", "_", "loop_")) and blocks[-1][0] != "pipeline_general":
+            blocks[-1][2].append(line)
+        elif not blocks[-1][2]:
+            blocks[-1][1].append(line)
+    return blocks
+
+
+def _pipeline_snapshot(text: str, n_jobs: int, running: bool = False) -> str:
+    """The pipeline as it looked after its first ``n_jobs`` jobs were created."""
+    out = ["# version 50001", ""]
+    names: tuple[str, ...] = ()
+    for block, header, rows in _star_blocks(text):
+        if block == "pipeline_processes":
+            rows = rows[:n_jobs]
+            names = tuple(row.split()[0] for row in rows)
+            if running and rows:
+                rows[-1] = " ".join(rows[-1].split()[:3] + ["Running"])
+        elif block == "pipeline_nodes":
+            rows = [row for row in rows if row.split()[0].startswith(names)]
+        elif block == "pipeline_input_edges":
+            rows = [row for row in rows if row.split()[1] in names]
+        elif block == "pipeline_output_edges":
+            rows = [row for row in rows if row.split()[0] in names]
+        out.extend(header + rows + ["", "# version 50001", ""])
+    return "\n".join(out) + "\n"
+
+
+class TestIncrementalParse:
+    def _check(self, pipeline: Pipeline, path: Path):
+        expected = parse_pipeline(path)
+        assert pipeline.jobs == expected.jobs
+        assert set(pipeline.edges) == set(expected.edges)
+
+    def test_growing_pipeline(self, tmp_path: Path):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        text = FULL_STAR.read_text()
+        path = tmp_path / "default_pipeline.star"
+        state = PipelineParseState()
+        pipeline = None
+        full_parses = []
+        total = len(parse_pipeline(FULL_STAR).jobs)
+        for n_jobs in [*range(1, total, 7), total]:
+            # Each job first appears as Running, then finishes
+            for running in (True, False):
+                path.write_text(_pipeline_snapshot(text, n_jobs, running))
+                updated = update_pipeline(pipeline, path, state)
+                assert pipeline is None or updated is pipeline
+                pipeline = updated
+                full_parses.append(state.full_parse)
+                self._check(pipeline, path)
+        assert full_parses[0] and not any(full_parses[1:])
+        assert len(pipeline.jobs) == total
+
+    def test_alias_changed_in_place(self, tmp_path: Path):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        text = SMALL_STAR.read_text()
+        path = tmp_path / "default_pipeline.star"
+        path.write_text(text)
+        state = PipelineParseState()
+        pipeline = update_pipeline(None, path, state)
+        path.write_text(text.replace("Select/j007_best_class/", "Select/j007_good_class/"))
+        assert update_pipeline(pipeline, path, state) is pipeline
+        assert not state.full_parse
+        assert pipeline.jobs["Select/job007/"].display_label == "j007_good_class<br/>Select"
+
+    def test_node_with_a_new_producer(self, tmp_path: Path):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        text = SMALL_STAR.read_text()
+        path = tmp_path / "default_pipeline.star"
+        path.write_text(text)
+        state = PipelineParseState()
+        pipeline = update_pipeline(None, path, state)
+        assert ("MaskCreate/job005/", "Class3D/job006/") in pipeline.edges
+
+        # An appended output row makes CtfRefine the producer of the mask
+        path.write_text(text.rstrip("\n") + "\nCtfRefine/job008/ MaskCreate/job005/mask.mrc\n")
+        pipeline = update_pipeline(pipeline, path, state)
+        self._check(pipeline, path)
+        assert ("CtfRefine/job008/", "Class3D/job006/") in pipeline.edges
+        assert ("MaskCreate/job005/", "Class3D/job006/") not in pipeline.edges
+
+    def test_edges_arriving_before_their_producer(self, tmp_path: Path):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        text = SMALL_STAR.read_text()
+        tail = "MultiBody/job010/ MultiBody/job010/run_optimiser.star\n"
+        path = tmp_path / "default_pipeline.star"
+        path.write_text(text[:text.index(tail)] + "\n")
+        state = PipelineParseState()
+        pipeline = update_pipeline(None, path, state)
+        assert ("MultiBody/job010/", "Subtract/job011/") not in pipeline.edges
+        assert state.pending_inputs
+
+        # The producer's output edges are appended to their block
+        path.write_text(text)
+        assert update_pipeline(pipeline, path, state) is pipeline
+        assert not state.full_parse
+        assert ("MultiBody/job010/", "Subtract/job011/") in pipeline.edges
+        self._check(pipeline, path)
+
+    def test_unchanged_file_is_not_read(self, tmp_path: Path, monkeypatch):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        path = tmp_path / "default_pipeline.star"
+        path.write_text(SMALL_STAR.read_text())
+        state = PipelineParseState()
+        pipeline = update_pipeline(None, path, state)
+        monkeypatch.setattr(Path, "read_text", lambda self: pytest.fail("file was read again"))
+        assert update_pipeline(pipeline, path, state) is pipeline
+
+    def test_deleted_job_forces_full_parse(self, tmp_path: Path):
+        from relion_pipeline_visualizer.parser import PipelineParseState, update_pipeline
+
+        text = FULL_STAR.read_text()
+        path = tmp_path / "default_pipeline.star"
+        path.write_text(_pipeline_snapshot(text, 40))
+        state = PipelineParseState()
+        pipeline = update_pipeline(None, path, state)
+
+        lines = _pipeline_snapshot(text, 40).splitlines(keepends=True)
+        victim = next(line.split()[0] for line in lines if line.startswith("Class3D/"))
+        path.write_text("".join(line for line in lines if victim not in line))
+        updated = update_pipeline(pipeline, path, state)
+        assert state.full_parse and updated is not pipeline
+        assert victim not in updated.jobs
+        self._check(updated, path)
+
 
 # ── Enrichment tests ─────────────────────────────────────────────────
 
@@ -120,6 +402,22 @@ class TestEnrichment:
         cmd = parse_note_txt(SMALL_PROJECT, "Extract/job002/")
         assert cmd is None
 
+    @pytest.mark.parametrize("block_size", [7, 64, 8192])
+    def test_note_commands_newest_first(self, tmp_path: Path, block_size: int):
+        note = tmp_path / "note.txt"
+        blocks = [f" ++++ Executing command at: run {i}\n`which relion_refine` --continue run_it{i:03d}_optimiser.star\n"
+                  for i in range(50)]
+        note.write_text("`which relion_refine` --first\n" + "\n".join(blocks))
+        commands = list(iter_note_commands(note, block_size=block_size))
+        assert commands[0] == "`which relion_refine` --continue run_it049_optimiser.star"
+        assert commands[-1] == "`which relion_refine` --first"
+        assert len(commands) == 51
+
+    def test_last_command_after_large_history(self, tmp_path: Path):
+        note = tmp_path / "note.txt"
+        note.write_bytes(b"\xff" * 100_000 + b"\n ++++ Executing command at: x\n`which relion_import` --last\n")
+        assert read_last_command(note) == "`which relion_import` --last"
+
     def test_parse_model_star_refine3d(self):
         model_path = SMALL_PROJECT / "Refine3D/job004/run_model.star"
         classes, general = parse_model_star(model_path)
@@ -155,11 +453,55 @@ class TestEnrichment:
         assert classes is None
         assert general is None
 
+    def test_read_star_blocks(self):
+        data = read_star_blocks(SMALL_PROJECT / "Class3D/job006/run_it025_model.star", {"model_general", "model_classes"})
+        assert data["model_general"]["rlnPixelSize"] == "3.300000"
+        assert len(data["model_classes"]) == 3
+
+    def test_read_star_blocks_skips_trailing_tables(self, tmp_path: Path):
+        # A malformed table after model_classes must never be tokenised
+        model_path = tmp_path / "run_it025_model.star"
+        text = (SMALL_PROJECT / "Class3D/job006/run_it025_model.star").read_text()
+        model_path.write_text(text + "\ndata_model_class_1\n\nloop_\n_rlnSpectralIndex #1\n_rlnSsnrMap #2\nbroken\n")
+        classes, general = parse_model_star(model_path)
+        assert len(classes) == 3
+        assert general.iteration == 25
+
     def test_find_last_iteration_model(self):
         model = find_last_iteration_model(SMALL_PROJECT, "Class3D/job006/")
         assert model is not None
         assert "run_it025_model.star" in model.name
 
+    def test_job_file_index_iterations(self, tmp_path: Path):
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+
+        for name in [
+            "run_it009_model.star", "run_it010_model.star", "run_it010_data.star",
+            "run_it010_class001.mrc", "run_it99_model.star", "run_ct99_it100_model.star",
+            "run_ct99_it100_half1_model.star", "run_it100_half2_model.star", "note.txt",
+        ]:
+            (tmp_path / name).touch()
+        index = JobFileIndex.scan(tmp_path)
+        assert index.last_iteration == 100
+        assert index.last_iteration_model() == tmp_path / "run_ct99_it100_model.star"
+        assert "note.txt" in index
+        assert index.stat("note.txt").st_size == 0
+        assert index.stat("missing.txt") is None
+
+    def test_job_file_index_half_maps_only(self, tmp_path: Path):
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+
+        for name in ["run_it012_half1_model.star", "run_it012_half2_model.star", "run_it011_half1_model.star"]:
+            (tmp_path / name).touch()
+        assert JobFileIndex.scan(tmp_path).last_model_name == "run_it012_half1_model.star"
+
+    def test_job_file_index_missing_dir(self, tmp_path: Path):
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+
+        index = JobFileIndex.scan(tmp_path / "nope")
+        assert index.entries == {}
+        assert index.last_iteration_model() is None
+
     def test_find_last_iteration_model_missing(self):
         model = find_last_iteration_model(SMALL_PROJECT, "Import/job001/")
         assert model is None
@@ -196,6 +538,161 @@ class TestEnrichment:
         ext = pipeline.jobs["Extract/job002/"]
         assert ext.last_command is None
 
+    def test_enrich_selected_jobs_only(self, monkeypatch):
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+
+        touched = []
+        real = JobFileIndex.scan.__func__
+
+        def recording_scan(cls, job_dir):
+            touched.append(f"{job_dir.relative_to(SMALL_PROJECT)}/")
+            return real(cls, job_dir)
+
+        monkeypatch.setattr(JobFileIndex, "scan", classmethod(recording_scan))
+        pipeline = parse_pipeline(SMALL_STAR)
+        jobs, _ = get_subgraph(pipeline, "Refine3D/job004/", upstream=True)
+        enrich_jobs(pipeline, SMALL_PROJECT, job_names=jobs)
+
+        assert sorted(touched) == sorted(jobs)
+        assert pipeline.jobs["Refine3D/job004/"].model_classes is not None
+        assert pipeline.jobs["Class3D/job006/"].model_classes is None
+
+
+class TestParallelEnrichment:
+    @staticmethod
+    def _slow_filesystem(monkeypatch, delay: float = 0.05):
+        """Make every job directory listing cost ``delay`` seconds, like a slow NFS mount."""
+        import time
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+
+        real = JobFileIndex.scan.__func__
+
+        def slow_scan(cls, job_dir):
+            time.sleep(delay)
+            return real(cls, job_dir)
+
+        monkeypatch.setattr(JobFileIndex, "scan", classmethod(slow_scan))
+
+    def test_parallel_is_faster(self, monkeypatch):
+        import time
+
+        self._slow_filesystem(monkeypatch)
+        serial = parse_pipeline(SMALL_STAR)
+        start = time.perf_counter()
+        enrich_jobs(serial, SMALL_PROJECT)
+        serial_time = time.perf_counter() - start
+
+        parallel = parse_pipeline(SMALL_STAR)
+        start = time.perf_counter()
+        enrich_jobs(parallel, SMALL_PROJECT, workers=11)
+        parallel_time = time.perf_counter() - start
+
+        assert parallel_time < serial_time / 2
+
+    def test_parallel_matches_serial(self):
+        serial = parse_pipeline(SMALL_STAR)
+        enrich_jobs(serial, SMALL_PROJECT)
+        parallel = parse_pipeline(SMALL_STAR)
+        enrich_jobs(parallel, SMALL_PROJECT, workers=4)
+        assert parallel.jobs == serial.jobs
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_error_isolated_to_job(self, monkeypatch, workers: int):
+        import relion_pipeline_visualizer.parser as parser_mod
+
+        real = parser_mod.read_last_command
+
+        def flaky_read_last_command(note_path):
+            if note_path.parent.name == "job001":
+                raise PermissionError(note_path)
+            return real(note_path)
+
+        monkeypatch.setattr(parser_mod, "read_last_command", flaky_read_last_command)
+        pipeline = parse_pipeline(SMALL_STAR)
+        errors = enrich_jobs(pipeline, SMALL_PROJECT, workers=workers)
+        assert list(errors) == ["Import/job001/"]
+        assert pipeline.jobs["Import/job001/"].last_command is None
+        assert pipeline.jobs["Refine3D/job004/"].model_classes is not None
+
+
+class TestEnrichmentCache:
+    def test_second_run_does_not_parse(self, tmp_path: Path, project_star: Path, monkeypatch):
+        import relion_pipeline_visualizer.parser as parser_mod
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+
+        project = project_star.parent
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            first = parse_pipeline(project_star)
+            enrich_jobs(first, project, cache=cache)
+
+        real_read, real_parse = parser_mod.read_last_command, parser_mod.parse_model_star
+
+        def no_parsing(real):
+            def check(path):
+                if path.exists():
+                    raise AssertionError(f"parsed {path} despite a valid cache entry")
+                return real(path)
+            return check
+
+        monkeypatch.setattr(parser_mod, "read_last_command", no_parsing(real_read))
+        monkeypatch.setattr(parser_mod, "parse_model_star", no_parsing(real_parse))
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            second = parse_pipeline(project_star)
+            errors = enrich_jobs(second, project, cache=cache)
+
+        assert errors == {}
+        assert second.jobs == first.jobs
+
+    def test_changed_file_is_reparsed(self, tmp_path: Path, project_star: Path):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+
+        project = project_star.parent
+        note = project / "Import/job001/note.txt"
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            pipeline = parse_pipeline(project_star)
+            enrich_jobs(pipeline, project, cache=cache)
+            note.write_text(note.read_text() + "\n ++++ Executing command at: now\n`which relion_import` --rerun\n")
+            enrich_jobs(pipeline, project, cache=cache)
+        assert pipeline.jobs["Import/job001/"].last_command == "`which relion_import` --rerun"
+
+    def test_prune_bounds_size(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+
+        note = SMALL_PROJECT / "Import/job001/note.txt"
+        with EnrichmentCache(tmp_path / "cache.sqlite", max_bytes=250) as cache:
+            for i in range(10):
+                path = tmp_path / f"note{i}.txt"
+                path.write_text("x")
+                cache.put(path, note.stat(), "x" * 100)
+            assert cache.prune() == 8
+            assert len(cache) == 2
+
+    def test_clear(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+
+        note = SMALL_PROJECT / "Import/job001/note.txt"
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            cache.put(note, note.stat(), "cmd")
+            assert cache.get(note, note.stat()) == (True, "cmd")
+            cache.clear()
+            assert cache.get(note, note.stat()) == (False, None)
+
+    def test_writes_are_buffered_until_flush(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+
+        note = SMALL_PROJECT / "Import/job001/note.txt"
+        model = SMALL_PROJECT / "Class3D/job006/run_it025_model.star"
+        # Two open caches, as in two batch workers, do not lock each other out
+        with EnrichmentCache(tmp_path / "cache.sqlite") as first, EnrichmentCache(tmp_path / "cache.sqlite") as second:
+            first.put(note, note.stat(), "cmd")
+            second.put(model, model.stat(), [])
+            assert first.get(note, note.stat()) == (True, "cmd")
+            assert second.get(note, note.stat()) == (False, None)
+            first.flush()
+            assert second.get(note, note.stat()) == (True, "cmd")
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            assert len(cache) == 2
+
 
 # ── Graph tests ──────────────────────────────────────────────────────
 
@@ -264,6 +761,253 @@ class TestGraph:
         assert "Select/job007/" in jobs
 
 
+class TestDepthLimit:
+    def test_depth_one(self, small_pipeline: Pipeline):
+        jobs, edges, truncated = get_neighbourhood(small_pipeline, "Select/job007/", up_depth=1)
+        assert jobs == {"Select/job007/", "Class3D/job006/"}
+        assert edges == {("Class3D/job006/", "Select/job007/")}
+        assert truncated == {"Class3D/job006/"}
+
+    def test_links_between_frontier_jobs_kept(self, small_pipeline: Pipeline):
+        jobs, edges, truncated = get_neighbourhood(small_pipeline, "Select/job007/", up_depth=2)
+        assert jobs == {"Select/job007/", "Class3D/job006/", "Refine3D/job004/", "MaskCreate/job005/"}
+        assert ("Refine3D/job004/", "MaskCreate/job005/") in edges
+        assert truncated == {"Refine3D/job004/"}
+
+    def test_depth_zero(self, small_pipeline: Pipeline):
+        jobs, edges, truncated = get_neighbourhood(small_pipeline, "Refine3D/job004/", downstream=True, down_depth=0)
+        assert jobs == {"Refine3D/job004/", "JoinStar/job003/", "Extract/job002/", "Import/job001/"}
+        assert truncated == {"Refine3D/job004/"}
+
+    def test_unreached_limit_matches_full(self, small_pipeline: Pipeline):
+        jobs, edges, truncated = get_neighbourhood(
+            small_pipeline, "Refine3D/job004/", downstream=True, up_depth=50, down_depth=50,
+        )
+        assert (jobs, edges) == get_subgraph(small_pipeline, "Refine3D/job004/", downstream=True)
+        assert truncated == set()
+
+    def test_separate_limits(self, small_pipeline: Pipeline):
+        jobs, _ = get_subgraph(
+            small_pipeline, "Refine3D/job004/", downstream=True, up_depth=1, down_depth=None,
+        )
+        assert "JoinStar/job003/" in jobs
+        assert "Extract/job002/" not in jobs
+        assert "Subtract/job011/" in jobs
+
+    def test_render_marks_truncated(self, small_pipeline: Pipeline):
+        jobs, edges, truncated = get_neighbourhood(small_pipeline, "Select/job007/", up_depth=1)
+        mmd = render_mermaid(jobs, edges, small_pipeline, truncated)
+        assert "classDef truncated" in mmd
+        assert "class job006 truncated" in mmd
+        assert 'job006["Class3D/job006<br/>⋯"]' in mmd
+
+
+class TestCollapse:
+    def test_chain(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        c_jobs, c_edges, groups = collapse_chains(jobs, edges)
+        assert groups["Import/job001/"] == ["Extract/job002/", "Import/job001/", "JoinStar/job003/"]
+        assert ("Import/job001/", "Refine3D/job004/") in c_edges
+        assert "Extract/job002/" not in c_jobs
+        assert groups["MultiBody/job010/"] == ["MultiBody/job010/", "Subtract/job011/"]
+
+    def test_keep_is_never_merged(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        c_jobs, _, groups = collapse_chains(jobs, edges, keep={"Extract/job002/"})
+        assert "Extract/job002/" in c_jobs
+        assert all("Extract/job002/" not in members for members in groups.values())
+
+    def test_fans(self):
+        pipeline = parse_pipeline(SMALL_STAR)
+        for i in (12, 13, 14):
+            name = f"Class3D/job{i:03d}/"
+            pipeline.jobs[name] = pipeline.jobs["Class3D/job006/"].__class__(name, None, "relion.class3d", "Succeeded")
+            pipeline.edges.add(("Refine3D/job004/", name))
+        jobs, edges = get_full_graph(pipeline)
+        c_jobs, c_edges, groups = collapse_fans(jobs, edges, pipeline)
+        assert groups["Class3D/job012/"] == ["Class3D/job012/", "Class3D/job013/", "Class3D/job014/"]
+        assert ("Refine3D/job004/", "Class3D/job012/") in c_edges
+        assert "Class3D/job006/" in c_jobs  # different children, not part of the fan
+
+    def test_by_type(self, full_pipeline: Pipeline):
+        jobs, edges = get_full_graph(full_pipeline)
+        c_jobs, c_edges, groups = collapse_by_type(jobs, edges, full_pipeline)
+        assert len(c_jobs) == len({j.job_type for j in full_pipeline.jobs.values()})
+        assert sum(len(m) for m in groups.values()) + len(c_jobs - set(groups)) == len(jobs)
+
+    def test_budget(self, full_pipeline: Pipeline):
+        jobs, edges = get_full_graph(full_pipeline)
+        c_jobs, _, groups = collapse_graph(full_pipeline, jobs, edges, max_nodes=40)
+        assert len(c_jobs) <= 40
+        members = [m for ms in groups.values() for m in ms] + [j for j in c_jobs if j not in groups]
+        assert sorted(members) == sorted(jobs)
+
+    def test_within_budget_untouched(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        assert collapse_graph(small_pipeline, jobs, edges, max_nodes=11) == (jobs, edges, {})
+
+    def test_render_group(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        jobs, edges, groups = collapse_chains(jobs, edges)
+        mmd = render_mermaid(jobs, edges, small_pipeline, groups=groups)
+        assert 'job001["3 jobs<br/>Extract, Import, JoinStar"]' in mmd
+        assert "job001 --> job004" in mmd
+        assert "classDef collapsed" in mmd
+        assert "class job010 running" in mmd  # Subtract/job011 member is running
+
+
+def _reachability(jobs: set[str], edges: set[tuple[str, str]]) -> dict[str, set[str]]:
+    children: dict[str, set[str]] = {job: set() for job in jobs}
+    for src, tgt in edges:
+        children[src].add(tgt)
+    reach = {}
+    for job in jobs:
+        seen, stack = set(), [job]
+        while stack:
+            for child in children[stack.pop()]:
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        reach[job] = seen
+    return reach
+
+
+class TestTransitiveReduction:
+    def test_removes_shortcut(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        reduced = transitive_reduction(jobs, edges)
+        # Refine3D/job004 -> MaskCreate/job005 -> Class3D/job006 makes the direct edge redundant
+        assert ("Refine3D/job004/", "Class3D/job006/") in edges
+        assert ("Refine3D/job004/", "Class3D/job006/") not in reduced
+        assert ("Refine3D/job004/", "MaskCreate/job005/") in reduced
+
+    def test_preserves_reachability(self, full_pipeline: Pipeline):
+        jobs, edges = get_full_graph(full_pipeline)
+        reduced = transitive_reduction(jobs, edges)
+        assert reduced <= edges
+        assert len(reduced) < len(edges)
+        assert _reachability(jobs, reduced) == _reachability(jobs, edges)
+
+    def test_minimal(self, full_pipeline: Pipeline):
+        jobs, edges = get_full_graph(full_pipeline)
+        reduced = transitive_reduction(jobs, edges)
+        reach = _reachability(jobs, reduced)
+        for src, tgt in reduced:
+            # No other child of src reaches tgt
+            others = {t for s, t in reduced if s == src and t != tgt}
+            assert not any(tgt in reach[o] for o in others)
+
+    def test_scales_to_10k_edges(self):
+        import random
+        import time
+
+        rng = random.Random(0)
+        n = 3000
+        jobs = {f"Refine3D/job{i:05d}/" for i in range(n)}
+        edges = set()
+        while len(edges) < 10_000:
+            a, b = sorted(rng.sample(range(n), 2))
+            if b - a < 50:
+                edges.add((f"Refine3D/job{a:05d}/", f"Refine3D/job{b:05d}/"))
+        start = time.perf_counter()
+        reduced = transitive_reduction(jobs, edges)
+        assert time.perf_counter() - start < 5.0
+        assert len(reduced) < len(edges)
+
+        def closure(graph_edges):
+            adj = Adjacency.build(jobs, graph_edges)
+            return _closure(adj.fwd_ptr, adj.fwd_idx, topological_order(adj)[::-1])
+
+        assert closure(reduced) == closure(edges)
+
+    def test_cycle_unchanged(self):
+        edges = {("a", "b"), ("b", "a")}
+        assert transitive_reduction({"a", "b"}, edges) == edges
+
+
+class TestAdjacency:
+    def test_csr_contents(self, small_pipeline: Pipeline):
+        adj = get_adjacency(small_pipeline)
+        assert adj.names == sorted(small_pipeline.jobs)
+        i = adj.index["Refine3D/job004/"]
+        children = {adj.names[c] for c in adj.children(i)}
+        assert children == {t for s, t in small_pipeline.edges if s == "Refine3D/job004/"}
+        parents = {adj.names[p] for p in adj.parents(adj.index["Class3D/job006/"])}
+        assert parents == {"Refine3D/job004/", "MaskCreate/job005/"}
+
+    def test_cached_between_queries(self, small_pipeline: Pipeline):
+        assert get_adjacency(small_pipeline) is get_adjacency(small_pipeline)
+
+    def test_invalidated_when_edges_change(self, small_pipeline: Pipeline):
+        before = get_adjacency(small_pipeline)
+        small_pipeline.edges.add(("Subtract/job011/", "PostProcess/job009/"))
+        after = get_adjacency(small_pipeline)
+        assert after is not before
+        jobs, _ = get_ancestors(small_pipeline, "PostProcess/job009/")
+        assert "Subtract/job011/" in jobs
+
+    def test_every_mutation_bumps_the_version(self):
+        from relion_pipeline_visualizer.parser import EdgeSet
+
+        edges = EdgeSet({("a", "b")})
+        mutations = [
+            lambda e: e.add(("b", "c")), lambda e: e.discard(("x", "y")), lambda e: e.remove(("b", "c")),
+            lambda e: e.update({("c", "d")}), lambda e: e.difference_update({("c", "d")}),
+            lambda e: e.intersection_update({("a", "b")}), lambda e: e.symmetric_difference_update({("e", "f")}),
+            lambda e: e.__ior__({("g", "h")}), lambda e: e.__iand__({("a", "b")}),
+            lambda e: e.__isub__({("a", "b")}), lambda e: e.__ixor__({("i", "j")}),
+            lambda e: e.pop(), lambda e: e.clear(),
+        ]
+        for version, mutate in enumerate(mutations, 1):
+            mutate(edges)
+            assert edges.version == version
+        assert edges == set() and isinstance(edges, EdgeSet)
+
+    def test_plain_edge_set_is_wrapped(self):
+        pipeline = Pipeline(edges={("a", "b")})
+        jobs, edges = get_descendants(pipeline, "a")
+        assert jobs == {"a", "b"}
+        assert edges == {("a", "b")}
+
+    def test_matches_naive_bfs(self, full_pipeline: Pipeline):
+        def naive_ancestors(job):
+            seen, stack = {job}, [job]
+            while stack:
+                current = stack.pop()
+                for src, tgt in full_pipeline.edges:
+                    if tgt == current and src not in seen:
+                        seen.add(src)
+                        stack.append(src)
+            return seen
+
+        for job in list(full_pipeline.jobs)[::7]:
+            jobs, edges = get_ancestors(full_pipeline, job)
+            assert jobs == naive_ancestors(job)
+            assert edges == {(s, t) for s, t in full_pipeline.edges if t in jobs}
+
+
+class TestBatchSubgraphs:
+    @pytest.mark.parametrize("upstream,downstream", [(True, False), (False, True), (True, True)])
+    def test_matches_single_queries(self, full_pipeline: Pipeline, upstream: bool, downstream: bool):
+        targets = sorted(full_pipeline.jobs)
+        batch = get_subgraphs(full_pipeline, targets, upstream=upstream, downstream=downstream)
+        for name in targets:
+            assert batch[name] == get_subgraph(full_pipeline, name, upstream=upstream, downstream=downstream)
+
+    def test_topological_order(self, full_pipeline: Pipeline):
+        adj = get_adjacency(full_pipeline)
+        order = topological_order(adj)
+        position = {node: i for i, node in enumerate(order)}
+        for src, tgt in full_pipeline.edges:
+            assert position[adj.index[src]] < position[adj.index[tgt]]
+
+    def test_cycle_falls_back(self):
+        pipeline = Pipeline(edges={("a", "b"), ("b", "a"), ("b", "c")})
+        assert topological_order(get_adjacency(pipeline)) is None
+        result = get_subgraphs(pipeline, ["c"])
+        assert result["c"][0] == {"a", "b", "c"}
+
+
 # ── Mermaid rendering tests ──────────────────────────────────────────
 
 
@@ -319,6 +1063,751 @@ class TestMermaid:
         assert mmd1 == mmd2
 
 
+# ── SVG layout tests ─────────────────────────────────────────────────
+
+
+def _random_dag(n: int, seed: int = 0) -> tuple[dict[str, str], set[tuple[str, str]]]:
+    import random
+    rng = random.Random(seed)
+    labels = {f"Class3D/job{i:04d}/": f"Class3D/job{i:04d}" for i in range(n)}
+    names = sorted(labels)
+    edges = set()
+    for i in range(1, n):
+        for _ in range(rng.randint(1, 2)):
+            edges.add((names[rng.randrange(max(0, i - 30), i)], names[i]))
+    return labels, edges
+
+
+class TestSvgLayout:
+    def test_layers_follow_edges(self, small_pipeline: Pipeline):
+        nodes = sorted(small_pipeline.jobs)
+        layer = assign_layers(nodes, sorted(small_pipeline.edges))
+        assert all(layer[tgt] > layer[src] for src, tgt in small_pipeline.edges)
+        assert layer["Import/job001/"] == 0
+
+    def test_cycle_does_not_hang(self):
+        layer = assign_layers(["a", "b", "c"], [("a", "b"), ("b", "c"), ("c", "a")])
+        assert set(layer) == {"a", "b", "c"}
+
+    def test_barycenter_removes_crossings(self):
+        # a->y and b->x cross in the initial (sorted) order
+        nodes = ["a", "b", "x", "y"]
+        edges = [("a", "y"), ("b", "x")]
+        layer = assign_layers(nodes, edges)
+        layers, down, _ = order_layers(nodes, edges, layer)
+        assert count_crossings([["a", "b"], ["x", "y"]], down) == 1
+        assert count_crossings(layers, down) == 0
+
+    def test_long_edges_are_routed_through_layers(self, small_pipeline: Pipeline):
+        labels = {name: job.display_label for name, job in small_pipeline.jobs.items()}
+        layout = layered_layout(labels, small_pipeline.edges)
+        assert set(layout.edges) == set(small_pipeline.edges)
+        for (src, tgt), points in layout.edges.items():
+            assert points[0][1] < points[-1][1]
+        for layer in layout.layers:
+            boxes = sorted((layout.nodes[n][0] - layout.sizes[n][0] / 2, layout.nodes[n][0] + layout.sizes[n][0] / 2) for n in layer)
+            assert all(left[1] <= right[0] for left, right in zip(boxes, boxes[1:]))
+
+    def test_render_svg(self, small_pipeline: Pipeline):
+        jobs, edges = get_full_graph(small_pipeline)
+        svg = render_svg(jobs, edges, small_pipeline, truncated={"Import/job001/"})
+        assert svg.startswith("<svg") and svg.rstrip().endswith("</svg>")
+        assert '<g class="node refine3d" id="job004" data-id="job004">' in svg
+        assert 'class="node import truncated"' in svg
+        assert svg.count('class="edge"') == len(edges)
+        assert ".node.failed rect" in svg
+
+    def test_large_layout_is_fast(self):
+        import time
+        labels, edges = _random_dag(2000)
+        start = time.perf_counter()
+        layout = layered_layout(labels, edges)
+        assert time.perf_counter() - start < 10.0
+        assert len(layout.nodes) == 2000
+
+
+# ── Output format tests ──────────────────────────────────────────────
+
+
+def _render(write, *args, **kwargs) -> str:
+    import io
+    buf = io.StringIO()
+    write(buf, *args, **kwargs)
+    return buf.getvalue()
+
+
+class TestFormats:
+    def test_dot(self, small_pipeline: Pipeline):
+        from relion_pipeline_visualizer.formats import render_dot_to
+
+        jobs, edges = get_full_graph(small_pipeline)
+        dot = _render(render_dot_to, jobs, edges, small_pipeline, truncated={"Import/job001/"})
+        assert dot.startswith("digraph pipeline {")
+        assert "job001 -> job002;" in dot
+        assert 'job004 [label="Refine3D/job004", tooltip="Refine3D/job004/", fillcolor="#2196F3"' in dot
+        assert 'color="#f44336"' in dot  # failed Class3D/job006
+        assert dot.count(" -> ") == len(edges)
+        assert 'style="rounded,filled,dashed"' in dot
+
+    def test_node_link_json(self, small_pipeline: Pipeline):
+        import json
+        from relion_pipeline_visualizer.formats import render_node_link_to
+        from relion_pipeline_visualizer.writers import build_job_info
+
+        jobs, edges = get_full_graph(small_pipeline)
+        data = json.loads(_render(render_node_link_to, jobs, edges, small_pipeline))
+        assert data["directed"] is True
+        assert {n["id"] for n in data["nodes"]} == jobs
+        assert {(e["source"], e["target"]) for e in data["links"]} == edges
+        info = build_job_info(jobs, small_pipeline)
+        for node in data["nodes"]:
+            assert {k: node[k] for k in info[node["node_id"]]} == info[node["node_id"]]
+
+    def test_cytoscape_json(self, small_pipeline: Pipeline):
+        import json
+        from relion_pipeline_visualizer.formats import render_cytoscape_to
+
+        jobs, edges = get_full_graph(small_pipeline)
+        groups = {"Class3D/job006/": ["Class3D/job006/", "Select/job007/"]}
+        data = json.loads(_render(render_cytoscape_to, jobs, edges, small_pipeline, groups=groups))
+        nodes = {n["data"]["id"]: n for n in data["elements"]["nodes"]}
+        assert nodes["job004"]["classes"] == "refine3d"
+        assert nodes["job006"]["classes"] == "collapsed failed"
+        assert nodes["job006"]["data"]["members"][0] == "Class3D/job006/ (Failed)"
+        assert {"source": "job001", "target": "job002", "id": "job001-job002"} in [
+            e["data"] for e in data["elements"]["edges"]
+        ]
+
+    def test_empty_graph(self, small_pipeline: Pipeline):
+        import json
+        from relion_pipeline_visualizer.formats import FORMATS
+
+        for name in ("json", "cytoscape"):
+            assert json.loads(_render(FORMATS[name].write, set(), set(), small_pipeline))
+
+
+# ── Output writer tests ──────────────────────────────────────────────
+
+
+class TestWriters:
+    def test_render_to_file_matches_string(self, small_pipeline: Pipeline, tmp_path: Path):
+        jobs, edges = get_full_graph(small_pipeline)
+        path = tmp_path / "out.mmd"
+        with open(path, "w") as fp:
+            render_mermaid_to(fp, jobs, edges, small_pipeline)
+        assert path.read_text() == render_mermaid(jobs, edges, small_pipeline)
+
+    def test_write_html_streams(self, small_pipeline: Pipeline):
+        import io
+        import json
+        import re
+        from functools import partial
+        from relion_pipeline_visualizer.writers import build_job_info, write_html
+
+        jobs, edges = get_full_graph(small_pipeline)
+        buf = io.StringIO()
+        render = partial(render_mermaid_to, jobs=jobs, edges=edges, pipeline=small_pipeline)
+        write_html(buf, "Title", render, build_job_info(jobs, small_pipeline))
+        page = buf.getvalue()
+        assert "<title>Title</title>" in page
+        assert render_mermaid(jobs, edges, small_pipeline) in page
+        info = json.loads(re.search(r"var jobInfo = (.*);", page).group(1))
+        assert info["job004"]["name"] == "Refine3D/job004/"
+        assert "{{" not in page
+
+    def test_atomic_write_replaces(self, tmp_path: Path):
+        from relion_pipeline_visualizer.writers import atomic_write
+
+        path = tmp_path / "out.txt"
+        path.write_text("old")
+        with atomic_write(path) as fp:
+            fp.write("new")
+            assert path.read_text() == "old"
+        assert path.read_text() == "new"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_atomic_write_keeps_old_on_error(self, tmp_path: Path):
+        from relion_pipeline_visualizer.writers import atomic_write
+
+        path = tmp_path / "out.txt"
+        path.write_text("old")
+        with pytest.raises(RuntimeError):
+            with atomic_write(path) as fp:
+                fp.write("partial")
+                raise RuntimeError("render failed")
+        assert path.read_text() == "old"
+        assert list(tmp_path.iterdir()) == [path]
+
+    def test_gzip_sidecar(self, small_pipeline: Pipeline, tmp_path: Path):
+        import gzip
+        import json
+        from relion_pipeline_visualizer.writers import build_job_info, write_job_info_sidecar
+
+        job_info = build_job_info(set(small_pipeline.jobs), small_pipeline)
+        stub, loader = write_job_info_sidecar(tmp_path / "p.html", job_info, "gzip")
+        assert stub == dict.fromkeys(job_info)
+        assert 'fetch("p.jobinfo.json.gz")' in loader
+        with gzip.open(tmp_path / "p.jobinfo.json.gz", "rt") as fp:
+            assert json.load(fp) == job_info
+
+    def test_shard_sidecar(self, small_pipeline: Pipeline, tmp_path: Path):
+        import json
+        from relion_pipeline_visualizer.writers import build_job_info, write_job_info_sidecar
+
+        job_info = build_job_info(set(small_pipeline.jobs), small_pipeline)
+        stub, loader = write_job_info_sidecar(tmp_path / "p.html", job_info, "shards")
+        assert set(stub) == set(job_info) and not any(stub.values())
+        assert '"p_jobinfo/" + jobId + ".js"' in loader
+        shard = (tmp_path / "p_jobinfo" / "job004.js").read_text()
+        assert shard.startswith('jobInfoLoaded("job004", ')
+        assert json.loads(shard[len('jobInfoLoaded("job004", '):-3]) == job_info["job004"]
+
+    def test_shard_sidecar_removes_stale_shards(self, small_pipeline: Pipeline, tmp_path: Path):
+        from relion_pipeline_visualizer.writers import build_job_info, write_job_info_sidecar
+
+        write_job_info_sidecar(tmp_path / "p.html", build_job_info(set(small_pipeline.jobs), small_pipeline), "shards")
+        lineage = {"Import/job001/", "Extract/job002/"}
+        write_job_info_sidecar(tmp_path / "p.html", build_job_info(lineage, small_pipeline), "shards")
+        assert sorted(p.name for p in (tmp_path / "p_jobinfo").iterdir()) == ["job001.js", "job002.js"]
+
+
+# ── Offline asset tests ──────────────────────────────────────────────
+
+
+@pytest.fixture
+def mermaid_bundle(tmp_path: Path) -> Path:
+    bundle = tmp_path / "bundle.js"
+    bundle.write_text('var mermaid = {}; var s = "</script>";')
+    return bundle
+
+
+class TestAssets:
+    def test_fetch_and_find(self, tmp_path: Path, mermaid_bundle: Path):
+        from relion_pipeline_visualizer.assets import fetch_asset, find_asset, sha256_file
+
+        asset_dir = tmp_path / "assets"
+        path = fetch_asset(asset_dir, str(mermaid_bundle))
+        assert find_asset(asset_dir) == path
+        assert sha256_file(path) == sha256_file(mermaid_bundle)
+
+    def test_missing_asset(self, tmp_path: Path):
+        from relion_pipeline_visualizer.assets import AssetError, find_asset
+
+        with pytest.raises(AssetError, match="--fetch-assets"):
+            find_asset(tmp_path)
+
+    def test_unregistered_and_modified_asset(self, tmp_path: Path, mermaid_bundle: Path):
+        from relion_pipeline_visualizer.assets import AssetError, fetch_asset, find_asset
+
+        asset_dir = tmp_path / "assets"
+        asset_dir.mkdir()
+        (asset_dir / "mermaid.min.js").write_text("var mermaid = {};")
+        with pytest.raises(AssetError, match="not listed"):
+            find_asset(asset_dir)
+        path = fetch_asset(asset_dir, str(mermaid_bundle))
+        path.write_text("truncated")
+        with pytest.raises(AssetError, match="SHA-256"):
+            find_asset(asset_dir)
+
+    def test_inline_script_escapes_closing_tag(self, mermaid_bundle: Path):
+        from relion_pipeline_visualizer.assets import inline_script
+
+        tag = inline_script(mermaid_bundle)
+        assert tag.count("</script>") == 1
+        assert '"<\\/script>"' in tag
+
+    def test_inline_script_escapes_closing_tag_in_any_case(self, tmp_path: Path):
+        from relion_pipeline_visualizer.assets import inline_script
+
+        bundle = tmp_path / "bundle.js"
+        bundle.write_text('var a = "</SCRIPT>", b = "</Script >";')
+        tag = inline_script(bundle)
+        assert tag.lower().count("</script") == 1
+        assert '"<\\/SCRIPT>"' in tag and '"<\\/Script >"' in tag
+
+
+# ── Watch mode tests ─────────────────────────────────────────────────
+
+
+def _set_status(star: Path, job: str, old: str, new: str) -> None:
+    lines = star.read_text().splitlines(keepends=True)
+    star.write_text("".join(
+        line.replace(old, new) if line.startswith(job) else line for line in lines
+    ))
+
+
+class TestWatch:
+    def test_watcher_reports_changed_jobs(self, project_star: Path):
+        from relion_pipeline_visualizer.watch import PipelineWatcher
+
+        pipeline = parse_pipeline(project_star)
+        pipeline.jobs["Refine3D/job004/"].last_command = "relion_refine"
+        watcher = PipelineWatcher(project_star, pipeline)
+        assert watcher.poll() == (False, set())
+
+        # Files of the running job appear
+        job_dir = project_star.parent / "Subtract" / "job011"
+        job_dir.mkdir(parents=True)
+        (job_dir / "note.txt").write_text("++++ with the following command(s):\nrelion_particle_subtract\n")
+        assert watcher.poll() == (False, {"Subtract/job011/"})
+        assert watcher.poll() == (False, set())
+
+        _set_status(project_star, "Class3D/job006/", "Failed", "Succeeded")
+        changed, jobs = watcher.poll()
+        assert changed and jobs == {"Class3D/job006/"}
+        assert watcher.pipeline is not pipeline
+        assert watcher.pipeline.jobs["Class3D/job006/"].status == "Succeeded"
+        assert watcher.pipeline.jobs["Refine3D/job004/"].last_command == "relion_refine"
+
+        # Later changes update the same pipeline in place
+        current = watcher.pipeline
+        _set_status(project_star, "Subtract/job011/", "Running", "Succeeded")
+        assert watcher.poll() == (True, {"Subtract/job011/"})
+        assert watcher.pipeline is current
+        assert not watcher.parse_state.full_parse
+        assert current.jobs["Refine3D/job004/"].last_command == "relion_refine"
+
+    def test_watch_rewrites_only_on_change(self, tmp_path: Path, project_star: Path, monkeypatch):
+        from relion_pipeline_visualizer import cli
+
+        out = tmp_path / "live"
+        html_path = tmp_path / "live.html"
+        enriched: list[set[str]] = []
+        original_enrich = cli.enrich_jobs
+
+        def recording_enrich(pipeline, project_dir, job_names=None, **kwargs):
+            enriched.append(set(job_names))
+            return original_enrich(pipeline, project_dir, job_names=job_names, **kwargs)
+
+        versions = []
+
+        def scripted_sleep(seconds):
+            versions.append((tmp_path / "live.version.js").read_text())
+            if len(versions) == 2:
+                html_path.write_text("stale")  # only rewritten when content changes
+            if len(versions) == 3:
+                assert html_path.read_text() == "stale"
+                _set_status(project_star, "Class3D/job006/", "Failed", "Running")
+            if len(versions) == 4:
+                raise KeyboardInterrupt
+
+        monkeypatch.setattr(cli, "enrich_jobs", recording_enrich)
+        monkeypatch.setattr(cli.time, "sleep", scripted_sleep)
+        cli.main([str(project_star), "--watch", "1", "-o", str(out)])
+
+        page = html_path.read_text()
+        assert "pipelineVersion" in page and 'var pageVersion = "' in page
+        assert '"status": "Running"' in page
+        assert versions[0] == versions[1] == versions[2] != versions[3]
+        assert len(enriched) == 2 and enriched[1] == {"Class3D/job006/"}
+
+    def test_watch_rejects_batch_export(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), "--all-jobs", "--watch", "-o", str(tmp_path / "x")])
+        assert exc_info.value.code == 2
+
+
+# ── Synthetic project tests ──────────────────────────────────────────
+
+
+class TestSynthetic:
+    def test_pipeline_shape(self):
+        from collections import Counter
+        from relion_pipeline_visualizer.synthetic import synthetic_pipeline
+
+        jobs = synthetic_pipeline(500, seed=3)
+        assert jobs == synthetic_pipeline(500, seed=3)
+        assert len(jobs) == len({job.name for job in jobs}) == 500
+        produced: set[str] = set()
+        for job in jobs:
+            assert set(job.inputs) <= produced  # every input comes from an earlier job
+            produced.update(node for node, _ in job.outputs)
+        types = Counter(job.job_type for job in jobs)
+        assert types["Class3D"] > 50 and types["Refine3D"] > 50 and types["Select"] > 50
+        # Lineages branch: some particle sets feed more than one job
+        uses = Counter(node for job in jobs for node in job.inputs)
+        assert max(uses.values()) > 2
+
+    def test_generated_project_parses_and_enriches(self, tmp_path: Path):
+        from relion_pipeline_visualizer.jobfiles import JobFileIndex
+        from relion_pipeline_visualizer.synthetic import generate_project
+
+        star = generate_project(tmp_path, 80, seed=1, class3d_iterations=60, refine_iterations=4)
+        pipeline = parse_pipeline(star)
+        assert len(pipeline.jobs) == 80
+        assert not enrich_jobs(pipeline, tmp_path)
+
+        class3d = [job for job in pipeline.jobs.values() if job.job_type == "Class3D" and job.status == "Succeeded"]
+        assert class3d
+        for job in class3d:
+            assert JobFileIndex.scan(tmp_path / job.name).last_iteration == 60
+            assert job.model_general.iteration == 60
+            assert len(job.model_classes) == 4
+        notes = [len(list(iter_note_commands(tmp_path / name / "note.txt"))) for name in pipeline.jobs]
+        assert max(notes) > 2
+        assert all(job.last_command for job in pipeline.jobs.values())
+
+    def test_benchmark_harness(self, tmp_path: Path):
+        import json
+        import subprocess
+        import sys
+
+        bench = Path(__file__).parent.parent / "benchmarks" / "bench.py"
+        baselines = tmp_path / "baselines.json"
+        args = [sys.executable, str(bench), "--sizes", "40", "--repeat", "1", "--baselines", str(baselines)]
+        subprocess.run(args + ["--update-baselines"], check=True, capture_output=True)
+        recorded = json.loads(baselines.read_text())
+        assert {"parse_pipeline@40", "enrich_jobs@40", "get_subgraph@40", "render_mermaid@40", "cli_full@40"} <= set(
+            recorded["results"]
+        )
+        # Pretend the baseline machine was far faster: every case regresses
+        recorded["results"] = {key: 1e-9 for key in recorded["results"]}
+        baselines.write_text(json.dumps(recorded))
+        result = subprocess.run(args + ["--min-seconds", "0"], capture_output=True, text=True)
+        assert result.returncode == 1 and "REGRESSION" in result.stdout
+
+
+# ── Profiling tests ──────────────────────────────────────────────────
+
+
+class TestInstrument:
+    def test_hooks_do_nothing_without_profiler(self, tmp_path: Path):
+        from relion_pipeline_visualizer.instrument import Profiler, file_read, stage
+
+        profiler = Profiler()
+        with stage("parse_pipeline"), file_read(tmp_path / "note.txt") as read:
+            read.cached = True
+        assert profiler.stages == {} and profiler.files == []
+
+    def test_stages_and_files_are_recorded(self, tmp_path: Path):
+        import sys
+        from relion_pipeline_visualizer.instrument import Profiler, file_read, profiling, stage
+
+        path = tmp_path / "run_model.star"
+        path.write_bytes(b"x" * 100_000)
+        with profiling(Profiler()) as profiler:
+            for _ in range(2):
+                with stage("enrich_jobs"), file_read(path):
+                    path.read_bytes()
+            with stage("write_html"), file_read(path) as read:
+                read.cached = True
+
+        report = profiler.report(top=1)
+        assert [(s["name"], s["calls"]) for s in report["stages"]] == [("enrich_jobs", 2), ("write_html", 1)]
+        assert report["files"]["count"] == 3 and report["files"]["cached"] == 1
+        slowest = report["files"]["slowest"]
+        assert len(slowest) == 1 and slowest[0]["path"] == str(path)
+        if sys.platform == "linux":
+            assert profiler.files[0].bytes_read == 100_000
+            # Stage counters also see the per-file samples of /proc
+            assert 200_000 <= report["stages"][0]["bytes_read"] < 202_000
+            assert report["files"]["bytes_read"] == 200_000
+
+    def test_enrichment_reports_cache_hits(self, tmp_path: Path, project_star: Path):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+        from relion_pipeline_visualizer.instrument import Profiler, profiling
+
+        project = project_star.parent
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            enrich_jobs(parse_pipeline(project_star), project, cache=cache)
+            with profiling(Profiler()) as profiler:
+                enrich_jobs(parse_pipeline(project_star), project, cache=cache, workers=4)
+        assert profiler.files and all(read.cached for read in profiler.files)
+        assert str(project / "Refine3D/job004/run_model.star") in {read.path for read in profiler.files}
+
+    def test_cli_profile_report(self, tmp_path: Path, project_star: Path):
+        import json
+        import pstats
+        from relion_pipeline_visualizer.cli import main
+
+        report_path, dump_path = tmp_path / "profile.json", tmp_path / "run.prof"
+        main([
+            str(project_star), "--job", "6", "-o", str(tmp_path / "out"),
+            "--profile", str(report_path), "--profile-top", "2", "--cprofile", str(dump_path),
+        ])
+        report = json.loads(report_path.read_text())
+        assert [s["name"] for s in report["stages"]] == [
+            "parse_pipeline", "subgraph", "enrich_jobs", "collapse", "write_source", "write_html",
+        ]
+        assert report["argv"][0] == str(project_star)
+        assert len(report["files"]["slowest"]) == 2
+        assert report["files"]["slowest"][0]["stage"] == "enrich_jobs"
+        stats = pstats.Stats(str(dump_path))
+        assert any(func[2] == "parse_pipeline" for func in stats.stats)
+
+
+# ── Server tests ─────────────────────────────────────────────────────
+
+
+@pytest.fixture
+def served(project_star: Path):
+    """A PipelineServer on a free local port, with a GET helper."""
+    import threading
+    import urllib.error
+    import urllib.request
+    from relion_pipeline_visualizer.server import PipelineServer, PipelineService
+
+    enriched: list[set[str]] = []
+    service = PipelineService(project_star, enrich=lambda pipeline, jobs: enriched.append(set(jobs)))
+    service.enriched_calls = enriched
+    server = PipelineServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def get(path: str) -> tuple[int, str, str]:
+        try:
+            with urllib.request.urlopen(base + path, timeout=10) as response:
+                return response.status, response.headers["Content-Type"], response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers["Content-Type"], e.read().decode()
+
+    yield service, get
+    server.shutdown()
+    server.server_close()
+
+
+class TestServer:
+    def test_lru_cache_evicts_least_recently_used(self):
+        from relion_pipeline_visualizer.server import LRUCache
+
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert cache.get("a") == 1
+        cache.put("c", 3)
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+        assert (cache.hits, cache.misses) == (3, 1)
+
+    def test_view_options_from_query(self):
+        from relion_pipeline_visualizer.server import ViewOptions
+
+        assert ViewOptions.from_query("") == ViewOptions(upstream=True, downstream=False)
+        assert ViewOptions.from_query("down=1&depth=2") == ViewOptions(upstream=False, downstream=True, depth=2)
+        assert ViewOptions.from_query("up=1&down=1&collapse=auto&format=json").format == "json"
+        for query in ("depth=-1", "up=maybe", "collapse=everything", "format=pdf"):
+            with pytest.raises(ValueError):
+                ViewOptions.from_query(query)
+
+    def test_lineage_page(self, served):
+        service, get = served
+        status, content_type, body = get("/job/job004?up=1&down=1&depth=1")
+        assert status == 200 and content_type.startswith("text/html")
+        assert "RELION Pipeline — Refine3D/job004/" in body
+        assert "job003" in body and "job005" in body
+        assert "job001" not in body  # beyond depth 1
+        assert service.enriched_calls == [{
+            "JoinStar/job003/", "Refine3D/job004/", "MaskCreate/job005/", "Class3D/job006/",
+            "CtfRefine/job008/", "PostProcess/job009/", "MultiBody/job010/",
+        }]
+
+    def test_pages_are_cached_until_the_pipeline_changes(self, served, project_star: Path):
+        service, get = served
+        _, _, first = get("/job/6")
+        assert get("/job/job006")[2] == first
+        assert (service.cache.hits, service.cache.misses) == (1, 1)
+        assert service.refresh() is False
+
+        _set_status(project_star, "Class3D/job006/", "Failed", "Succeeded")
+        assert service.refresh() is True
+        assert len(service.cache) == 0
+        _, _, second = get("/job/6")
+        assert "Failed" in first and "Failed" not in second
+        assert service.version in second and service.version in get("/job/job006.version.js")[2]
+
+    def test_other_formats_and_index(self, served):
+        import json
+
+        _, get = served
+        status, content_type, body = get("/job/job004?format=json")
+        assert status == 200 and content_type.startswith("application/json")
+        assert {node["id"] for node in json.loads(body)["nodes"]} == {
+            "Import/job001/", "Extract/job002/", "JoinStar/job003/", "Refine3D/job004/",
+        }
+        status, _, body = get("/")
+        assert status == 200 and 'href="job/job011"' in body
+
+    def test_full_job_names(self, served):
+        _, get = served
+        for path in ("/job/Refine3D/job004/", "/job/Refine3D/job004"):
+            status, _, body = get(path)
+            assert status == 200 and "RELION Pipeline — Refine3D/job004/" in body
+
+    def test_job_removed_before_rendering(self, served):
+        from relion_pipeline_visualizer.server import ViewOptions
+
+        service, get = served
+        del service.pipeline.jobs["Subtract/job011/"]
+        service._reindex()
+        assert service.render_job("job011", ViewOptions()) is None
+        assert get("/job/job011")[0] == 404
+
+    def test_requests_render_concurrently(self, served):
+        import threading
+
+        service, get = served
+        entered, release = threading.Event(), threading.Event()
+
+        def slow_enrich(pipeline, jobs):
+            entered.set()
+            release.wait(10)
+
+        service.enrich = slow_enrich
+        results = []
+        thread = threading.Thread(target=lambda: results.append(get("/job/job004")))
+        thread.start()
+        try:
+            assert entered.wait(10)
+            # The index is answered while the lineage is still being enriched
+            assert get("/")[0] == 200
+            assert not results
+        finally:
+            release.set()
+            thread.join(10)
+        assert results[0][0] == 200
+
+    def test_errors(self, served):
+        _, get = served
+        assert get("/job/job999")[0] == 404
+        assert get("/elsewhere")[0] == 404
+        status, _, body = get("/job/job004?depth=two")
+        assert status == 400 and "depth" in body
+
+    def test_serve_enricher_shares_one_cache(self, project_star: Path, tmp_path: Path, capsys):
+        from relion_pipeline_visualizer.cache import EnrichmentCache
+        from relion_pipeline_visualizer.cli import _serve_enricher
+        with EnrichmentCache(tmp_path / "cache.sqlite") as cache:
+            enrich = _serve_enricher(project_star.parent, 1, cache)
+            pipeline = parse_pipeline(project_star)
+            enrich(pipeline, {"Refine3D/job004/"})
+            stored = len(cache)
+            assert stored > 0
+            enrich(pipeline, {"Class3D/job006/"})
+            assert len(cache) > stored
+        assert pipeline.jobs["Class3D/job006/"].model_classes
+        assert capsys.readouterr().err == ""
+
+
+# ── Batch tests ──────────────────────────────────────────────────────
+
+
+def _misbehaving_work(star_path: Path, out_dir: Path) -> dict:
+    """Batch work that kills its worker for project 'crash' and hangs for 'hang'."""
+    import os
+    import time
+    if star_path.parent.name == "crash":
+        os._exit(3)
+    if star_path.parent.name == "hang":
+        time.sleep(30)
+    return {"n_jobs": 1}
+
+
+@pytest.fixture
+def projects(tmp_path: Path) -> Path:
+    """Directory with two copies of small_project and one directory that is not a project."""
+    import shutil
+    root = tmp_path / "projects"
+    for name in ("alpha", "beta"):
+        shutil.copytree(SMALL_PROJECT, root / name)
+        shutil.copy(SMALL_STAR, root / name / "default_pipeline.star")
+    (root / "scratch").mkdir()
+    return root
+
+
+class TestBatch:
+    def test_find_projects(self, projects: Path):
+        from relion_pipeline_visualizer.batch import find_projects
+
+        found = find_projects([
+            str(projects / "*"),
+            str(projects / "alpha" / "default_pipeline.star"),
+            str(projects / "missing"),
+        ])
+        assert found == [
+            projects / "alpha" / "default_pipeline.star",
+            projects / "beta" / "default_pipeline.star",
+            projects / "missing" / "default_pipeline.star",
+        ]
+
+    def test_output_names_are_unique(self, tmp_path: Path):
+        from relion_pipeline_visualizer.batch import output_names
+
+        stars = [tmp_path / p / "default_pipeline.star" for p in ("a/run1", "b/run1", "a_run1")]
+        assert list(output_names(stars).values()) == ["a_run1", "b_run1", "a_run1_2"]
+        assert list(output_names(stars[:1]).values()) == ["run1"]
+
+    def test_pipeline_summary(self, project_star: Path):
+        from relion_pipeline_visualizer.batch import pipeline_summary
+
+        pipeline = parse_pipeline(project_star)
+        enrich_jobs(pipeline, project_star.parent)
+        assert pipeline_summary(pipeline) == {
+            "n_jobs": 11, "n_failed": 1, "n_running": 1, "best_resolution": 3.2, "best_job": "Refine3D/job004/",
+        }
+
+    def test_crash_and_timeout_are_isolated(self, tmp_path: Path):
+        from relion_pipeline_visualizer.batch import run_batch
+
+        names = ["ok1", "crash", "hang", "ok2", "ok3"]
+        stars = [tmp_path / name / "default_pipeline.star" for name in names]
+        seen = []
+        summaries = run_batch(
+            stars, tmp_path / "out", _misbehaving_work, workers=2, timeout=0.5,
+            progress=lambda summary, done, total: seen.append((summary.name, done, total)),
+        )
+        assert [s.status for s in summaries] == ["ok", "failed", "timeout", "ok", "ok"]
+        assert "worker process died" in summaries[1].error
+        assert summaries[2].seconds < 5
+        assert sorted(name for name, _, _ in seen) == sorted(names)
+        assert [done for _, done, _ in seen] == [1, 2, 3, 4, 5]
+
+    def test_cli_batch(self, projects: Path, tmp_path: Path):
+        import json
+        from relion_pipeline_visualizer.cli import main
+
+        out = tmp_path / "out"
+        with pytest.raises(SystemExit) as exc_info:
+            main(["batch", str(projects / "*"), str(projects / "missing"), "-o", str(out), "--workers", "2"])
+        assert exc_info.value.code == 1  # the missing project failed, the others still ran
+
+        summaries = {s["name"]: s for s in json.loads((out / "summary.json").read_text())}
+        assert set(summaries) == {"alpha", "beta", "missing"}
+        assert summaries["missing"]["status"] == "failed"
+        assert "FileNotFoundError" in summaries["missing"]["error"]
+        for name in ("alpha", "beta"):
+            assert summaries[name]["status"] == "ok"
+            assert (summaries[name]["n_jobs"], summaries[name]["n_failed"], summaries[name]["n_running"]) == (11, 1, 1)
+            assert summaries[name]["best_resolution"] == 3.2
+            assert "Import/job001" in (out / name / "pipeline.mmd").read_text()
+            assert (out / name / "pipeline.html").exists()
+        index = (out / "index.html").read_text()
+        assert '<a href="alpha/pipeline.html">alpha</a>' in index
+        assert "3.20 Å (Refine3D/job004/)" in index
+        assert "2 of 3 projects processed" in index
+
+    def test_cli_batch_project_list_and_overwrite(self, projects: Path, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+
+        listing = tmp_path / "projects.txt"
+        listing.write_text(f"# nightly\n{projects / 'alpha'}\n\n")
+        out = tmp_path / "out"
+        main(["batch", "--project-list", str(listing), "-o", str(out)])
+        assert (out / "alpha" / "pipeline.html").exists()
+        assert not (out / "beta").exists()
+        # Existing project outputs and the index are kept without --force
+        (out / "index.html").unlink()
+        (out / "alpha" / "pipeline.html").write_text("old")
+        with pytest.raises(SystemExit):
+            main(["batch", str(projects / "alpha"), "-o", str(out)])
+        assert (out / "alpha" / "pipeline.html").read_text() == "old"
+        assert not (out / "index.html").exists()
+        main(["batch", str(projects / "alpha"), "-o", str(out), "-f"])
+        assert "alpha" in (out / "index.html").read_text()
+        assert (out / "alpha" / "pipeline.html").read_text() != "old"
+
+
 # ── CLI job name resolution tests ────────────────────────────────────
 
 
@@ -384,6 +1873,175 @@ class TestCLI:
         assert "graph TD" in html
         assert "jobInfo" in html
 
+    def test_format_flag(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        main([str(SMALL_STAR), "--format", "dot", "-o", str(tmp_path / "graph")])
+        assert (tmp_path / "graph.dot").read_text().startswith("digraph")
+        assert (tmp_path / "graph.html").exists()
+        assert not (tmp_path / "graph.mmd").exists()
+        main([str(SMALL_STAR), "--all-jobs", "--format", "cytoscape", "-o", str(tmp_path / "all")])
+        assert len(list((tmp_path / "all").glob("*.cyjs"))) == 11
+
+    def test_job_info_shards(self, tmp_path: Path, project_star: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "lazy"
+        main([str(project_star), "--job-info", "shards", "-o", str(out)])
+        html = (tmp_path / "lazy.html").read_text()
+        assert "relion_refine_mpi" not in html
+        assert '"job004": null' in html
+        assert "relion_refine_mpi" in (tmp_path / "lazy_jobinfo" / "job004.js").read_text()
+        # The shard directory alone counts as an existing output
+        (tmp_path / "lazy.html").unlink()
+        (tmp_path / "lazy.mmd").unlink()
+        with pytest.raises(SystemExit):
+            main([str(project_star), "--job-info", "shards", "-o", str(out)])
+
+    def test_offline_requires_asset(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), "--offline", "-o", str(tmp_path / "off")])
+        assert exc_info.value.code == 1
+        assert not (tmp_path / "off.html").exists()
+
+    def test_offline_bundle(self, tmp_path: Path, mermaid_bundle: Path):
+        from relion_pipeline_visualizer.cli import main
+        main([str(SMALL_STAR), "--offline", "--fetch-assets", str(mermaid_bundle), "-o", str(tmp_path / "off")])
+        html = (tmp_path / "off.html").read_text()
+        assert "cdn.jsdelivr.net" not in html
+        assert "var mermaid = {};" in html
+
+        out = tmp_path / "batch"
+        main([str(SMALL_STAR), "--all-jobs", "--offline", "-o", str(out)])
+        assert (out / "assets" / "mermaid.min.js").read_text() == mermaid_bundle.read_text()
+        page = (out / "Refine3D_job004.html").read_text()
+        assert '<script src="assets/mermaid.min.js"></script>' in page
+        assert "var mermaid" not in page
+
+    def test_svg_renderer(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "offline"
+        main([str(SMALL_STAR), "--renderer", "svg", "-o", str(out)])
+        html = (tmp_path / "offline.html").read_text()
+        assert "<svg" in html
+        assert "mermaid.min.js" not in html
+        assert "attachTooltips();" in html
+        assert (tmp_path / "offline.mmd").read_text().startswith("graph TD")
+
+    def test_subgraph_enriches_only_rendered_jobs(self, tmp_path: Path, project_star: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "lineage"
+        main([str(project_star), "--job", "4", "-o", str(out)])
+        html = (tmp_path / "lineage.html").read_text()
+        assert "relion_refine_mpi" in html
+        assert "--K 3" not in html  # Class3D/job006 is downstream, never read
+
+    def test_cache_flags(self, tmp_path: Path, project_star: Path):
+        from relion_pipeline_visualizer.cache import CACHE_FILENAME, default_cache_dir
+        from relion_pipeline_visualizer.cli import main
+        main([str(project_star), "-o", str(tmp_path / "cached")])
+        assert (default_cache_dir() / CACHE_FILENAME).exists()
+        main([str(project_star), "-o", str(tmp_path / "cleared"), "--clear-cache"])
+        main([str(project_star), "-o", str(tmp_path / "uncached"), "--no-cache"])
+        assert (tmp_path / "uncached.html").read_text() == (tmp_path / "cached.html").read_text()
+
+    def test_jobs_of_type(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "lineages"
+        main([str(FULL_STAR), "--jobs-of-type", "PostProcess", "-o", str(out)])
+        pages = sorted(p.name for p in out.glob("*.html"))
+        assert "index.html" in pages
+        assert "PostProcess_job041.html" in pages
+        assert all(name.startswith("PostProcess_") for name in pages if name != "index.html")
+        index = (out / "index.html").read_text()
+        assert 'href="PostProcess_job041.html"' in index
+        assert "job040 --> job041" in (out / "PostProcess_job041.mmd").read_text()
+
+    def test_all_jobs(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "all"
+        main([str(SMALL_STAR), "--all-jobs", "--downstream", "-o", str(out)])
+        assert len(list(out.glob("*.mmd"))) == 11
+        mmd = (out / "Refine3D_job004.mmd").read_text()
+        assert "job011" in mmd
+        assert "job001" not in mmd
+
+    def test_all_jobs_empty_pipeline(self, tmp_path: Path, capsys):
+        from relion_pipeline_visualizer.cli import main
+        star = tmp_path / "default_pipeline.star"
+        star.write_text("data_pipeline_general\n\n_rlnPipeLineJobCounter 1\n")
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(star), "--all-jobs", "-o", str(tmp_path / "all")])
+        assert exc_info.value.code == 1
+        assert "no jobs in pipeline" in capsys.readouterr().err
+
+    def test_job_and_all_jobs_exclusive(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), "--job", "4", "--all-jobs", "-o", str(tmp_path / "x")])
+        assert exc_info.value.code == 2
+
+    def test_depth_flag(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "near"
+        main([str(SMALL_STAR), "--job", "7", "--depth", "1", "-o", str(out)])
+        mmd = (tmp_path / "near.mmd").read_text()
+        assert "job006 --> job007" in mmd
+        assert "job004" not in mmd
+        assert '"truncated": true' in (tmp_path / "near.html").read_text()
+
+    @pytest.mark.parametrize("flag", ["--depth", "--up-depth", "--down-depth", "--max-nodes"])
+    def test_negative_limits_rejected(self, tmp_path: Path, flag: str, capsys):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), "--job", "7", flag, "-2", "-o", str(tmp_path / "x")])
+        assert exc_info.value.code == 2
+        assert f"{flag} must not be negative" in capsys.readouterr().err
+        assert not (tmp_path / "x.mmd").exists()
+
+    @pytest.mark.parametrize("value", ["0", "-3"])
+    def test_jobs_must_be_positive(self, tmp_path: Path, value: str, capsys):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), "--jobs", value, "-o", str(tmp_path / "x")])
+        assert exc_info.value.code == 2
+        assert "--jobs must be at least 1" in capsys.readouterr().err
+        assert not (tmp_path / "x.mmd").exists()
+
+    @pytest.mark.parametrize("flag", ["--depth", "--up-depth", "--down-depth"])
+    def test_depth_without_selection_rejected(self, tmp_path: Path, flag: str, capsys):
+        from relion_pipeline_visualizer.cli import main
+        with pytest.raises(SystemExit) as exc_info:
+            main([str(SMALL_STAR), flag, "1", "-o", str(tmp_path / "x")])
+        assert exc_info.value.code == 2
+        assert f"{flag} needs --job, --all-jobs or --jobs-of-type" in capsys.readouterr().err
+        assert not (tmp_path / "x.mmd").exists()
+
+    def test_collapse_flag(self, tmp_path: Path):
+        import json
+        import re
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "collapsed"
+        main([str(FULL_STAR), "--collapse", "auto", "--max-nodes", "30", "-o", str(out)])
+        mmd = (tmp_path / "collapsed.mmd").read_text()
+        assert len(re.findall(r'^    job\d+\["', mmd, re.MULTILINE)) <= 30
+        html = (tmp_path / "collapsed.html").read_text()
+        info = json.loads(re.search(r"var jobInfo = (.*);", html).group(1))
+        assert any(entry.get("members") for entry in info.values())
+
+    def test_reduce_flag(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "reduced"
+        main([str(SMALL_STAR), "--reduce", "-o", str(out)])
+        mmd = (tmp_path / "reduced.mmd").read_text()
+        assert "job004 --> job005" in mmd
+        assert "job004 --> job006" not in mmd
+
+    def test_parallel_jobs_flag(self, tmp_path: Path):
+        from relion_pipeline_visualizer.cli import main
+        out = tmp_path / "par"
+        main([str(SMALL_STAR), "-j", "4", "-o", str(out)])
+        assert (tmp_path / "par.html").exists()
+
     def test_downstream_flag(self, tmp_path: Path):
         from relion_pipeline_visualizer.cli import main
         out = tmp_path / "down"